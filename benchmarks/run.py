@@ -0,0 +1,360 @@
+# benchmarks/run.py
+#
+# 基准测试入口：
+#     python -m benchmarks.run --suites parse,dispatch,mixer,http,startup --out results.json
+#     python -m benchmarks.run --compare results.json     # 与之前的结果逐项比较
+# 所有测试都不打开音频设备：混音器以离线模式运行，由后台线程按实时节奏拉取音频块
+
+import argparse
+import asyncio
+import contextlib
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from typing import Dict, List
+import numpy as np
+import config
+from benchmarks.synthetic import synthetic_midi
+from sound.latency import LatencyStats
+from sound.mixer import Mixer
+
+SUITES = ("parse", "dispatch", "mixer", "http", "startup")
+
+
+@contextlib.contextmanager
+def offline_clock(mixer: Mixer):
+    """
+    以离线模式启动混音器，并在后台线程中按实时节奏调用 mix_block，代替音频回调
+    """
+    mixer.start_offline()
+    running = True
+    buffer = np.zeros((mixer.block_size, mixer.channels), dtype=np.float32)
+    interval = mixer.block_size / mixer.sample_rate
+
+    def loop():
+        next_time = time.perf_counter()
+        while running:
+            mixer.mix_block(buffer)
+            next_time += interval
+            delay = next_time - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            else:
+                next_time = time.perf_counter()
+
+    thread = threading.Thread(target=loop, daemon=True)
+    thread.start()
+    try:
+        yield mixer
+    finally:
+        running = False
+        thread.join()
+        mixer.stop()
+
+
+def _best_of(fn, repeat: int) -> float:
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def _playable_notes(sound_manager) -> List[int]:
+    """
+    当前映射下有样本的音符，避免把找不到样本的失败计入延迟
+    """
+    return [n for n in range(128) if sound_manager.has_sound(n, sound_manager.get_note_group(n))]
+
+
+# ---------- 解析 ----------
+
+def bench_parse(events: int, tracks: int, tempo_changes: int, repeat: int, parsers: List[str]) -> dict:
+    from midi.midi_player import MidiPlayer
+
+    data = synthetic_midi(events, tracks, tempo_changes)
+    fd, path = tempfile.mkstemp(suffix=".mid")
+    with os.fdopen(fd, "wb") as f:
+        f.write(data)
+    result = {"file_bytes": len(data), "tracks": tracks, "tempo_changes": tempo_changes}
+    use_fast = config.MIDI_FAST_PARSER
+    try:
+        count = len(MidiPlayer(path).parse().table)
+        result["events"] = count
+        for name in parsers:
+            config.MIDI_FAST_PARSER = name == "fast"
+            # 每次都新建 MidiPlayer 且不带解析缓存，测的是完整解析
+            seconds = _best_of(lambda: MidiPlayer(path).parse(), repeat)
+            result[name] = {"seconds": round(seconds, 4), "events_per_sec": round(count / seconds)}
+    finally:
+        config.MIDI_FAST_PARSER = use_fast
+        os.remove(path)
+    if "fast" in result and "mido" in result:
+        result["speedup"] = round(result["mido"]["seconds"] / result["fast"]["seconds"], 2)
+    return result
+
+
+# ---------- 音符分发 ----------
+
+def bench_dispatch(notes: int, rate: float) -> dict:
+    from sound.note_dispatcher import NoteDispatcher, QueueFullError
+    from sound.sound_manager import SoundManager
+    from sound.sound_mapping import SoundMapping
+
+    sound_manager = SoundManager(SoundMapping(), mixer=Mixer())
+    sound_manager.preload()
+    playable = _playable_notes(sound_manager)
+    if not playable:
+        return {"error": "没有可用的样本"}
+
+    direct = LatencyStats()
+    with offline_clock(sound_manager.mixer):
+        # 直接调用：SoundManager.schedule_note 本身的开销
+        for i in range(notes):
+            started = time.perf_counter()
+            sound_manager.schedule_note(playable[i % len(playable)], 100)
+            direct.record(time.perf_counter() - started)
+
+        # 经分发队列：入队到交给混音器的延迟，按固定速率提交
+        dispatcher = NoteDispatcher(sound_manager)
+        dispatcher.start()
+        submit = LatencyStats()
+        interval = 1.0 / rate if rate else 0.0
+        next_time = time.perf_counter()
+        rejected = 0
+        for i in range(notes):
+            started = time.perf_counter()
+            try:
+                dispatcher.submit(playable[i % len(playable)], 100)
+            except QueueFullError:
+                rejected += 1
+            submit.record(time.perf_counter() - started)
+            if interval:
+                next_time += interval
+                delay = next_time - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+        while dispatcher.depth():
+            time.sleep(0.001)
+        dispatcher.stop()
+
+    return {
+        "notes": notes,
+        "rate": rate,
+        "schedule_note_ms": direct.summary(),
+        "submit_ms": submit.summary(),
+        "queue_to_mixer_ms": dispatcher.latency.summary(),
+        "rejected": rejected,
+        "stolen_voices": sound_manager.mixer.voices_stolen
+    }
+
+
+# ---------- 混音 ----------
+
+def bench_mixer(voice_counts: List[int], blocks: int) -> dict:
+    sample_rate, channels, block_size = config.MIXER_SAMPLE_RATE, config.MIXER_CHANNELS, config.MIXER_BLOCK_SIZE
+    frames = block_size * (blocks + 20)
+    rng = np.random.default_rng(0)
+    sample = rng.integers(-8000, 8000, size=(frames, channels), dtype=np.int16)
+    budget = block_size / sample_rate
+    buffer = np.zeros((block_size, channels), dtype=np.float32)
+
+    # 每块耗时以微秒计
+    results = {"unit": "us", "block_size": block_size, "sample_rate": sample_rate,
+               "block_budget_ms": round(budget * 1000, 3), "voices": {}}
+    for count in voice_counts:
+        mixer = Mixer(sample_rate, channels, block_size, max_polyphony=count)
+        mixer.start_offline()
+        for i in range(count):
+            # 一半的声部处于淡出状态，覆盖包络计算的分支
+            mixer.play(sample, gain=0.5, note=i % 128, tag=i)
+        for _ in range(10):
+            mixer.mix_block(buffer)
+        for i in range(0, count, 2):
+            mixer.release(i, fade_frames=frames)
+        stats = LatencyStats(window=blocks)
+        for _ in range(blocks):
+            started = time.perf_counter()
+            mixer.mix_block(buffer)
+            stats.record(time.perf_counter() - started)
+        mixer.stop()
+        summary = stats.summary(scale=1e6, digits=1)
+        summary["budget_fraction"] = round(stats.total / stats.count / budget, 4)
+        results["voices"][str(count)] = summary
+    return results
+
+
+# ---------- HTTP ----------
+
+async def _drive(client, requests: int, concurrency: int, make_request) -> dict:
+    latency = LatencyStats(window=requests)
+    status_counts: Dict[str, int] = {}
+    queue = iter(range(requests))
+
+    async def worker():
+        for i in queue:
+            started = time.perf_counter()
+            response = await make_request(client, i)
+            latency.record(time.perf_counter() - started)
+            key = str(response.status_code)
+            status_counts[key] = status_counts.get(key, 0) + 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    return {"requests": requests, "seconds": round(elapsed, 4),
+            "requests_per_sec": round(requests / elapsed, 1),
+            "latency_ms": latency.summary(), "status": status_counts}
+
+
+async def _bench_http(requests: int, concurrency: int, events: int) -> dict:
+    import httpx
+    import server
+
+    results = {"concurrency": concurrency}
+    playable = _playable_notes(server.sound_manager) or [60]
+    chord = [{"note": playable[i % len(playable)], "offset_ms": 20 * i} for i in range(4)]
+    with offline_clock(server.sound_manager.mixer):
+        # ASGITransport 不触发 lifespan，这里手动进入
+        async with server.lifespan(server.app):
+            transport = httpx.ASGITransport(app=server.app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+                results["play_note"] = await _drive(
+                    client, requests, concurrency,
+                    lambda c, i: c.post("/play_note", json={"note": playable[i % len(playable)], "velocity": 100}))
+                results["play_notes_chord"] = await _drive(
+                    client, max(1, requests // 4), concurrency,
+                    lambda c, i: c.post("/play_notes", json={"notes": chord}))
+                results["get_note_group"] = await _drive(
+                    client, requests, concurrency,
+                    lambda c, i: c.get("/get_note_group", params={"note": i % 128}))
+
+                upload = await client.post("/upload_midi/", files={
+                    "file": ("bench.mid", synthetic_midi(events, 8, 16), "audio/midi")})
+                upload.raise_for_status()
+                session_id = upload.json()["session_id"]
+                total = events
+                results["parse_midi_page"] = await _drive(
+                    client, max(1, requests // 10), concurrency,
+                    lambda c, i: c.post("/parse_midi/", data={
+                        "session_id": session_id, "offset": (i * 1000) % total, "limit": 1000}))
+                await client.post("/cleanup/", params={"session_id": session_id})
+    return results
+
+
+def bench_http(requests: int, concurrency: int, events: int) -> dict:
+    return asyncio.run(_bench_http(requests, concurrency, events))
+
+
+# ---------- 输出与比较 ----------
+
+def _metadata(args) -> dict:
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                                text=True, timeout=5).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        commit = None
+    return {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "commit": commit,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "numpy": np.__version__,
+        "args": vars(args)
+    }
+
+
+def _flatten(value, prefix: str = "") -> Dict[str, float]:
+    if isinstance(value, dict):
+        out = {}
+        for key, item in value.items():
+            out.update(_flatten(item, f"{prefix}.{key}" if prefix else str(key)))
+        return out
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return {prefix: float(value)}
+    return {}
+
+
+def compare(baseline: dict, current: dict):
+    """
+    逐项打印两次结果中都存在的数值指标及其比值
+    """
+    old = _flatten(baseline.get("results", {}))
+    new = _flatten(current.get("results", {}))
+    print(f"{'指标':<60} {'基线':>14} {'本次':>14} {'比值':>8}")
+    for key in sorted(old.keys() & new.keys()):
+        ratio = f"{new[key] / old[key]:.2f}" if old[key] else "-"
+        print(f"{key:<60} {old[key]:>14.4g} {new[key]:>14.4g} {ratio:>8}")
+
+
+def _int_list(text: str) -> List[int]:
+    return [int(item) for item in text.split(",") if item]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="解析、音符分发、混音与 HTTP 接口的基准测试")
+    parser.add_argument("--suites", default=",".join(SUITES), help=f"要运行的测试，可选 {','.join(SUITES)}")
+    parser.add_argument("--events", type=int, default=100_000, help="合成 MIDI 的音符事件数")
+    parser.add_argument("--tracks", type=int, default=8, help="合成 MIDI 的轨道数（含指挥轨）")
+    parser.add_argument("--tempo-changes", type=int, default=16, help="合成 MIDI 的变速次数")
+    parser.add_argument("--repeat", type=int, default=3, help="解析重复次数（取最快一次）与启动测试的导入次数")
+    parser.add_argument("--parsers", default="fast,mido", help="参与比较的解析器：fast,mido")
+    parser.add_argument("--notes", type=int, default=2000, help="音符分发测试的音符数")
+    parser.add_argument("--rate", type=float, default=1000.0, help="分发队列测试的提交速率（音符/秒），0 为不限速")
+    parser.add_argument("--voices", default="1,8,32,64,128", help="混音测试的同时发声数")
+    parser.add_argument("--blocks", type=int, default=500, help="每个发声数下混音的块数")
+    parser.add_argument("--requests", type=int, default=2000, help="HTTP 测试每个接口的请求数")
+    parser.add_argument("--concurrency", type=int, default=16, help="HTTP 测试的并发数")
+    parser.add_argument("--out", default=None, help="结果 JSON 文件")
+    parser.add_argument("--compare", default=None, help="用于比较的基线结果 JSON 文件")
+    args = parser.parse_args(argv)
+
+    suites = [s for s in args.suites.split(",") if s]
+    unknown = set(suites) - set(SUITES)
+    if unknown:
+        parser.error(f"未知的测试: {sorted(unknown)}")
+
+    results = {}
+    for suite in suites:
+        print(f"[基准] 运行 {suite} ...", file=sys.stderr)
+        started = time.perf_counter()
+        if suite == "parse":
+            results[suite] = bench_parse(args.events, args.tracks, args.tempo_changes, args.repeat,
+                                         [p for p in args.parsers.split(",") if p])
+        elif suite == "dispatch":
+            results[suite] = bench_dispatch(args.notes, args.rate)
+        elif suite == "mixer":
+            results[suite] = bench_mixer(_int_list(args.voices), args.blocks)
+        elif suite == "startup":
+            from benchmarks.startup import startup_report
+            root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+            results[suite] = startup_report(["server"], repeat=args.repeat, cwd=root)
+        else:
+            results[suite] = bench_http(args.requests, args.concurrency, min(args.events, 20_000))
+        print(f"[基准] {suite} 完成，耗时 {time.perf_counter() - started:.1f}s", file=sys.stderr)
+
+    report = {"meta": _metadata(args), "results": results}
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(text)
+        print(f"[基准] 结果已写入 {args.out}", file=sys.stderr)
+    else:
+        print(text)
+
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            compare(json.load(f), report)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,108 @@
+# benchmarks/startup.py
+#
+# 启动耗时报告：在全新的子进程中用 -X importtime 导入指定模块，统计总耗时、最慢的模块、
+# 子进程内存峰值，以及哪些较重的音频 / MIDI 后端在导入时就被加载
+#     python -m benchmarks.startup server midi.midi_player --top 15
+
+import argparse
+import json
+import os
+import re
+import statistics
+import subprocess
+import sys
+from typing import List
+
+# 启动时不应加载、只在真正用到时才导入的后端
+HEAVY_BACKENDS = ("mido", "pydub", "keyboard", "sounddevice", "librosa", "soundfile", "rtmidi")
+
+_IMPORTTIME_LINE = re.compile(r"import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)")
+
+# 子进程中执行：导入目标模块后输出已加载的后端、音源组是否已扫描与 RSS 峰值
+_PROBE = """
+import json, resource, sys, time
+started = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - started
+config = sys.modules.get("config")
+print(json.dumps({{
+    "seconds": elapsed,
+    "backends": sorted(name for name in {backends!r} if name in sys.modules),
+    "sound_groups_scanned": bool(config and getattr(config, "_sound_groups", None) is not None),
+    "maxrss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+}}))
+"""
+
+
+def measure_import(module: str, cwd: str = None) -> dict:
+    """
+    在新的解释器中导入一次 module，返回耗时、加载的后端与逐模块 importtime 记录
+    """
+    code = _PROBE.format(module=module, backends=HEAVY_BACKENDS)
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", code], cwd=cwd,
+                            capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(f"导入 {module} 失败: {result.stderr.strip().splitlines()[-1]}")
+    probe = json.loads(result.stdout.strip().splitlines()[-1])
+    modules = []
+    for line in result.stderr.splitlines():
+        match = _IMPORTTIME_LINE.match(line)
+        if match:
+            self_us, cumulative_us, indent, name = match.groups()
+            modules.append({"module": name, "self_ms": int(self_us) / 1000,
+                            "cumulative_ms": int(cumulative_us) / 1000, "depth": (len(indent) - 1) // 2})
+    probe["modules"] = modules
+    return probe
+
+
+def startup_report(modules: List[str], repeat: int = 5, top: int = 10, cwd: str = None) -> dict:
+    """
+    每个模块重复导入 repeat 次（每次新进程），报告耗时中位数、最慢的 top 个模块与内存峰值
+    """
+    report = {}
+    for module in modules:
+        runs = [measure_import(module, cwd) for _ in range(repeat)]
+        last = runs[-1]
+        # 目标模块直接导入的各模块（含其依赖）的累计耗时；importtime 先输出子模块再输出父模块
+        direct, children = {}, {}
+        for item in last["modules"]:
+            if item["depth"] == 1:
+                children[item["module"]] = item["cumulative_ms"]
+            elif item["depth"] == 0:
+                if item["module"] == module:
+                    direct = children
+                children = {}
+        report[module] = {
+            "seconds_median": round(statistics.median(r["seconds"] for r in runs), 4),
+            "seconds_min": round(min(r["seconds"] for r in runs), 4),
+            "maxrss_mb": round(statistics.median(r["maxrss_kb"] for r in runs) / 1024, 1),
+            "modules_loaded": len(last["modules"]),
+            "backends_loaded": last["backends"],
+            "sound_groups_scanned": last["sound_groups_scanned"],
+            "slowest_direct_imports_ms": dict(sorted(direct.items(), key=lambda kv: -kv[1])[:top]),
+            "slowest_self_ms": {item["module"]: item["self_ms"] for item in
+                                sorted(last["modules"], key=lambda m: -m["self_ms"])[:top]}
+        }
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="统计模块导入耗时、内存峰值与启动时加载的后端")
+    parser.add_argument("modules", nargs="*", default=["server"], help="要导入的模块，默认 server")
+    parser.add_argument("--repeat", type=int, default=5, help="每个模块在新进程中导入的次数")
+    parser.add_argument("--top", type=int, default=10, help="列出最慢的模块数")
+    parser.add_argument("--out", default=None, help="结果 JSON 文件")
+    args = parser.parse_args(argv)
+
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    report = startup_report(args.modules, args.repeat, args.top, cwd=root)
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(text)
+    print(text)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
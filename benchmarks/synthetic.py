@@ -0,0 +1,59 @@
+# benchmarks/synthetic.py
+
+import random
+import struct
+from typing import List
+
+
+def _varint(value: int) -> bytes:
+    out = [value & 0x7F]
+    value >>= 7
+    while value:
+        out.append(0x80 | (value & 0x7F))
+        value >>= 7
+    return bytes(reversed(out))
+
+
+def _track(events: List[bytes]) -> bytes:
+    body = b"".join(events) + b"\x00\xff\x2f\x00"  # End of Track
+    return b"MTrk" + struct.pack(">I", len(body)) + body
+
+
+def synthetic_midi(events: int = 100_000, tracks: int = 8, tempo_changes: int = 16,
+                   ticks_per_beat: int = 480, seed: int = 0) -> bytes:
+    """
+    生成 type 1 的合成 MIDI 文件内容：
+    第 0 轨为指挥轨，均匀分布 tempo_changes 次变速；其余轨道各占一个通道，
+    以 program_change 开头，note_on / note_off 成对出现并使用 running status，共约 events 个音符事件
+    相同参数和 seed 总是生成相同的字节，便于多次运行之间比较
+    """
+    rng = random.Random(seed)
+    note_tracks = max(1, tracks - 1)
+    pairs_per_track = max(1, events // (2 * note_tracks))
+    step = 60  # 每个音符事件之间的平均 tick 间隔
+    total_ticks = pairs_per_track * 2 * step
+
+    conductor = [b"\x00\xff\x51\x03" + (500000).to_bytes(3, "big")]
+    last_tick = 0
+    for i in range(1, tempo_changes + 1):
+        tick = total_ticks * i // (tempo_changes + 1)
+        tempo = rng.randint(300000, 900000)
+        conductor.append(_varint(tick - last_tick) + b"\xff\x51\x03" + tempo.to_bytes(3, "big"))
+        last_tick = tick
+    chunks = [_track(conductor)]
+
+    for t in range(note_tracks):
+        channel = t % 16
+        track = [b"\x00" + bytes((0xC0 | channel, rng.randint(0, 127)))]
+        # 第一个 note_on 带状态字节，其后依靠 running status（note_off 用力度为 0 的 note_on 表示）
+        status = bytes((0x90 | channel,))
+        for i in range(pairs_per_track):
+            note = rng.randint(36, 96)
+            on = bytes((note, rng.randint(1, 127)))
+            off = bytes((note, 0))
+            track.append(_varint(rng.randint(0, step)) + (status if i == 0 else b"") + on)
+            track.append(_varint(rng.randint(0, step)) + off)
+        chunks.append(_track(track))
+
+    header = b"MThd" + struct.pack(">IHHH", 6, 1, len(chunks), ticks_per_beat)
+    return header + b"".join(chunks)
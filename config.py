@@ -4,7 +4,9 @@ import os
 
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 SOUNDS_DIR = os.path.join(BASE_DIR, "resources/sounds")
+SAMPLE_PACK_DIR = os.path.join(BASE_DIR, "resources/sample_packs")
 MAPPINGS_DIR = os.path.join(BASE_DIR, "resources/mappings")
+PARSE_CACHE_DIR = os.path.join(BASE_DIR, "resources/parse_cache")
 
 # 默认的 GM 音色编号到音源组名映射
 DEFAULT_PROGRAM_TO_GROUP = {
@@ -23,6 +25,74 @@ DEFAULT_PROGRAM_TO_GROUP = {
     128: "drum_kit"  # 特例：channel 9 为打击乐器，可特殊处理
 }
 
+# 混音器参数：单一持久输出流的采样率、声道数与每块帧数
+MIXER_SAMPLE_RATE = 44100
+MIXER_CHANNELS = 2
+MIXER_BLOCK_SIZE = 256
+
+# 最大同时发声数与抢占策略（oldest / quietest / same_note），限制每个音频块的最坏开销
+MAX_POLYPHONY = 64
+VOICE_STEALING = "oldest"
+# 被抢占声部的淡出时长（毫秒），避免截断爆音
+VOICE_STEAL_FADE_MS = 5
+# note_off 后的释音淡出时长（毫秒）
+NOTE_RELEASE_MS = 80
+
+# 音符分发队列：最大深度与队列满时的策略（reject / drop_oldest / drop_newest）
+NOTE_QUEUE_MAX_DEPTH = 256
+NOTE_QUEUE_POLICY = "reject"
+
+# WebSocket 实时演奏：服务器向客户端发送 ping 测量往返延迟的间隔（秒），0 表示不发送
+LIVE_PING_INTERVAL = 5
+
+# MIDI 回放调度：提前调度的时长与调度线程的唤醒间隔（毫秒）
+PLAYBACK_LOOKAHEAD_MS = 100
+PLAYBACK_INTERVAL_MS = 20
+
+# 离线渲染：每次混音的块大小（帧）与最后一个事件之后保留的余音时长（秒）
+RENDER_BLOCK_FRAMES = 4096
+RENDER_TAIL_SEC = 2.0
+
+# 批量解析/渲染的工作进程数，None 表示使用全部 CPU 核心
+BATCH_WORKERS = None
+
+# MIDI 上传：单个文件的大小上限与流式写入的块大小（字节）
+UPLOAD_MAX_BYTES = 16 * 1024 * 1024
+UPLOAD_CHUNK_SIZE = 64 * 1024
+
+# 使用单遍快速解析器（midi/smf_parser.py）代替 mido 解析 MIDI 文件
+MIDI_FAST_PARSER = True
+
+# MIDI 解析缓存：按文件内容 SHA-256 缓存解析结果，内存 LRU 条目数与是否启用磁盘层
+PARSE_CACHE_MAX_ENTRIES = 64
+PARSE_CACHE_DISK = False
+
+# MIDI 会话管理：空闲过期时间、会话数与估算内存上限、后台清理间隔（秒）
+SESSION_TTL_SECONDS = 1800
+SESSION_MAX_COUNT = 100
+SESSION_MAX_BYTES = 512 * 1024 * 1024
+SESSION_REAP_INTERVAL = 60
+
+# 启动时是否把全部音源组预加载到内存样本库（默认关闭）
+# 开启后每个音符都命中样本库、首次发声没有解码延迟，但启动要扫描并加载全部音源组；
+# 关闭时样本在第一次使用时解码并进入 SAMPLE_CACHE_MAX_BYTES 预算的缓存，可用 /warmup_sounds/ 按需预热
+PRELOAD_SOUNDS = False
+# 预加载时优先使用 mmap 的编译样本包（见 sound/sample_pack.py），多个 worker 共享内存
+USE_SAMPLE_PACKS = True
+# 样本库之外按需解码的样本缓存的内存预算（字节），超出时按 LRU 淘汰未在发声的样本
+SAMPLE_CACHE_MAX_BYTES = 256 * 1024 * 1024
+
+# 指标：关闭时各组件的计数器与直方图为空操作，/metrics 只输出空内容
+METRICS_ENABLED = True
+# 采样分析器的采样间隔（毫秒）与记录的最大调用栈深度
+PROFILER_INTERVAL_MS = 10
+PROFILER_MAX_STACK_DEPTH = 64
+
+# 力度曲线：db 为 -20dB ~ 0dB 的默认曲线，另有 linear、exponential，或 128 项自定义增益表
+DEFAULT_VELOCITY_CURVE = "db"
+# 按音源组覆盖力度曲线，例如 {"lalala": {"type": "exponential", "exponent": 1.5}}
+VELOCITY_CURVES = {}
+
 
 
 def get_available_sound_groups():
@@ -34,6 +104,24 @@ def get_available_sound_groups():
                 groups.append(name)
     return groups
 
-AVAILABLE_SOUND_GROUPS = get_available_sound_groups()
 
-DEFAULT_SOUND_GROUP = AVAILABLE_SOUND_GROUPS[0] if AVAILABLE_SOUND_GROUPS else "default"
+# AVAILABLE_SOUND_GROUPS / DEFAULT_SOUND_GROUP 不在导入时扫描 SOUNDS_DIR，第一次访问时才扫描并缓存
+_sound_groups = None
+
+
+def refresh_sound_groups():
+    """
+    重新扫描音源组并替换缓存，返回新的音源组列表
+    """
+    global _sound_groups
+    _sound_groups = get_available_sound_groups()
+    return _sound_groups
+
+
+def __getattr__(name):
+    if name == "AVAILABLE_SOUND_GROUPS":
+        return _sound_groups if _sound_groups is not None else refresh_sound_groups()
+    if name == "DEFAULT_SOUND_GROUP":
+        groups = __getattr__("AVAILABLE_SOUND_GROUPS")
+        return groups[0] if groups else "default"
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,421 @@
+# metrics.py
+#
+# 进程内指标与采样分析器：
+#     计数器、仪表与直方图，由 /metrics 以 Prometheus 文本格式输出
+#     关闭 METRICS_ENABLED 时 counter() / histogram() 等返回空操作对象，timed_lock() 直接返回原始锁，热路径上几乎没有开销
+#     SamplingProfiler 在后台线程中定期采样所有线程的调用栈，只在手动开启期间运行
+
+import sys
+import threading
+import time
+from bisect import bisect_left
+from collections import Counter as _StackCounter
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+import config
+
+ENABLED = config.METRICS_ENABLED
+
+# 默认直方图分桶（秒），覆盖 100 微秒到 10 秒
+DEFAULT_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025,
+                   0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# 采集函数返回 (名称, 类型, 说明, [(标签字典, 值), ...]) 序列，在每次抓取时调用
+Sample = Tuple[Dict[str, str], float]
+Collector = Callable[[], Iterable[Tuple[str, str, str, List[Sample]]]]
+
+
+class _Metric:
+    """
+    带标签的指标：labels() 按标签值缓存子指标，没有标签时指标本身就是唯一的样本
+    更新不加锁，只做几次标量运算，可以在音频线程和回调线程中调用；多线程同时更新时偶尔丢失一次计数可以接受
+    """
+
+    type = None
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children: Dict[Tuple[str, ...], "_Metric"] = {}
+
+    def labels(self, *values) -> "_Metric":
+        key = tuple(str(v) for v in values)
+        child = self._children.get(key)
+        if child is None:
+            if len(key) != len(self.labelnames):
+                raise ValueError(f"{self.name} 需要标签 {self.labelnames}")
+            child = self._children.setdefault(key, self._new_child())
+        return child
+
+    def _new_child(self) -> "_Metric":
+        return type(self)(self.name, self.documentation)
+
+    def _series(self) -> List[Tuple[Dict[str, str], "_Metric"]]:
+        if not self.labelnames:
+            return [({}, self)]
+        return [(dict(zip(self.labelnames, key)), child) for key, child in list(self._children.items())]
+
+
+class Counter(_Metric):
+    type = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()):
+        super().__init__(name, documentation, labelnames)
+        self.value = 0.0
+
+    def inc(self, amount: float = 1.0):
+        self.value += amount
+
+    def samples(self) -> List[Tuple[str, Dict[str, str], float]]:
+        return [(self.name, labels, child.value) for labels, child in self._series()]
+
+
+class Gauge(Counter):
+    type = "gauge"
+
+    def set(self, value: float):
+        self.value = value
+
+    def dec(self, amount: float = 1.0):
+        self.value -= amount
+
+
+class Histogram(_Metric):
+    type = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = (),
+                 buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # 最后一个桶对应 +Inf；counts 按桶分别计数，输出时再累加
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def _new_child(self) -> "Histogram":
+        return Histogram(self.name, self.documentation, buckets=self.buckets)
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def time(self) -> "_Timer":
+        """
+        with histogram.time(): ... 记录代码块耗时（秒）
+        """
+        return _Timer(self)
+
+    def samples(self) -> List[Tuple[str, Dict[str, str], float]]:
+        out = []
+        for labels, child in self._series():
+            cumulative = 0
+            for bound, count in zip(child.buckets + (float("inf"),), child.counts):
+                cumulative += count
+                out.append((f"{self.name}_bucket", dict(labels, le=_format_value(bound)), cumulative))
+            out.append((f"{self.name}_sum", labels, child.sum))
+            out.append((f"{self.name}_count", labels, child.count))
+        return out
+
+
+class _Timer:
+    __slots__ = ("histogram", "started")
+
+    def __init__(self, histogram: Histogram):
+        self.histogram = histogram
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.started)
+        return False
+
+
+class _NullMetric:
+    """
+    关闭指标时使用的空操作对象，接口与各指标类型一致
+    """
+
+    def labels(self, *values):
+        return self
+
+    def inc(self, amount: float = 1.0):
+        pass
+
+    def dec(self, amount: float = 1.0):
+        pass
+
+    def set(self, value: float):
+        pass
+
+    def observe(self, value: float):
+        pass
+
+    def time(self):
+        return _NULL_TIMER
+
+
+class _NullTimer:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+NULL = _NullMetric()
+_NULL_TIMER = _NullTimer()
+
+
+class TimedLock:
+    """
+    包装一把锁，把每次获取锁的等待时间记入直方图
+    """
+
+    __slots__ = ("_lock", "_histogram")
+
+    def __init__(self, lock, histogram: Histogram):
+        self._lock = lock
+        self._histogram = histogram
+
+    def acquire(self, blocking: bool = True, timeout: float = -1) -> bool:
+        started = time.perf_counter()
+        acquired = self._lock.acquire(blocking, timeout)
+        self._histogram.observe(time.perf_counter() - started)
+        return acquired
+
+    def release(self):
+        self._lock.release()
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc):
+        self._lock.release()
+        return False
+
+
+class Registry:
+    """
+    指标注册表：同名指标只注册一次，重复获取返回同一个对象（多个实例共享指标）
+    """
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._collectors: Dict[str, Collector] = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None:
+                if type(existing) is not type(metric) or existing.labelnames != metric.labelnames:
+                    raise ValueError(f"指标 {metric.name} 已以不同的类型或标签注册")
+                return existing
+            self._metrics[metric.name] = metric
+            return metric
+
+    def register_collector(self, name: str, collector: Collector):
+        """
+        注册抓取时才调用的采集函数，同名的后注册者替换先注册者
+        适合发声数、会话数这类已有统计字段的值，不在热路径上增加任何开销
+        """
+        with self._lock:
+            self._collectors[name] = collector
+
+    def render(self) -> str:
+        """
+        按 Prometheus 文本格式（0.0.4）输出全部指标
+        """
+        with self._lock:
+            metrics = list(self._metrics.values())
+            collectors = list(self._collectors.values())
+        lines = []
+        for metric in metrics:
+            _write_family(lines, metric.name, metric.type, metric.documentation, metric.samples())
+        for collector in collectors:
+            try:
+                families = list(collector())
+            except Exception as e:
+                print(f"[指标] 采集失败: {e}")
+                continue
+            for name, kind, documentation, samples in families:
+                _write_family(lines, name, kind, documentation,
+                              [(name, labels, value) for labels, value in samples])
+        return "\n".join(lines) + "\n" if lines else ""
+
+
+def _write_family(lines: List[str], name: str, kind: str, documentation: str, samples):
+    lines.append(f"# HELP {name} {_escape_help(documentation)}")
+    lines.append(f"# TYPE {name} {kind}")
+    for sample_name, labels, value in samples:
+        if labels:
+            label_text = ",".join(f'{k}="{_escape_label(v)}"' for k, v in labels.items())
+            lines.append(f"{sample_name}{{{label_text}}} {_format_value(value)}")
+        else:
+            lines.append(f"{sample_name} {_format_value(value)}")
+
+
+def _escape_help(text: str) -> str:
+    return text.replace("\\", "\\\\").replace("\n", "\\n")
+
+
+def _escape_label(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(value) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    if isinstance(value, bool):
+        return "1" if value else "0"
+    if isinstance(value, int) or float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+REGISTRY = Registry()
+
+
+def counter(name: str, documentation: str, labelnames: Tuple[str, ...] = ()):
+    if not ENABLED:
+        return NULL
+    return REGISTRY.register(Counter(name, documentation, labelnames))
+
+
+def gauge(name: str, documentation: str, labelnames: Tuple[str, ...] = ()):
+    if not ENABLED:
+        return NULL
+    return REGISTRY.register(Gauge(name, documentation, labelnames))
+
+
+def histogram(name: str, documentation: str, labelnames: Tuple[str, ...] = (),
+              buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+    if not ENABLED:
+        return NULL
+    return REGISTRY.register(Histogram(name, documentation, labelnames, buckets))
+
+
+def register_collector(name: str, collector: Collector):
+    if ENABLED:
+        REGISTRY.register_collector(name, collector)
+
+
+_LOCK_WAIT = histogram("lock_wait_seconds", "获取锁的等待时间", ("lock",),
+                       buckets=(0.000001, 0.00001, 0.0001, 0.001, 0.01, 0.1, 1.0))
+
+
+def timed_lock(name: str, lock=None):
+    """
+    返回记录等待时间的锁；关闭指标时直接返回原始锁
+    """
+    lock = lock if lock is not None else threading.Lock()
+    if not ENABLED:
+        return lock
+    return TimedLock(lock, _LOCK_WAIT.labels(name))
+
+
+def render() -> str:
+    return REGISTRY.render()
+
+
+class SamplingProfiler:
+    """
+    采样分析器：后台线程每隔 interval 秒读取一次所有线程的调用栈（sys._current_frames），
+    按折叠栈格式（"模块:函数;模块:函数 次数"）累计，可直接交给 flamegraph 工具
+    只在 start() 到 stop() 之间运行，未开启时没有任何开销
+    """
+
+    def __init__(self, interval: float = None, max_depth: int = None):
+        self.interval = interval or config.PROFILER_INTERVAL_MS / 1000
+        self.max_depth = max_depth or config.PROFILER_MAX_STACK_DEPTH
+        self._stacks = _StackCounter()
+        self._thread: Optional[threading.Thread] = None
+        self._running = False
+        self._lock = threading.Lock()
+        self.samples = 0
+        self.started_at = None
+        self.elapsed = 0.0
+
+    @property
+    def running(self) -> bool:
+        return self._running
+
+    def start(self, interval: float = None, reset: bool = True):
+        with self._lock:
+            if self._running:
+                return
+            if interval:
+                self.interval = interval
+            if reset:
+                self._stacks.clear()
+                self.samples = 0
+                self.elapsed = 0.0
+            self._running = True
+            self.started_at = time.perf_counter()
+            self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        with self._lock:
+            if not self._running:
+                return
+            self._running = False
+            thread = self._thread
+            self._thread = None
+        thread.join()
+        self.elapsed += time.perf_counter() - self.started_at
+
+    def _run(self):
+        me = threading.get_ident()
+        names = {}
+        while self._running:
+            for ident, frame in sys._current_frames().items():
+                if ident == me:
+                    continue
+                stack = []
+                while frame is not None and len(stack) < self.max_depth:
+                    code = frame.f_code
+                    label = names.get(code)
+                    if label is None:
+                        module = frame.f_globals.get("__name__", "?")
+                        label = names[code] = f"{module}:{code.co_name}"
+                    stack.append(label)
+                    frame = frame.f_back
+                stack.reverse()
+                self._stacks[";".join(stack)] += 1
+            self.samples += 1
+            time.sleep(self.interval)
+
+    def collapsed(self, limit: int = None) -> str:
+        """
+        折叠栈文本，按采样次数从多到少
+        """
+        return "\n".join(f"{stack} {count}" for stack, count in self._stacks.most_common(limit))
+
+    def top(self, limit: int = 20) -> List[dict]:
+        """
+        按栈顶函数（自身耗时）汇总的前 limit 项
+        """
+        leaves = _StackCounter()
+        for stack, count in list(self._stacks.items()):
+            leaves[stack.rsplit(";", 1)[-1]] += count
+        total = sum(leaves.values()) or 1
+        return [{"function": name, "samples": count, "fraction": round(count / total, 4)}
+                for name, count in leaves.most_common(limit)]
+
+    def stats(self) -> dict:
+        elapsed = self.elapsed + (time.perf_counter() - self.started_at if self._running else 0.0)
+        return {
+            "running": self._running,
+            "interval_ms": round(self.interval * 1000, 3),
+            "samples": self.samples,
+            "seconds": round(elapsed, 3),
+            "stacks": len(self._stacks)
+        }
+
+
+profiler = SamplingProfiler()
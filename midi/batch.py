@@ -0,0 +1,158 @@
+# midi/batch.py
+
+import argparse
+import os
+import sys
+import time
+from typing import TYPE_CHECKING, Callable, Iterable, Iterator, List, Optional
+import config
+from midi.midi_player import MidiPlayer
+from midi.parse_cache import file_sha256
+
+if TYPE_CHECKING:
+    from concurrent.futures import ProcessPoolExecutor
+
+MIDI_EXTENSIONS = (".mid", ".midi")
+JOBS = ("parse", "render")
+
+# 渲染任务在每个工作进程中只初始化一次样本库；样本包通过 mmap 加载，各进程共享同一份物理内存
+_worker_sound_manager = None
+
+
+def collect_midi_files(inputs: Iterable[str]) -> List[str]:
+    """
+    展开输入：文件原样保留，目录递归查找 .mid / .midi
+    """
+    paths = []
+    for item in inputs:
+        if os.path.isdir(item):
+            for root, _, files in os.walk(item):
+                paths.extend(os.path.join(root, name) for name in sorted(files)
+                             if name.lower().endswith(MIDI_EXTENSIONS))
+        else:
+            paths.append(item)
+    return paths
+
+
+def _parse_job(path: str) -> dict:
+    # 结果中只有 ParsedMidi 的 NumPy 列和少量字典，进程间传输开销与事件数成正比但远小于 MidiEvent 列表
+    started = time.perf_counter()
+    parsed = MidiPlayer(path).parse()
+    return {
+        "sha256": file_sha256(path),
+        "parsed": parsed,
+        "events": len(parsed.table),
+        "duration": float(parsed.table.time[-1]) if len(parsed.table) else 0.0,
+        "seconds": time.perf_counter() - started
+    }
+
+
+def _render_job(path: str, output_dir: str, tempo: float) -> dict:
+    global _worker_sound_manager
+    from midi.renderer import OfflineRenderer
+    from sound.sound_manager import SoundManager
+    from sound.sound_mapping import SoundMapping
+
+    if _worker_sound_manager is None:
+        _worker_sound_manager = SoundManager(SoundMapping())
+        _worker_sound_manager.preload()
+    started = time.perf_counter()
+    player = MidiPlayer(path)
+    player.parse()
+    output = os.path.join(output_dir, f"{os.path.splitext(os.path.basename(path))[0]}.wav")
+    stats = OfflineRenderer(player, _worker_sound_manager, tempo=tempo).render_to_wav(output)
+    return {"output": output, "render": stats, "seconds": time.perf_counter() - started}
+
+
+def create_pool(workers: Optional[int] = None) -> "ProcessPoolExecutor":
+    """
+    创建批处理进程池：使用 spawn 启动方式，工作进程不继承父进程的线程、锁和音频流
+    （服务进程中混音线程、分发线程持有的锁在 fork 出的子进程里可能永远处于锁定状态）
+    """
+    # 进程池连带 multiprocessing 在第一次需要时才导入，不拖慢模块导入
+    import multiprocessing
+    from concurrent.futures import ProcessPoolExecutor
+    workers = workers or config.BATCH_WORKERS or os.cpu_count() or 1
+    return ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+
+
+def run_batch(paths: List[str], job: str = "parse", workers: Optional[int] = None,
+              output_dir: Optional[str] = None, tempo: float = 1.0,
+              progress: Callable[[int, int, dict], None] = None,
+              executor: "ProcessPoolExecutor" = None) -> Iterator[dict]:
+    """
+    把解析或渲染任务分发到进程池，按完成顺序产出结果
+    每个结果包含 path、ok、error、seconds 及任务相关字段；单个文件失败不影响其余文件
+    progress(done, total, result) 在每个文件完成时调用
+    传入 executor 时复用该进程池（workers 被忽略，用完不关闭），否则临时创建一个并在结束时关闭
+    """
+    if job not in JOBS:
+        raise ValueError(f"未知的任务类型: {job}，可选 {JOBS}")
+    if job == "render":
+        if not output_dir:
+            raise ValueError("渲染任务需要指定输出目录")
+        os.makedirs(output_dir, exist_ok=True)
+    from concurrent.futures import as_completed
+    owned = executor is None
+    if owned:
+        workers = workers or config.BATCH_WORKERS or os.cpu_count() or 1
+        executor = create_pool(max(1, min(workers, len(paths) or 1)))
+    try:
+        if job == "parse":
+            futures = {executor.submit(_parse_job, path): path for path in paths}
+        else:
+            futures = {executor.submit(_render_job, path, output_dir, tempo): path for path in paths}
+        for done, future in enumerate(as_completed(futures), 1):
+            path = futures[future]
+            try:
+                result = {"path": path, "ok": True, "error": None, **future.result()}
+            except Exception as e:
+                result = {"path": path, "ok": False, "error": str(e) or type(e).__name__, "seconds": 0.0}
+            if progress is not None:
+                progress(done, len(futures), result)
+            yield result
+    finally:
+        if owned:
+            executor.shutdown(cancel_futures=True)
+
+
+def _print_progress(done: int, total: int, result: dict):
+    status = f"{result['seconds']:.3f}s" if result["ok"] else f"失败: {result['error']}"
+    print(f"[批处理] {done}/{total} {result['path']} {status}", file=sys.stderr)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="多进程批量解析或渲染 MIDI 文件")
+    parser.add_argument("job", choices=JOBS, help="任务类型")
+    parser.add_argument("inputs", nargs="+", help="MIDI 文件或目录")
+    parser.add_argument("--workers", type=int, default=None, help="工作进程数，默认全部 CPU 核心")
+    parser.add_argument("--out", default=None, help="输出目录：渲染的 WAV，或解析结果的 npz（与解析缓存磁盘层格式相同）")
+    parser.add_argument("--tempo", type=float, default=1.0, help="渲染速度倍率")
+    args = parser.parse_args(argv)
+
+    paths = collect_midi_files(args.inputs)
+    if not paths:
+        print("[批处理] 没有找到 MIDI 文件", file=sys.stderr)
+        return 1
+    if args.job == "parse" and args.out:
+        os.makedirs(args.out, exist_ok=True)
+
+    started = time.perf_counter()
+    failed = events = 0
+    for result in run_batch(paths, args.job, args.workers, args.out, args.tempo, _print_progress):
+        if not result["ok"]:
+            failed += 1
+        elif args.job == "parse":
+            events += result["events"]
+            if args.out:
+                result["parsed"].save(os.path.join(args.out, f"{result['sha256']}.npz"))
+    elapsed = time.perf_counter() - started
+    summary = f"[批处理] {len(paths) - failed}/{len(paths)} 个文件完成，耗时 {elapsed:.2f}s"
+    if args.job == "parse":
+        summary += f"，共 {events} 个事件（{events / elapsed:.0f} 事件/秒）"
+    print(summary, file=sys.stderr)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,203 @@
+# midi/event_table.py
+
+from array import array
+from typing import Callable, Dict, List, Optional, Sequence
+import numpy as np
+
+# 事件类型编码，列中存储下标
+EVENT_TYPES = ("note_on", "note_off", "program_change")
+TYPE_CODES = {name: code for code, name in enumerate(EVENT_TYPES)}
+NOTE_ON, NOTE_OFF, PROGRAM_CHANGE = range(len(EVENT_TYPES))
+
+# 整型列中表示“无此字段”的值
+MISSING = -1
+
+COLUMNS = ("time", "tick", "type", "channel", "note", "velocity", "program")
+
+
+class EventTable:
+    """
+    列式事件表：time/tick/type/channel/note/velocity/program 七个并行 NumPy 数组
+    相比每个事件一个 Python 对象，内存更紧凑，排序、筛选和序列化都可以整列处理
+    """
+
+    def __init__(self, time: np.ndarray, tick: np.ndarray, type: np.ndarray, channel: np.ndarray,
+                 note: np.ndarray, velocity: np.ndarray, program: np.ndarray):
+        self.time = time            # float64，秒
+        self.tick = tick            # int64，绝对 tick
+        self.type = type            # uint8，EVENT_TYPES 下标
+        self.channel = channel      # int8，MISSING 表示无
+        self.note = note            # int16
+        self.velocity = velocity    # int16
+        self.program = program      # int16
+
+    @classmethod
+    def empty(cls) -> "EventTable":
+        return EventBuilder().build(lambda ticks: np.zeros(len(ticks), dtype=np.float64))
+
+    @classmethod
+    def from_arrays(cls, arrays: Dict[str, np.ndarray]) -> "EventTable":
+        return cls(*(arrays[name] for name in COLUMNS))
+
+    def to_arrays(self) -> Dict[str, np.ndarray]:
+        return {name: getattr(self, name) for name in COLUMNS}
+
+    def __len__(self) -> int:
+        return self.time.shape[0]
+
+    @property
+    def nbytes(self) -> int:
+        return sum(getattr(self, name).nbytes for name in COLUMNS)
+
+    def take(self, index) -> "EventTable":
+        """
+        按下标数组或切片取子表
+        """
+        return EventTable(*(getattr(self, name)[index] for name in COLUMNS))
+
+    def select(self, start_sec: float = None, end_sec: float = None, channel: int = None,
+               types: Sequence[str] = None) -> np.ndarray:
+        """
+        按时间窗 [start_sec, end_sec)、通道和事件类型筛选，返回命中的下标数组
+        time 列已排序，时间窗用二分查找定位，其余条件只在窗口内做向量化比较
+        """
+        lo = 0 if start_sec is None else int(np.searchsorted(self.time, start_sec, side="left"))
+        hi = len(self) if end_sec is None else int(np.searchsorted(self.time, end_sec, side="left"))
+        hi = max(lo, hi)
+        mask = np.ones(hi - lo, dtype=bool)
+        if channel is not None:
+            mask &= self.channel[lo:hi] == channel
+        if types:
+            unknown = [t for t in types if t not in TYPE_CODES]
+            if unknown:
+                raise ValueError(f"未知的事件类型: {unknown}，可选 {EVENT_TYPES}")
+            mask &= np.isin(self.type[lo:hi], [TYPE_CODES[t] for t in types])
+        return np.flatnonzero(mask) + lo
+
+    def event(self, i: int):
+        from midi.midi_player import MidiEvent
+        return MidiEvent(
+            float(self.time[i]),
+            EVENT_TYPES[self.type[i]],
+            _opt(self.channel[i]),
+            _opt(self.note[i]),
+            _opt(self.velocity[i]),
+            program=_opt(self.program[i]),
+            tick=int(self.tick[i])
+        )
+
+    def to_records(self, group_of: Callable[[int], Optional[str]] = None) -> List[dict]:
+        """
+        整列转换为 /parse_midi/ 使用的字典列表，不经过 MidiEvent 对象
+        group_of 为 program → 音源组 的查找函数，每个不同的 program 只查一次
+        """
+        times = np.round(self.time, 3).tolist()
+        types = [EVENT_TYPES[code] for code in self.type.tolist()]
+        channels = _column(self.channel)
+        notes = _column(self.note)
+        velocities = _column(self.velocity)
+        programs = _column(self.program)
+
+        groups: Dict[Optional[int], Optional[str]] = {None: None}
+        if group_of is not None:
+            for program in np.unique(self.program[self.program != MISSING]).tolist():
+                groups[program] = group_of(program)
+
+        return [
+            {
+                "time": t,
+                "type": ty,
+                "channel": ch,
+                "note": n,
+                "velocity": v,
+                "program": p,
+                "group": groups.get(p)
+            }
+            for t, ty, ch, n, v, p in zip(times, types, channels, notes, velocities, programs)
+        ]
+
+
+def _opt(value) -> Optional[int]:
+    value = int(value)
+    return None if value == MISSING else value
+
+
+def _column(values: np.ndarray) -> list:
+    out = values.tolist()
+    if (values == MISSING).any():
+        out = [None if v == MISSING else v for v in out]
+    return out
+
+
+class EventBuilder:
+    """
+    解析时逐条追加事件，用 array 模块的紧凑数组暂存，最后按 tick 稳定排序生成 EventTable
+    """
+
+    def __init__(self):
+        self.tick = array("q")
+        self.type = array("B")
+        self.channel = array("b")
+        self.note = array("h")
+        self.velocity = array("h")
+        self.program = array("h")
+
+    def append(self, tick: int, type_code: int, channel: int = MISSING, note: int = MISSING,
+               velocity: int = MISSING, program: int = MISSING):
+        self.tick.append(tick)
+        self.type.append(type_code)
+        self.channel.append(channel)
+        self.note.append(note)
+        self.velocity.append(velocity)
+        self.program.append(program)
+
+    def __len__(self) -> int:
+        return len(self.tick)
+
+    def build(self, seconds_of_ticks: Callable[[np.ndarray], np.ndarray]) -> EventTable:
+        """
+        seconds_of_ticks 把 tick 数组换算为秒（通常是 TempoMap.to_seconds_array）
+        多轨事件依次追加后按 tick 稳定排序，同一时刻保持轨道顺序
+        """
+        tick = np.frombuffer(self.tick, dtype=np.int64) if len(self.tick) else np.zeros(0, dtype=np.int64)
+        order = np.argsort(tick, kind="stable")
+
+        def column(values: array, dtype) -> np.ndarray:
+            if not len(values):
+                return np.zeros(0, dtype=dtype)
+            return np.frombuffer(values, dtype=dtype)[order]
+
+        tick = tick[order]
+        time = np.asarray(seconds_of_ticks(tick), dtype=np.float64)
+        return EventTable(time, tick,
+                          column(self.type, np.uint8), column(self.channel, np.int8),
+                          column(self.note, np.int16), column(self.velocity, np.int16),
+                          column(self.program, np.int16))
+
+
+class EventListView(Sequence):
+    """
+    EventTable 的只读 MidiEvent 视图，按需构造事件对象，兼容原先的 List[MidiEvent] 用法
+    """
+
+    def __init__(self, table: EventTable):
+        self.table = table
+
+    def __len__(self) -> int:
+        return len(self.table)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self.table.event(i) for i in range(*index.indices(len(self.table)))]
+        if index < 0:
+            index += len(self.table)
+        if not 0 <= index < len(self.table):
+            raise IndexError("事件下标越界")
+        return self.table.event(index)
+
+    def __iter__(self):
+        for i in range(len(self.table)):
+            yield self.table.event(i)
+
+    def __repr__(self):
+        return f"<EventListView {len(self.table)} events>"
@@ -1,10 +1,12 @@
 # midi/input_listener.py
 
-import mido
-import threading
-import keyboard
+import time
+from collections import deque
+import config
+import metrics
 from sound.sound_mapping import SoundMapping
 from sound.sound_manager import SoundManager
+from sound.latency import LatencyStats
 
 # 默认的键盘键位映射：键盘按键 → MIDI音符编号
 # 这一映射可用于在无MIDI设备的环境下通过键盘演奏音符
@@ -25,10 +27,22 @@ DEFAULT_KEYBOARD_MAPPING = {
 }
 
 
+# 电脑键盘没有力度，按键统一使用该力度
+KEYBOARD_VELOCITY = 100
+# 延音踏板（CC64）的值不小于该阈值时视为踩下
+SUSTAIN_CONTROL = 64
+SUSTAIN_THRESHOLD = 64
+
+_INPUT_EVENTS = metrics.counter("input_note_events_total", "输入设备触发的音符数", ("source",))
+_INPUT_LATENCY = metrics.histogram("input_to_mix_seconds", "输入消息到达到进入混音块的耗时")
+_INPUT_ERRORS = metrics.counter("input_errors_total", "输入监听与发声失败次数", ("source",))
+
+
 class MIDIInputListener:
     """
     支持同时监听 MIDI 输入设备与电脑键盘输入的监听器
-    接收到音符后调用 SoundManager 播放对应音频
+    MIDI 端口使用回调模式、键盘使用钩子，消息到达时立即打时间戳并直接交给 SoundManager，没有轮询线程
+    支持力度、note_off 释音和延音踏板；每个音符从到达到进入混音块的延迟单独统计
     """
 
     def __init__(self, keyboard_mapping=None):
@@ -38,15 +52,30 @@ class MIDIInputListener:
         # 使用用户自定义或默认的键盘映射
         self.keyboard_mapping = keyboard_mapping or DEFAULT_KEYBOARD_MAPPING
 
-        # 控制线程运行状态
         self.running = False
-        self.midi_thread = None
-        self.keyboard_thread = None
+        self.port = None
+        self.keyboard_hook = None
+        # mido 与 keyboard 在真正开始监听时才导入：只用 MIDI 时不加载 keyboard（在 Linux 上它需要 root 权限）
+        self._keyboard = None
+
+        # MIDI 回调线程与键盘钩子线程都会修改以下状态
+        self._state_lock = metrics.timed_lock("input_listener")
+        self._held = set()        # 按下未松开的 tag
+        self._sustained = set()   # 已松开但被延音踏板保持的 tag
+        self._sustain = {}        # 通道 -> 延音踏板是否踩下
+        self._keys_down = set()   # 键盘按下的键，用于忽略自动重复
+        # 已提交但尚未进入混音的音符到达时间：立即起音的声部按提交顺序进入混音，先进先出即可一一对应
+        self._arrivals = deque()
+
+        self.events = 0
+        self.errors = 0
+        self.latency = LatencyStats()  # 消息到达到进入混音块的耗时（秒）
 
     def list_devices(self):
         """
         列出所有可用的MIDI输入设备
         """
+        import mido
         inputs = mido.get_input_names()
         print("可用 MIDI 输入设备:")
         for idx, name in enumerate(inputs):
@@ -55,59 +84,167 @@ class MIDIInputListener:
 
     def start_midi_listening(self, device_name=None):
         """
-        启动 MIDI 输入监听线程，可选指定设备名称
+        以回调模式打开 MIDI 输入端口，可选指定设备名称
         """
-
-        def midi_loop():
-            try:
-                with mido.open_input(device_name) as inport:
-                    print(f"[MIDI] 监听设备: {device_name or '默认'}")
-                    for msg in inport:
-                        if not self.running:
-                            break
-                        if msg.type == 'note_on' and msg.velocity > 0:
-                            self.sound_manager.play_note(msg.note)
-            except Exception as e:
-                print(f"[MIDI] 监听失败: {e}")
-
-        # 启动后台线程
-        self.midi_thread = threading.Thread(target=midi_loop, daemon=True)
-        self.midi_thread.start()
+        try:
+            import mido
+            self.port = mido.open_input(device_name, callback=self._on_midi)
+            print(f"[MIDI] 监听设备: {device_name or '默认'}")
+        except Exception as e:
+            _INPUT_ERRORS.labels("midi").inc()
+            print(f"[MIDI] 监听失败: {e}")
 
     def start_keyboard_listening(self):
         """
-        启动键盘输入监听线程
+        注册键盘钩子，按下起音、松开释音
         """
-
-        def keyboard_loop():
+        try:
+            import keyboard
+            self._keyboard = keyboard
+            self.keyboard_hook = keyboard.hook(self._on_key)
             print("[键盘] 监听启动，可按 z/s/x/d/c... 进行测试")
-            while self.running:
-                event = keyboard.read_event()
-                if event.event_type == keyboard.KEY_DOWN:
-                    key = event.name.lower()
-                    if key in self.keyboard_mapping:
-                        note = self.keyboard_mapping[key]
-                        self.sound_manager.play_note(note)
-
-        # 启动后台线程
-        self.keyboard_thread = threading.Thread(target=keyboard_loop, daemon=True)
-        self.keyboard_thread.start()
+        except Exception as e:
+            _INPUT_ERRORS.labels("key").inc()
+            print(f"[键盘] 监听失败: {e}")
 
     def start_listening(self, device_name=None):
         """
         启动 MIDI 和键盘监听
         """
+        if config.PRELOAD_SOUNDS and self.sound_manager.sample_bank is None:
+            self.sound_manager.preload()
+        # 提前打开输出流，第一个音符不承担打开设备的开销
+        self.sound_manager.mixer.start()
         self.running = True
         self.start_midi_listening(device_name)
         self.start_keyboard_listening()
 
     def stop_listening(self):
         """
-        停止监听线程
+        停止监听：关闭端口、注销钩子并松开所有音符；不等待任何阻塞读取，不会卡住
         """
         self.running = False
-        if self.midi_thread and self.midi_thread.is_alive():
-            self.midi_thread.join()
-        if self.keyboard_thread and self.keyboard_thread.is_alive():
-            self.keyboard_thread.join()
-        print("监听已停止")
+        if self.port is not None:
+            try:
+                self.port.close()
+            except Exception as e:
+                print(f"[MIDI] 关闭端口失败: {e}")
+            self.port = None
+        if self.keyboard_hook is not None:
+            try:
+                self._keyboard.unhook(self.keyboard_hook)
+            except (KeyError, ValueError):
+                pass
+            self.keyboard_hook = None
+        with self._state_lock:
+            remaining = self._held | self._sustained
+            self._held.clear()
+            self._sustained.clear()
+        for tag in remaining:
+            self.sound_manager.release_note(tag)
+        summary = self.latency.summary()
+        self.sound_manager.close()
+        print(f"监听已停止，共 {self.events} 个音符，输入延迟 p50 {summary['p50']}ms / p99 {summary['p99']}ms")
+
+    # ---------- 输入回调 ----------
+
+    def _on_midi(self, msg):
+        arrived = time.perf_counter()
+        if not self.running:
+            return
+        if msg.type == 'note_on' and msg.velocity > 0:
+            self._note_on(('midi', msg.channel, msg.note), msg.note, msg.velocity, msg.channel, arrived)
+        elif msg.type in ('note_on', 'note_off'):
+            self._note_off(('midi', msg.channel, msg.note), msg.channel)
+        elif msg.type == 'control_change' and msg.control == SUSTAIN_CONTROL:
+            self._set_sustain(msg.channel, msg.value >= SUSTAIN_THRESHOLD)
+
+    def _on_key(self, event):
+        arrived = time.perf_counter()
+        if not self.running or not event.name:
+            return
+        key = event.name.lower()
+        note = self.keyboard_mapping.get(key)
+        if note is None:
+            return
+        tag = ('key', note)
+        if event.event_type == self._keyboard.KEY_DOWN:
+            if key in self._keys_down:
+                return  # 按住时的自动重复
+            self._keys_down.add(key)
+            self._note_on(tag, note, KEYBOARD_VELOCITY, None, arrived)
+        else:
+            self._keys_down.discard(key)
+            self._note_off(tag, None)
+
+    # ---------- 发声 ----------
+
+    def _note_on(self, tag, note: int, velocity: int, channel, arrived: float):
+        # 锁内只判断并更新按键状态，调用 SoundManager 放在锁外，避免解码样本或等待混音器锁时阻塞另一路输入
+        # 同一 tag 的消息总是来自同一个输入线程，锁外调用不会打乱同一音符的起音与释音顺序
+        with self._state_lock:
+            retrigger = tag in self._sustained or tag in self._held
+            self._sustained.discard(tag)
+            self._held.add(tag)
+        if retrigger:
+            # 同一音符重新触发：先让旧声部释音，release 在混音器中先于新声部处理
+            self.sound_manager.release_note(tag)
+        try:
+            self._arrivals.append(arrived)
+            self.sound_manager.schedule_note(note, velocity, tag=tag, owner=self)
+        except Exception as e:
+            self._arrivals.pop()
+            with self._state_lock:
+                self._held.discard(tag)
+                self.errors += 1
+            _INPUT_ERRORS.labels(tag[0]).inc()
+            print(f"播放音符失败: {e}")
+            return
+        with self._state_lock:
+            self.events += 1
+        _INPUT_EVENTS.labels(tag[0]).inc()
+
+    def _note_off(self, tag, channel):
+        with self._state_lock:
+            if tag not in self._held:
+                return
+            self._held.discard(tag)
+            sustained = bool(self._sustain.get(channel))
+            if sustained:
+                self._sustained.add(tag)
+        if not sustained:
+            self.sound_manager.release_note(tag)
+
+    def _set_sustain(self, channel, down: bool):
+        with self._state_lock:
+            self._sustain[channel] = down
+            if down:
+                return
+            # 松开踏板：释放该通道所有被保持的音符
+            released = {tag for tag in self._sustained if tag[0] == "midi" and tag[1] == channel}
+            self._sustained -= released
+        for tag in released:
+            self.sound_manager.release_note(tag)
+
+    # ---------- 混音器回调 ----------
+
+    def on_voice_start(self, late_frames: int):
+        try:
+            arrived = self._arrivals.popleft()
+        except IndexError:
+            return
+        elapsed = time.perf_counter() - arrived
+        self.latency.record(elapsed)
+        _INPUT_LATENCY.observe(elapsed)
+
+    def stats(self) -> dict:
+        mixer = self.sound_manager.mixer
+        return {
+            "events": self.events,
+            "errors": self.errors,
+            "held": len(self._held),
+            "sustained": len(self._sustained),
+            # 进入混音块之后还要经过输出缓冲，这部分由块大小决定
+            "output_buffer_ms": round(mixer.block_size / mixer.sample_rate * 1000, 3),
+            "input_to_mix_ms": self.latency.summary()
+        }
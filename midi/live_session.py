@@ -0,0 +1,259 @@
+# midi/live_session.py
+
+import itertools
+import time
+from typing import Any, Dict, List, Optional, Tuple
+import config
+from sound.note_dispatcher import NoteDispatcher, QueueFullError
+from sound.sound_manager import SoundManager
+from sound.latency import LatencyStats
+from midi.playback import DRUM_CHANNEL, DRUM_PROGRAM
+
+# 原始 MIDI 通道消息的数据字节数，按状态字节高 4 位索引（0x8 ~ 0xE）
+_DATA_LENGTHS = {0x8: 2, 0x9: 2, 0xA: 2, 0xB: 2, 0xC: 1, 0xD: 1, 0xE: 2}
+
+_connection_ids = itertools.count(1)
+
+# 解析后的消息：(类型, 通道, 音符/音色, 力度, 指定音源组)
+LiveMessage = Tuple[str, int, int, int, Optional[str]]
+
+
+def parse_raw_midi(data: bytes) -> List[LiveMessage]:
+    """
+    解析二进制帧中连续的原始 MIDI 字节，支持 running status
+    只保留 note_on / note_off / program_change，其余通道消息、系统消息与 SysEx 被跳过
+    """
+    messages = []
+    status = 0
+    i, n = 0, len(data)
+    while i < n:
+        byte = data[i]
+        if byte >= 0xF8:        # 实时消息可以插在任何位置，不影响 running status
+            i += 1
+            continue
+        if byte == 0xF0:        # SysEx：跳到 0xF7
+            end = data.find(b"\xf7", i + 1)
+            i = n if end < 0 else end + 1
+            status = 0
+            continue
+        if byte >= 0xF0:        # 其余系统公共消息：清除 running status
+            i += 1
+            status = 0
+            continue
+        if byte & 0x80:
+            status = byte
+            i += 1
+        if not status:
+            i += 1              # 没有状态字节的孤立数据字节
+            continue
+
+        length = _DATA_LENGTHS[status >> 4]
+        if i + length > n:
+            raise ValueError("MIDI 消息不完整")
+        if any(b & 0x80 for b in data[i:i + length]):
+            raise ValueError(f"MIDI 数据字节无效（偏移 {i}）")
+        kind, channel = status >> 4, status & 0x0F
+        if kind == 0x9:
+            messages.append(("note_on", channel, data[i], data[i + 1], None))
+        elif kind == 0x8:
+            messages.append(("note_off", channel, data[i], 0, None))
+        elif kind == 0xC:
+            messages.append(("program_change", channel, data[i], 0, None))
+        i += length
+    return messages
+
+
+def parse_json_message(obj: Dict[str, Any]) -> LiveMessage:
+    """
+    解析一条 JSON 消息：
+        {"type": "note_on", "note": 60, "velocity": 100, "channel": 0, "group": "piano"}
+        {"type": "note_off", "note": 60, "channel": 0}
+        {"type": "program_change", "program": 24, "channel": 0}
+    """
+    kind = obj.get("type", "note_on")
+    channel = int(obj.get("channel", 0))
+    if not 0 <= channel <= 15:
+        raise ValueError(f"通道超出范围: {channel}")
+    if kind == "program_change":
+        program = int(obj["program"])
+        if not 0 <= program <= 127:
+            raise ValueError(f"音色编号超出范围: {program}")
+        return ("program_change", channel, program, 0, None)
+    if kind not in ("note_on", "note_off"):
+        raise ValueError(f"未知的消息类型: {kind}")
+    note = int(obj["note"])
+    if not 0 <= note <= 127:
+        raise ValueError(f"音符编号超出范围: {note}")
+    velocity = int(obj.get("velocity", 100 if kind == "note_on" else 0))
+    if not 0 <= velocity <= 127:
+        raise ValueError(f"力度超出范围: {velocity}")
+    group = obj.get("group")
+    if group is not None and group not in config.AVAILABLE_SOUND_GROUPS:
+        # 组名会拼进样本路径，只接受已知的音源组，不读取任意目录
+        raise ValueError(f"未知的音源组: {group}")
+    return (kind, channel, note, velocity, group)
+
+
+class LiveSession:
+    """
+    一个 WebSocket 实时演奏连接的状态：每通道音色对应的音源组、按下未松开的音符和延迟统计
+    音符经 NoteDispatcher 提交，接收帧的协程不会被解码或混音阻塞
+
+    JSON 帧可以是一条消息、消息列表，或 {"notes": [...]} 批量；二进制帧为原始 MIDI 字节
+    控制消息：
+        {"type": "ping", "t": ...}  原样回 pong，供客户端测量往返延迟
+        {"type": "pong", "id": n}   回应服务器定期发出的 ping，服务器据此统计往返延迟
+        {"type": "stats"}           返回本连接的统计
+    """
+
+    def __init__(self, dispatcher: NoteDispatcher, sound_manager: SoundManager):
+        self.id = next(_connection_ids)
+        self.dispatcher = dispatcher
+        self.sound_manager = sound_manager
+        self.connected_at = time.monotonic()
+        self._channel_groups: Dict[int, Optional[str]] = {DRUM_CHANNEL: self._group_of_program(DRUM_PROGRAM)}
+        self._held = set()
+        self._ping_ids = itertools.count(1)
+        self._pings: Dict[int, float] = {}
+
+        self.frames = 0
+        self.notes_on = 0
+        self.notes_off = 0
+        self.program_changes = 0
+        self.rejected = 0
+        self.errors = 0
+        self.rtt = LatencyStats()     # 服务器 ping → 客户端 pong 的往返延迟（秒）
+        self.handle = LatencyStats()  # 收到帧到全部消息入队的耗时（秒）
+
+    # ---------- 帧处理 ----------
+
+    def handle_binary(self, data: bytes) -> List[dict]:
+        received = time.perf_counter()
+        try:
+            messages = parse_raw_midi(data)
+        except ValueError as e:
+            self.errors += 1
+            return [{"type": "error", "detail": str(e)}]
+        return self._apply_all(messages, received)
+
+    def handle_json(self, payload: Any) -> List[dict]:
+        received = time.perf_counter()
+        if isinstance(payload, dict) and "notes" in payload:
+            payload = payload["notes"]
+        items = payload if isinstance(payload, list) else [payload]
+
+        replies, messages = [], []
+        stats_requested = False
+        for obj in items:
+            if not isinstance(obj, dict):
+                self.errors += 1
+                replies.append({"type": "error", "detail": "消息必须是 JSON 对象"})
+                continue
+            kind = obj.get("type")
+            if kind == "ping":
+                replies.append({"type": "pong", "t": obj.get("t"), "server_time": time.time()})
+            elif kind == "pong":
+                self.on_pong(obj.get("id"))
+            elif kind == "stats":
+                stats_requested = True
+            else:
+                try:
+                    messages.append(parse_json_message(obj))
+                except (KeyError, TypeError, ValueError) as e:
+                    self.errors += 1
+                    replies.append({"type": "error", "detail": f"无效消息: {e}"})
+        replies += self._apply_all(messages, received)
+        # 统计在本帧的音符消息全部应用之后生成，计数包含同一帧中的消息
+        if stats_requested:
+            replies.append({"type": "stats", **self.stats()})
+        return replies
+
+    def _apply_all(self, messages: List[LiveMessage], received: float) -> List[dict]:
+        self.frames += 1
+        rejected = 0
+        for message in messages:
+            try:
+                self._apply(*message)
+            except QueueFullError:
+                rejected += 1
+        self.handle.record(time.perf_counter() - received)
+        if rejected:
+            self.rejected += rejected
+            return [{"type": "error", "code": 503, "detail": f"播放繁忙，丢弃 {rejected} 条消息"}]
+        return []
+
+    def _apply(self, kind: str, channel: int, value: int, velocity: int, group: Optional[str]):
+        if kind == "program_change":
+            self._channel_groups[channel] = self._group_of_program(
+                DRUM_PROGRAM if channel == DRUM_CHANNEL else value)
+            self.program_changes += 1
+            return
+
+        tag = ("ws", self.id, channel, value)
+        if kind == "note_on" and velocity > 0:
+            group = self._resolve_group(channel, value, group)
+            self.dispatcher.submit(value, velocity, group, tag=tag)
+            self._held.add(tag)
+            self.notes_on += 1
+        else:
+            self.dispatcher.submit_off(tag)
+            self._held.discard(tag)
+            self.notes_off += 1
+
+    def _resolve_group(self, channel: int, note: int, group: Optional[str]) -> Optional[str]:
+        # 显式指定的组优先，其次是通道当前音色对应的组；没有该音符样本时交给全局映射
+        group = group or self._channel_groups.get(channel)
+        if group in config.AVAILABLE_SOUND_GROUPS and self.sound_manager.has_sound(note, group):
+            return group
+        return None
+
+    @staticmethod
+    def _group_of_program(program: int) -> Optional[str]:
+        group = config.DEFAULT_PROGRAM_TO_GROUP.get(program)
+        return group if group in config.AVAILABLE_SOUND_GROUPS else None
+
+    # ---------- 往返延迟 ----------
+
+    def ping(self) -> dict:
+        """
+        生成一条服务器 ping，客户端应回 {"type": "pong", "id": ...}
+        """
+        ping_id = next(self._ping_ids)
+        self._pings[ping_id] = time.perf_counter()
+        # 客户端不回应时只保留最近的若干个，避免无限增长
+        if len(self._pings) > 16:
+            self._pings.pop(next(iter(self._pings)))
+        return {"type": "ping", "id": ping_id}
+
+    def on_pong(self, ping_id):
+        sent = self._pings.pop(ping_id, None)
+        if sent is not None:
+            self.rtt.record(time.perf_counter() - sent)
+
+    # ---------- 生命周期 ----------
+
+    def close(self):
+        """
+        连接断开时松开所有仍按住的音符
+        """
+        for tag in list(self._held):
+            try:
+                self.dispatcher.submit_off(tag)
+            except QueueFullError:
+                self.sound_manager.release_note(tag)
+        self._held.clear()
+
+    def stats(self) -> dict:
+        return {
+            "connection": self.id,
+            "connected_seconds": round(time.monotonic() - self.connected_at, 1),
+            "frames": self.frames,
+            "notes_on": self.notes_on,
+            "notes_off": self.notes_off,
+            "program_changes": self.program_changes,
+            "held": len(self._held),
+            "rejected": self.rejected,
+            "errors": self.errors,
+            "rtt_ms": self.rtt.summary(),
+            "handle_ms": self.handle.summary()
+        }
@@ -1,20 +1,39 @@
 # midi/midi_player.py
 
-import mido
-from typing import List, Dict, Any, Optional
+import os
+import time
+import numpy as np
+from typing import TYPE_CHECKING, Dict, Optional
+import config
+import metrics
 from config import DEFAULT_PROGRAM_TO_GROUP
+from midi.tempo_map import TempoMap, DEFAULT_TEMPO
+from midi.event_table import (EventTable, EventBuilder, EventListView,
+                              NOTE_ON, NOTE_OFF, PROGRAM_CHANGE)
+from midi.parse_cache import ParseCache, ParsedMidi, file_sha256
+from midi.smf_parser import check_smf, parse_smf
+
+if TYPE_CHECKING:
+    import mido
+
+_PARSE_SECONDS = metrics.histogram("midi_parse_seconds", "MIDI 文件解析耗时（不含缓存命中）", ("parser",))
+_PARSE_EVENTS = metrics.counter("midi_parse_events_total", "解析得到的事件数（不含缓存命中）")
+_PARSE_ERRORS = metrics.counter("midi_parse_errors_total", "MIDI 文件解析失败次数")
 
 
 class MidiEvent:
+    __slots__ = ("time", "type", "channel", "note", "velocity", "program", "tick")
+
     def __init__(self, time: float, type: str, channel: Optional[int] = None,
                  note: Optional[int] = None, velocity: Optional[int] = None,
-                 program: Optional[int] = None):
+                 program: Optional[int] = None, tick: Optional[int] = None):
         self.time = time
         self.type = type
         self.channel = channel
         self.note = note
         self.velocity = velocity
         self.program = program
+        self.tick = tick
 
     def __repr__(self):
         return f"<MidiEvent time={self.time:.3f} type={self.type} " \
@@ -22,79 +41,186 @@ class MidiEvent:
 
 
 class MidiPlayer:
-    def __init__(self, file_path: str):
+    def __init__(self, file_path: str, parse_cache: Optional[ParseCache] = None,
+                 content_hash: Optional[str] = None, name: Optional[str] = None):
         self.file_path = file_path
-        self.midi = mido.MidiFile(file_path)
-        self.ticks_per_beat = self.midi.ticks_per_beat
-        self.tempo = 500000
-        self.events: List[MidiEvent] = []
+        # 展示用的文件名：上传文件按内容哈希存储，原始文件名单独保留
+        self.name = name or os.path.basename(file_path)
+        # mido.MidiFile 延迟到第一次需要时才构建，解析缓存命中时完全不构建
+        self._midi = None
+        self.parse_cache = parse_cache
+        self.content_hash = content_hash
+        self.tempo = DEFAULT_TEMPO
+        self.tempo_map: Optional[TempoMap] = None
+        # 事件以列式 EventTable 存储，events / get_events() 提供兼容的 MidiEvent 视图
+        self.table: EventTable = EventTable.empty()
+        self.parsed = False
+        self.midi_type: Optional[int] = None
+        self.track_instruments: Dict[int, int] = {}
         self.channel_programs: Dict[int, int] = {}
         self.instrument_mapping: Dict[int, str] = DEFAULT_PROGRAM_TO_GROUP.copy()  # 映射音源组：type 0 为音符编号，type 1 为轨道编号
 
+    @property
+    def midi(self) -> "mido.MidiFile":
+        if self._midi is None:
+            # mido 只在走 mido 解析路径或访问原始 MidiFile 时才导入
+            import mido
+            self._midi = mido.MidiFile(self.file_path)
+        return self._midi
+
+    @property
+    def midi_loaded(self) -> bool:
+        return self._midi is not None
+
+    @property
+    def ticks_per_beat(self) -> int:
+        if self.tempo_map is not None:
+            return self.tempo_map.ticks_per_beat
+        return self.midi.ticks_per_beat
+
+    def get_content_hash(self) -> str:
+        """
+        文件内容的 SHA-256，作为解析缓存的键
+        """
+        if self.content_hash is None:
+            self.content_hash = file_sha256(self.file_path)
+        return self.content_hash
+
+    def get_tempo_map(self) -> TempoMap:
+        """
+        速度表只从全部轨道的 set_tempo 构建一次
+        """
+        if self.tempo_map is None:
+            self.tempo_map = TempoMap.from_midi(self.midi)
+            self.tempo = self.tempo_map.tempo_at(0)
+        return self.tempo_map
+
     def ticks_to_seconds(self, ticks: int) -> float:
-        return ticks * (self.tempo / self.ticks_per_beat) / 1_000_000
+        return self.get_tempo_map().to_seconds(ticks)
 
-    def parse(self):
+    def parse(self) -> ParsedMidi:
+        """
+        解析事件并返回解析结果；配置了解析缓存时先按内容哈希查缓存，命中则跳过 mido
+        重复调用会得到相同结果，不会累积事件或沿用上次的通道音色
+        """
+        key = None
+        if self.parse_cache is not None:
+            key = self.get_content_hash()
+            cached = self.parse_cache.get(key)
+            if cached is not None:
+                self._install(cached)
+                return cached
+
+        parser = "fast" if config.MIDI_FAST_PARSER else "mido"
+        started = time.perf_counter()
+        try:
+            parsed = self._parse_midi()
+        except Exception:
+            _PARSE_ERRORS.inc()
+            raise
+        _PARSE_SECONDS.labels(parser).observe(time.perf_counter() - started)
+        _PARSE_EVENTS.inc(len(parsed.table))
+        self._install(parsed)
+        if key is not None:
+            self.parse_cache.put(key, parsed)
+        return parsed
+
+    def _parse_midi(self) -> ParsedMidi:
+        """
+        默认用快速解析器直接读取文件字节，不构建 mido.MidiFile；关闭 MIDI_FAST_PARSER 时走 mido
+        """
+        if config.MIDI_FAST_PARSER:
+            with open(self.file_path, "rb") as f:
+                return parse_smf(f.read())
+        return self._parse_with_mido()
+
+    def _parse_with_mido(self) -> ParsedMidi:
+        tempo_map = TempoMap.from_midi(self.midi)
+        channel_programs: Dict[int, int] = {}
+        track_instruments: Dict[int, int] = {}
+        builder = EventBuilder()
         if self.midi.type == 0:
-            self._parse_type0()
+            self._parse_track(self.midi.tracks[0], builder, channel_programs)
+            track_instruments[0] = channel_programs.get(0, 0)
         elif self.midi.type == 1:
-            self._parse_type1()
+            # 各轨道依次追加，build() 中按 tick 稳定排序合并
+            for i, track in enumerate(self.midi.tracks):
+                program = self._parse_track(track, builder, channel_programs)
+                if program is not None:
+                    track_instruments[i] = program
         else:
             raise ValueError(f"不支持的MIDI类型: {self.midi.type}")
-        self.events.sort(key=lambda e: e.time)
 
-    def _parse_type0(self):
+        # 绝对 tick 用速度表一次性批量换算为秒
+        table = builder.build(tempo_map.to_seconds_array)
+        return ParsedMidi(table, channel_programs, self.midi.type, self.midi.ticks_per_beat,
+                          tempo_map.ticks, tempo_map.tempos.astype(np.int64), track_instruments)
+
+    def _install(self, parsed: ParsedMidi):
+        self.table = parsed.table
+        self.channel_programs = dict(parsed.channel_programs)
+        self.track_instruments = dict(parsed.track_instruments)
+        self.midi_type = parsed.midi_type
+        self.tempo_map = parsed.tempo_map()
+        self.tempo = self.tempo_map.tempo_at(0)
+        self.parsed = True
+
+    def check(self) -> dict:
+        """
+        只校验文件结构（文件头与各轨道块的边界），不解码事件；返回类型、轨道数与 ticks_per_beat
+        """
+        with open(self.file_path, "rb") as f:
+            return check_smf(f.read())
+
+    def ensure_parsed(self):
+        """
+        尚未解析时才解析，分页等重复请求复用已有事件表
+        """
+        if not self.parsed:
+            self.parse()
+
+    def _parse_track(self, track, builder: EventBuilder, channel_programs: Dict[int, int]) -> Optional[int]:
+        """
+        解析单个轨道，返回该轨道的第一个音色编号（没有 program_change 时为 None）
+        """
+        first_program = None
         abs_time_ticks = 0
-        for msg in self.midi.tracks[0]:
+        for msg in track:
             abs_time_ticks += msg.time
-            if msg.type == 'set_tempo':
-                self.tempo = msg.tempo
-            elif not msg.is_meta:
-                time_sec = self.ticks_to_seconds(abs_time_ticks)
-                self._handle_msg(msg, time_sec)
-
-    def _parse_type1(self):
-        temp_events: List[MidiEvent] = []
-        for track_index, track in enumerate(self.midi.tracks):
-            abs_time_ticks = 0
-            for msg in track:
-                abs_time_ticks += msg.time
-                if msg.type == 'set_tempo':
-                    self.tempo = msg.tempo
-                elif not msg.is_meta:
-                    time_sec = self.ticks_to_seconds(abs_time_ticks)
-                    event = self._create_event(msg, time_sec)
-                    if event:
-                        temp_events.append(event)
-        self.events = temp_events
-
-    def _handle_msg(self, msg, time_sec):
-        event = self._create_event(msg, time_sec)
-        if event:
-            self.events.append(event)
-
-    def _create_event(self, msg, time_sec) -> Optional[MidiEvent]:
-        if msg.type == 'note_on':
-            program = self.channel_programs.get(msg.channel, 0)
-            return MidiEvent(time_sec, 'note_on', msg.channel, msg.note, msg.velocity, program=program)
-        elif msg.type == 'note_off':
-            program = self.channel_programs.get(msg.channel, 0)
-            return MidiEvent(time_sec, 'note_off', msg.channel, msg.note, msg.velocity, program=program)
-        elif msg.type == 'program_change':
-            self.channel_programs[msg.channel] = msg.program
-            return MidiEvent(time_sec, 'program_change', msg.channel, program=msg.program)
-        return None
-
-    def get_events(self) -> List[MidiEvent]:
+            if msg.type == 'note_on':
+                builder.append(abs_time_ticks, NOTE_ON, msg.channel, msg.note, msg.velocity,
+                               channel_programs.get(msg.channel, 0))
+            elif msg.type == 'note_off':
+                builder.append(abs_time_ticks, NOTE_OFF, msg.channel, msg.note, msg.velocity,
+                               channel_programs.get(msg.channel, 0))
+            elif msg.type == 'program_change':
+                channel_programs[msg.channel] = msg.program
+                builder.append(abs_time_ticks, PROGRAM_CHANGE, msg.channel, program=msg.program)
+                if first_program is None:
+                    first_program = msg.program
+        return first_program
+
+    @property
+    def events(self) -> EventListView:
+        return EventListView(self.table)
+
+    def get_events(self) -> EventListView:
         return self.events
 
+    def get_event_table(self) -> EventTable:
+        return self.table
+
     def get_channel_programs(self) -> Dict[int, int]:
         return self.channel_programs
 
     def get_type(self) -> int:
+        if self.midi_type is not None:
+            return self.midi_type
         return self.midi.type
 
     def get_track_instruments(self) -> Dict[int, int]:
+        if self.parsed:
+            return dict(self.track_instruments)
         if self.midi.type == 1:
             instruments = {}
             for i, track in enumerate(self.midi.tracks):
@@ -0,0 +1,155 @@
+# midi/parse_cache.py
+
+import os
+import json
+import hashlib
+import zipfile
+from collections import OrderedDict
+from typing import Dict, Optional
+import numpy as np
+import config
+import metrics
+from midi.event_table import EventTable, COLUMNS
+from midi.tempo_map import TempoMap
+
+
+class ParsedMidi:
+    """
+    一次解析的完整结果：事件表、通道音色、速度表和轨道乐器
+    缓存中的实例在多个 MidiPlayer 间共享，使用方不得修改其中的数组
+    """
+
+    def __init__(self, table: EventTable, channel_programs: Dict[int, int], midi_type: int,
+                 ticks_per_beat: int, tempo_ticks: np.ndarray, tempos: np.ndarray,
+                 track_instruments: Dict[int, int]):
+        self.table = table
+        self.channel_programs = channel_programs
+        self.midi_type = midi_type
+        self.ticks_per_beat = ticks_per_beat
+        self.tempo_ticks = tempo_ticks
+        self.tempos = tempos
+        self.track_instruments = track_instruments
+
+    def tempo_map(self) -> TempoMap:
+        return TempoMap(self.ticks_per_beat, zip(self.tempo_ticks.tolist(), self.tempos.tolist()))
+
+    @property
+    def nbytes(self) -> int:
+        return self.table.nbytes + self.tempo_ticks.nbytes + self.tempos.nbytes
+
+    def save(self, path: str):
+        """
+        以 npz 保存（不使用 pickle），先写临时文件再原子替换
+        """
+        meta = {
+            "channel_programs": self.channel_programs,
+            "midi_type": self.midi_type,
+            "ticks_per_beat": self.ticks_per_beat,
+            "track_instruments": self.track_instruments
+        }
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            np.savez(f, tempo_ticks=self.tempo_ticks, tempos=self.tempos,
+                     meta=np.array(json.dumps(meta)), **self.table.to_arrays())
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str) -> "ParsedMidi":
+        with np.load(path, allow_pickle=False) as data:
+            meta = json.loads(str(data["meta"]))
+            table = EventTable.from_arrays({name: data[name] for name in COLUMNS})
+            return cls(table,
+                       {int(k): v for k, v in meta["channel_programs"].items()},
+                       meta["midi_type"], meta["ticks_per_beat"],
+                       data["tempo_ticks"], data["tempos"],
+                       {int(k): v for k, v in meta["track_instruments"].items()})
+
+
+def file_sha256(path: str, chunk_size: int = 1 << 20) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+class ParseCache:
+    """
+    以 MIDI 文件内容的 SHA-256 为键的解析缓存：内存中 LRU 淘汰，可选磁盘层
+    命中时完全跳过 mido 解析
+    """
+
+    def __init__(self, max_entries: int = None, disk_dir: Optional[str] = None):
+        self.max_entries = max_entries or config.PARSE_CACHE_MAX_ENTRIES
+        self.disk_dir = disk_dir
+        self._entries: "OrderedDict[str, ParsedMidi]" = OrderedDict()
+        self._lock = metrics.timed_lock("parse_cache")
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _disk_path(self, key: str) -> str:
+        return os.path.join(self.disk_dir, f"{key}.npz")
+
+    def get(self, key: str) -> Optional[ParsedMidi]:
+        with self._lock:
+            parsed = self._entries.get(key)
+            if parsed is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return parsed
+
+        if self.disk_dir is not None and os.path.isfile(self._disk_path(key)):
+            try:
+                parsed = ParsedMidi.load(self._disk_path(key))
+            except (OSError, ValueError, KeyError, zipfile.BadZipFile) as e:
+                # 损坏或截断的缓存文件按未命中处理并删除，之后重新解析时会写入新的缓存
+                print(f"[解析缓存] 读取磁盘缓存失败，已删除: {e}")
+                try:
+                    os.remove(self._disk_path(key))
+                except OSError:
+                    pass
+            else:
+                self._remember(key, parsed)
+                with self._lock:
+                    self.disk_hits += 1
+                return parsed
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def put(self, key: str, parsed: ParsedMidi):
+        self._remember(key, parsed)
+        if self.disk_dir is not None:
+            try:
+                os.makedirs(self.disk_dir, exist_ok=True)
+                parsed.save(self._disk_path(key))
+            except OSError as e:
+                print(f"[解析缓存] 写入磁盘缓存失败: {e}")
+
+    def _remember(self, key: str, parsed: ParsedMidi):
+        with self._lock:
+            self._entries[key] = parsed
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "bytes": sum(p.nbytes for p in self._entries.values()),
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "disk": self.disk_dir is not None
+            }
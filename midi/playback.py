@@ -0,0 +1,303 @@
+# midi/playback.py
+
+import bisect
+import itertools
+import threading
+import time
+from collections import deque
+from typing import Optional
+import config
+from midi.midi_player import MidiPlayer
+from midi.event_table import NOTE_ON, NOTE_OFF
+from sound.sound_manager import SoundManager
+from sound.latency import LatencyStats
+
+# 通道 10（编号 9）为打击乐通道，对应 DEFAULT_PROGRAM_TO_GROUP 中的特例 128
+DRUM_CHANNEL = 9
+DRUM_PROGRAM = 128
+
+
+def resolve_group(player: MidiPlayer, sound_manager: SoundManager, channel: int, note: int,
+                  program: int, cache: dict) -> Optional[str]:
+    """
+    先按音色映射查找音源组，没有对应样本时退回到该音符的全局映射
+    cache 为 (program, note) -> 音源组 的查找缓存，None 表示无可用样本
+    """
+    program = DRUM_PROGRAM if channel == DRUM_CHANNEL else max(program, 0)
+    key = (program, note)
+    if key not in cache:
+        candidates = (player.get_group_name_by_program(program),
+                      sound_manager.get_note_group(note))
+        cache[key] = next(
+            (g for g in candidates if g and sound_manager.has_sound(note, g)), None)
+    return cache[key]
+
+
+class VoiceTags:
+    """
+    为每个 note_on 分配独立的声部 tag，note_off 按先进先出只释放同一 (通道, 音符) 上最早仍未释放的那一个
+    同一 tick 上的 note_off 与重新触发的 note_on 因此互不影响：释放的永远是之前的声部，而不是新起音的声部
+    """
+
+    def __init__(self, prefix: tuple = ()):
+        self._prefix = prefix
+        self._held = {}  # (channel, note) -> 未释放的 tag 队列
+        self._seq = itertools.count()
+
+    def note_on(self, channel: int, note: int) -> tuple:
+        tag = self._prefix + (channel, note, next(self._seq))
+        self._held.setdefault((channel, note), deque()).append(tag)
+        return tag
+
+    def note_off(self, channel: int, note: int) -> Optional[tuple]:
+        """
+        返回要释放的 tag；没有对应的 note_on（如跳过的音符或定位之前起音的音符）时为 None
+        """
+        held = self._held.get((channel, note))
+        if not held:
+            return None
+        tag = held.popleft()
+        if not held:
+            del self._held[(channel, note)]
+        return tag
+
+    def discard(self, tag: tuple):
+        """
+        撤销一个刚分配、但没能交给混音器的 tag
+        """
+        held = self._held.get(tag[-3:-1])
+        if held and held[-1] == tag:
+            held.pop()
+            if not held:
+                del self._held[tag[-3:-1]]
+
+    def clear(self):
+        self._held.clear()
+
+
+class PlaybackSession:
+    """
+    MIDI 回放会话：独立调度线程把事件时间换算为混音器时钟上的绝对采样帧，提前 lookahead 提交给混音器
+    起音和释音在音频回调中按采样偏移执行，不依赖 time.sleep 的精度，长时间播放也不会累积漂移
+    """
+
+    def __init__(self, player: MidiPlayer, sound_manager: SoundManager, tempo: float = 1.0):
+        if tempo <= 0:
+            raise ValueError("速度倍率必须大于 0")
+        self.player = player
+        self.sound_manager = sound_manager
+        self.mixer = sound_manager.mixer
+        self.sample_rate = self.mixer.sample_rate
+        self.tempo = tempo
+
+        # 调度线程只需要标量访问，事件表各列预先转为 Python 列表
+        table = player.get_event_table()
+        self._times = table.time.tolist()
+        self._types = table.type.tolist()
+        self._channels = table.channel.tolist()
+        self._notes = table.note.tolist()
+        self._velocities = table.velocity.tolist()
+        self._programs = table.program.tolist()
+        self.duration = self._times[-1] if self._times else 0.0
+
+        self.state = "stopped"  # stopped / playing / paused / finished
+        self._index = 0
+        # 锚点：文件内时间 _anchor_pos（秒）对应混音器时钟的 _anchor_frame
+        self._anchor_pos = 0.0
+        self._anchor_frame = 0
+        self._cond = threading.Condition()
+        self._thread = None
+        self._closed = False
+        self._groups = {}  # (program, note) -> 可用音源组，None 表示无可用样本
+        self._mapping_version = sound_manager.sound_mapping.version
+        self._tags = VoiceTags((id(self),))
+
+        self.lookahead_frames = int(self.sample_rate * config.PLAYBACK_LOOKAHEAD_MS / 1000)
+        self.interval = config.PLAYBACK_INTERVAL_MS / 1000
+        self.events_scheduled = 0
+        self.events_skipped = 0
+        self.onset_late = LatencyStats()   # 起音相对目标帧的迟到（秒），由混音线程上报
+        self.wake_jitter = LatencyStats()  # 调度线程的唤醒抖动（秒）
+
+    # ---------- 控制接口 ----------
+
+    def play(self, start_sec: float = 0.0):
+        """
+        从 start_sec 开始播放，首次调用时启动调度线程
+        """
+        self.mixer.start()
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("回放会话已停止")
+            self.mixer.cancel(self)
+            self._start_at(self._clamp(start_sec))
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, daemon=True)
+                self._thread.start()
+            self._cond.notify()
+
+    def pause(self):
+        with self._cond:
+            if self.state != "playing":
+                return
+            self._rewind(self.position)
+            self.state = "paused"
+
+    def resume(self):
+        with self._cond:
+            if self.state != "paused":
+                return
+            self._start_at(self._anchor_pos)
+            self._cond.notify()
+
+    def seek(self, seconds: float):
+        with self._cond:
+            seconds = self._clamp(seconds)
+            if self.state == "playing":
+                self.mixer.cancel(self)
+                self._start_at(seconds)
+                self._cond.notify()
+            else:
+                self._rewind(seconds)
+
+    def set_tempo(self, tempo: float):
+        """
+        修改速度倍率：在当前位置重新锚定，已提前提交的事件按新速度重新调度
+        """
+        if tempo <= 0:
+            raise ValueError("速度倍率必须大于 0")
+        with self._cond:
+            position = self.position
+            if self.state == "playing":
+                self.mixer.cancel(self)
+                self.tempo = tempo
+                self._start_at(position)
+                self._cond.notify()
+            else:
+                self.tempo = tempo
+
+    def stop(self):
+        """
+        停止播放并结束调度线程，会话不可再次使用
+        """
+        with self._cond:
+            self._closed = True
+            self.state = "stopped"
+            self.mixer.cancel(self)
+            self._cond.notify()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join()
+
+    @property
+    def position(self) -> float:
+        """
+        当前播放位置（文件内秒数）
+        """
+        if self.state != "playing":
+            return self._anchor_pos
+        elapsed = max(0, self.mixer.now() - self._anchor_frame) / self.sample_rate
+        return min(self.duration, self._anchor_pos + elapsed * self.tempo)
+
+    def stats(self) -> dict:
+        return {
+            "state": self.state,
+            "position": round(self.position, 3),
+            "duration": round(self.duration, 3),
+            "tempo": self.tempo,
+            "events_scheduled": self.events_scheduled,
+            "events_skipped": self.events_skipped,
+            "onset_late_ms": self.onset_late.summary(),
+            "wake_jitter_ms": self.wake_jitter.summary()
+        }
+
+    # ---------- 混音器回调 ----------
+
+    def on_voice_start(self, late_frames: int):
+        self.onset_late.record(late_frames / self.sample_rate)
+
+    # ---------- 内部实现（调用方持有 _cond） ----------
+
+    def _clamp(self, seconds: float) -> float:
+        return max(0.0, min(self.duration, seconds))
+
+    def _rewind(self, seconds: float):
+        self.mixer.cancel(self)
+        self._tags.clear()
+        self._anchor_pos = seconds
+        self._index = bisect.bisect_left(self._times, seconds)
+
+    def _start_at(self, seconds: float):
+        # 锚点留出两个音频块的余量，并立即提交第一个 lookahead 窗口，避免首批事件迟到
+        self._anchor_pos = seconds
+        self._anchor_frame = self.mixer.now() + 2 * self.mixer.block_size
+        # 调用前已取消之前的全部声部，之前分配的 tag 不再有对应的声部
+        self._tags.clear()
+        self._index = bisect.bisect_left(self._times, seconds)
+        self.state = "playing"
+        self._schedule_ahead()
+
+    def _frame_of(self, seconds: float) -> int:
+        return self._anchor_frame + int(round((seconds - self._anchor_pos) * self.sample_rate / self.tempo))
+
+    def _schedule_ahead(self):
+        horizon = self.mixer.now() + self.lookahead_frames
+        times = self._times
+        while self._index < len(times):
+            frame = self._frame_of(times[self._index])
+            if frame >= horizon:
+                break
+            self._dispatch(self._index, frame)
+            self._index += 1
+
+    def _dispatch(self, i: int, frame: int):
+        event_type = self._types[i]
+        if event_type not in (NOTE_ON, NOTE_OFF):
+            return
+        channel, note, velocity = self._channels[i], self._notes[i], self._velocities[i]
+        if event_type == NOTE_ON and velocity > 0:
+            # 音符映射每次修改都会递增版本号，版本变化时丢弃按旧映射查得的音源组
+            version = self.sound_manager.sound_mapping.version
+            if version != self._mapping_version:
+                self._groups.clear()
+                self._mapping_version = version
+            group = resolve_group(self.player, self.sound_manager, channel, note,
+                                  self._programs[i], self._groups)
+            if group is None:
+                self.events_skipped += 1
+                return
+            tag = self._tags.note_on(channel, note)
+            try:
+                self.sound_manager.schedule_note(note, velocity, group,
+                                                 start_frame=frame, tag=tag, owner=self)
+            except Exception:
+                self._tags.discard(tag)
+                raise
+            self.events_scheduled += 1
+        else:
+            tag = self._tags.note_off(channel, note)
+            if tag is not None:
+                self.sound_manager.release_note(tag, frame, owner=self)
+
+    def _run(self):
+        next_wake = time.perf_counter()
+        with self._cond:
+            while not self._closed:
+                if self.state != "playing":
+                    self._cond.wait()
+                    next_wake = time.perf_counter()
+                    continue
+
+                self._schedule_ahead()
+                if self._index >= len(self._times) and self._frame_of(self.duration) <= self.mixer.now():
+                    self._anchor_pos = self.duration
+                    self.state = "finished"
+                    continue
+
+                next_wake += self.interval
+                timeout = next_wake - time.perf_counter()
+                if timeout <= 0 or not self._cond.wait(timeout):
+                    # 只统计按时唤醒的轮次，被控制命令提前唤醒的不计入抖动
+                    now = time.perf_counter()
+                    self.wake_jitter.record(max(0.0, now - next_wake))
+                    if now - next_wake > self.interval:
+                        next_wake = now
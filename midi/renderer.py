@@ -0,0 +1,190 @@
+# midi/renderer.py
+
+import argparse
+import math
+import struct
+import sys
+import time
+import wave
+from typing import Iterator
+import numpy as np
+import config
+from midi.midi_player import MidiPlayer
+from midi.event_table import NOTE_ON, NOTE_OFF
+from midi.playback import resolve_group, VoiceTags
+from sound.mixer import Mixer
+from sound.sound_manager import SoundManager
+from sound.sound_mapping import SoundMapping
+
+
+def wav_header(frames: int, sample_rate: int, channels: int, sample_width: int = 2) -> bytes:
+    """
+    16 位 PCM WAV 文件头，长度字段按 frames 精确填写，流式输出时可以先于数据发送
+    """
+    data_size = frames * channels * sample_width
+    return struct.pack("<4sI4s4sIHHIIHH4sI",
+                       b"RIFF", 36 + data_size, b"WAVE",
+                       b"fmt ", 16, 1, channels, sample_rate,
+                       sample_rate * channels * sample_width, channels * sample_width, sample_width * 8,
+                       b"data", data_size)
+
+
+class OfflineRenderer:
+    """
+    离线渲染：用一个不打开输出流的私有混音器，按固定大小的块把 MIDI 混成 PCM，速度不受实时限制
+    与实时回放共用样本库、音色映射、力度曲线和声部调度逻辑，内存占用只与块大小和同时发声数有关
+    输出长度固定为 (最后一个事件 + tail_sec) / tempo，流式输出时文件头可以先发送
+    """
+
+    def __init__(self, player: MidiPlayer, sound_manager: SoundManager, tempo: float = 1.0,
+                 block_frames: int = None, tail_sec: float = None):
+        if tempo <= 0:
+            raise ValueError("速度倍率必须大于 0")
+        self.player = player
+        self.tempo = tempo
+        live = sound_manager.mixer
+        self.mixer = Mixer(live.sample_rate, live.channels, block_frames or config.RENDER_BLOCK_FRAMES,
+                           live.max_polyphony, live.steal_policy)
+        # 与实时播放共享映射、样本库、解码样本缓存和力度曲线，只替换混音器
+        # 共用一个缓存：渲染不重复解码，并发渲染也只占用同一份 SAMPLE_CACHE_MAX_BYTES 预算；
+        # 离线混音器结束的声部同样通过缓存的 released 队列归还引用
+        self.sound_manager = SoundManager(sound_manager.sound_mapping, mixer=self.mixer,
+                                          sample_bank=sound_manager.sample_bank,
+                                          sample_cache=sound_manager.sample_cache)
+        self.sound_manager.default_velocity_table = sound_manager.default_velocity_table
+        self.sound_manager.velocity_tables = sound_manager.velocity_tables
+        self.sample_rate = self.mixer.sample_rate
+        self.channels = self.mixer.channels
+
+        self.table = player.get_event_table()
+        duration = float(self.table.time[-1]) if len(self.table) else 0.0
+        tail_sec = config.RENDER_TAIL_SEC if tail_sec is None else tail_sec
+        self.total_frames = int(math.ceil((duration / tempo + tail_sec) * self.sample_rate))
+
+        self.events_scheduled = 0
+        self.events_skipped = 0
+        self.frames_rendered = 0
+        self.render_seconds = 0.0
+
+    @property
+    def audio_seconds(self) -> float:
+        return self.total_frames / self.sample_rate
+
+    def blocks(self) -> Iterator[np.ndarray]:
+        """
+        逐块生成 float32 音频（形状 (frames, channels)），最后一块截断到 total_frames
+        返回的数组在下一次迭代时会被复用
+        """
+        mixer = self.mixer
+        mixer.start_offline()
+        table = self.table
+        times = table.time.tolist()
+        types = table.type.tolist()
+        channels = table.channel.tolist()
+        notes = table.note.tolist()
+        velocities = table.velocity.tolist()
+        programs = table.program.tolist()
+        frames_per_sec = self.sample_rate / self.tempo
+        groups = {}
+        tags = VoiceTags()
+
+        block = np.zeros((mixer.block_size, self.channels), dtype=np.float32)
+        started = time.perf_counter()
+        i, n = 0, len(times)
+        try:
+            while self.frames_rendered < self.total_frames:
+                block_end = mixer.now() + mixer.block_size
+                while i < n:
+                    frame = int(round(times[i] * frames_per_sec))
+                    if frame >= block_end:
+                        break
+                    self._dispatch(types[i], channels[i], notes[i], velocities[i], programs[i],
+                                   frame, groups, tags)
+                    i += 1
+                mixer.mix_block(block)
+                frames = min(mixer.block_size, self.total_frames - self.frames_rendered)
+                self.frames_rendered += frames
+                self.render_seconds = time.perf_counter() - started
+                yield block[:frames]
+        finally:
+            mixer.stop()
+
+    def _dispatch(self, event_type: int, channel: int, note: int, velocity: int, program: int,
+                  frame: int, groups: dict, tags: VoiceTags):
+        if event_type not in (NOTE_ON, NOTE_OFF):
+            return
+        if event_type == NOTE_ON and velocity > 0:
+            group = resolve_group(self.player, self.sound_manager, channel, note, program, groups)
+            if group is None:
+                self.events_skipped += 1
+                return
+            tag = tags.note_on(channel, note)
+            try:
+                self.sound_manager.schedule_note(note, velocity, group, start_frame=frame, tag=tag)
+            except Exception:
+                tags.discard(tag)
+                raise
+            self.events_scheduled += 1
+        else:
+            tag = tags.note_off(channel, note)
+            if tag is not None:
+                self.sound_manager.release_note(tag, frame)
+
+    def pcm_chunks(self) -> Iterator[bytes]:
+        """
+        逐块生成 16 位小端 PCM 字节
+        """
+        for block in self.blocks():
+            yield (block * 32767).astype("<i2").tobytes()
+
+    def wav_stream(self) -> Iterator[bytes]:
+        """
+        流式 WAV：先发送长度精确的文件头，再逐块发送 PCM
+        """
+        yield wav_header(self.total_frames, self.sample_rate, self.channels)
+        yield from self.pcm_chunks()
+
+    def render_to_wav(self, path: str) -> dict:
+        with wave.open(path, "wb") as wav:
+            wav.setnchannels(self.channels)
+            wav.setsampwidth(2)
+            wav.setframerate(self.sample_rate)
+            for chunk in self.pcm_chunks():
+                wav.writeframes(chunk)
+        return self.stats()
+
+    def stats(self) -> dict:
+        audio = self.frames_rendered / self.sample_rate
+        return {
+            "audio_seconds": round(audio, 3),
+            "render_seconds": round(self.render_seconds, 3),
+            "realtime_factor": round(audio / self.render_seconds, 1) if self.render_seconds else None,
+            "frames": self.frames_rendered,
+            "sample_rate": self.sample_rate,
+            "channels": self.channels,
+            "events_scheduled": self.events_scheduled,
+            "events_skipped": self.events_skipped,
+            "voices_stolen": self.mixer.voices_stolen,
+            "peak_voices": self.mixer.peak_voices
+        }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="把 MIDI 文件离线渲染为 WAV")
+    parser.add_argument("midi", help="输入 MIDI 文件")
+    parser.add_argument("output", help="输出 WAV 文件")
+    parser.add_argument("--tempo", type=float, default=1.0, help="速度倍率")
+    parser.add_argument("--tail", type=float, default=None, help="最后一个事件之后保留的余音（秒）")
+    args = parser.parse_args(argv)
+
+    sound_manager = SoundManager(SoundMapping())
+    sound_manager.preload()
+    player = MidiPlayer(args.midi)
+    player.parse()
+    stats = OfflineRenderer(player, sound_manager, tempo=args.tempo, tail_sec=args.tail).render_to_wav(args.output)
+    print(f"[渲染] {args.output}: {stats['audio_seconds']}s 音频，耗时 {stats['render_seconds']}s，"
+          f"{stats['realtime_factor']}x 实时")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,160 @@
+# midi/session_store.py
+
+import os
+import time
+from collections import OrderedDict
+from typing import Callable, List, Optional, Tuple
+import config
+import metrics
+from midi.midi_player import MidiPlayer
+
+# mido.MidiFile 中每个 Message 对象远大于它在文件中的几个字节，按文件大小的倍数粗略估计
+MIDO_BYTES_PER_FILE_BYTE = 50
+
+
+def estimate_player_bytes(player: MidiPlayer) -> int:
+    """
+    粗略估计一个 MidiPlayer 占用的内存：事件表 + 已构建的 mido 对象
+    """
+    size = player.get_event_table().nbytes
+    if player.midi_loaded:
+        try:
+            size += os.path.getsize(player.file_path) * MIDO_BYTES_PER_FILE_BYTE
+        except OSError:
+            pass
+    return size
+
+
+class _Entry:
+    __slots__ = ("player", "created", "last_access")
+
+    def __init__(self, player: MidiPlayer):
+        self.player = player
+        self.created = self.last_access = time.monotonic()
+
+
+class SessionStore:
+    """
+    MIDI 会话存储：空闲超过 TTL 的会话由 reap() 清理，超出会话数或估算内存上限时按 LRU 淘汰
+    会话被移除时调用 on_evict(session_id, player, reason)，用于停止回放、删除上传文件等
+    is_busy(session_id) 为真的会话（如正在回放）不会因空闲过期，容量淘汰时也最后考虑
+    """
+
+    def __init__(self, ttl: float = None, max_sessions: int = None, max_bytes: int = None,
+                 on_evict: Callable[[str, MidiPlayer, str], None] = None,
+                 is_busy: Callable[[str], bool] = None):
+        self.ttl = ttl if ttl is not None else config.SESSION_TTL_SECONDS
+        self.max_sessions = max_sessions or config.SESSION_MAX_COUNT
+        self.max_bytes = max_bytes or config.SESSION_MAX_BYTES
+        self.on_evict = on_evict
+        self.is_busy = is_busy or (lambda session_id: False)
+        self._entries: "OrderedDict[str, _Entry]" = OrderedDict()
+        self._lock = metrics.timed_lock("session_store")
+        self.evicted = 0
+        self.expired = 0
+
+    def put(self, session_id: str, player: MidiPlayer):
+        with self._lock:
+            self._entries[session_id] = _Entry(player)
+            self._entries.move_to_end(session_id)
+            removed = self._enforce_limits()
+        self._notify(removed)
+
+    def get(self, session_id: str) -> Optional[MidiPlayer]:
+        """
+        获取会话并刷新最近访问时间；已过期的会话视为不存在
+        """
+        with self._lock:
+            entry = self._entries.get(session_id)
+            if entry is None:
+                return None
+            now = time.monotonic()
+            if self.ttl and now - entry.last_access > self.ttl and not self.is_busy(session_id):
+                del self._entries[session_id]
+                self.expired += 1
+                removed = [(session_id, entry.player, "expired")]
+                entry = None
+            else:
+                entry.last_access = now
+                self._entries.move_to_end(session_id)
+                removed = []
+        self._notify(removed)
+        return entry.player if entry is not None else None
+
+    def remove(self, session_id: str) -> Optional[MidiPlayer]:
+        with self._lock:
+            entry = self._entries.pop(session_id, None)
+        if entry is None:
+            return None
+        self._notify([(session_id, entry.player, "removed")])
+        return entry.player
+
+    def __contains__(self, session_id: str) -> bool:
+        return session_id in self._entries
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def players(self) -> List[MidiPlayer]:
+        with self._lock:
+            return [entry.player for entry in self._entries.values()]
+
+    def reap(self) -> int:
+        """
+        清理所有空闲超过 TTL 的会话，返回清理数量；由后台任务定期调用
+        """
+        if not self.ttl:
+            return 0
+        deadline = time.monotonic() - self.ttl
+        with self._lock:
+            expired = [sid for sid, entry in self._entries.items()
+                       if entry.last_access < deadline and not self.is_busy(sid)]
+            removed = [(sid, self._entries.pop(sid).player, "expired") for sid in expired]
+            self.expired += len(removed)
+        self._notify(removed)
+        return len(removed)
+
+    def estimated_bytes(self) -> int:
+        with self._lock:
+            return sum(estimate_player_bytes(entry.player) for entry in self._entries.values())
+
+    def stats(self) -> dict:
+        with self._lock:
+            now = time.monotonic()
+            idle = [now - entry.last_access for entry in self._entries.values()]
+            total = sum(estimate_player_bytes(entry.player) for entry in self._entries.values())
+        return {
+            "sessions": len(idle),
+            "estimated_bytes": total,
+            "max_sessions": self.max_sessions,
+            "max_bytes": self.max_bytes,
+            "ttl_seconds": self.ttl,
+            "max_idle_seconds": round(max(idle), 1) if idle else 0.0,
+            "evicted": self.evicted,
+            "expired": self.expired
+        }
+
+    def _enforce_limits(self) -> List[Tuple[str, MidiPlayer, str]]:
+        # 调用方持有 _lock；先淘汰最久未访问的空闲会话，全部忙碌时再淘汰最久未访问的
+        removed = []
+        sizes = {sid: estimate_player_bytes(entry.player) for sid, entry in self._entries.items()}
+        total = sum(sizes.values())
+        while len(self._entries) > 1 and (len(self._entries) > self.max_sessions or total > self.max_bytes):
+            victim = next((sid for sid in self._entries if not self.is_busy(sid)), None)
+            if victim is None:
+                victim = next(iter(self._entries))
+            entry = self._entries.pop(victim)
+            total -= sizes[victim]
+            removed.append((victim, entry.player, "evicted"))
+            self.evicted += 1
+        return removed
+
+    def _notify(self, removed: List[Tuple[str, MidiPlayer, str]]):
+        # 回调在锁外执行，回调中可以再次访问存储
+        if self.on_evict is None:
+            return
+        for session_id, player, reason in removed:
+            try:
+                self.on_evict(session_id, player, reason)
+            except Exception as e:
+                print(f"[会话] 清理会话 {session_id} 失败: {e}")
@@ -0,0 +1,263 @@
+# midi/smf_parser.py
+
+import argparse
+import struct
+import sys
+import time
+from typing import Dict, Iterator, List, Tuple
+import numpy as np
+from midi.event_table import EventBuilder, NOTE_ON, NOTE_OFF, PROGRAM_CHANGE, MISSING, COLUMNS
+from midi.parse_cache import ParsedMidi
+from midi.tempo_map import TempoMap
+
+# 通道消息的数据字节数，按状态字节高 4 位索引
+_CHANNEL_DATA_LENGTHS = (0, 0, 0, 0, 0, 0, 0, 0, 2, 2, 2, 2, 1, 1, 2)
+# 系统消息（0xF0/0xF7/0xFF 除外）的数据字节数，与 mido 一致；未列出的为未定义状态
+_SYSTEM_DATA_LENGTHS = {0xF1: 1, 0xF2: 2, 0xF3: 1, 0xF6: 0, 0xF8: 0, 0xFA: 0, 0xFB: 0,
+                        0xFC: 0, 0xFE: 0}
+_SET_TEMPO = 0x51
+
+
+class SMFError(ValueError):
+    """
+    MIDI 文件格式错误
+    """
+
+
+def _read_header(data) -> Tuple[int, int, int, int]:
+    """
+    校验 MThd 块，返回 (类型, 轨道数, ticks_per_beat, 第一个轨道块的偏移)
+    """
+    if len(data) < 14 or bytes(data[0:4]) != b"MThd":
+        raise SMFError("MThd not found. Probably not a MIDI file")
+    header_size = struct.unpack_from(">I", data, 4)[0]
+    if header_size < 6 or 8 + header_size > len(data):
+        raise SMFError("MIDI 文件头不完整")
+    midi_type, num_tracks, ticks_per_beat = struct.unpack_from(">hhh", data, 8)
+    if midi_type not in (0, 1):
+        raise ValueError(f"不支持的MIDI类型: {midi_type}")
+    return midi_type, num_tracks, ticks_per_beat, 8 + header_size
+
+
+def _track_chunks(data, pos: int, num_tracks: int) -> Iterator[Tuple[int, int, int]]:
+    """
+    依次产出每个 MTrk 块的 (序号, 数据起点, 数据终点)，只读块头
+    """
+    for index in range(num_tracks):
+        if pos + 8 > len(data) or bytes(data[pos:pos + 4]) != b"MTrk":
+            raise SMFError("no MTrk header at start of track")
+        size = struct.unpack_from(">I", data, pos + 4)[0]
+        start, end = pos + 8, pos + 8 + size
+        if end > len(data):
+            raise SMFError(f"轨道 {index} 数据不完整")
+        yield index, start, end
+        pos = end
+
+
+def check_smf(data) -> dict:
+    """
+    只校验文件头和各轨道块的边界，不解码事件，开销与轨道数成正比
+    通过校验的文件仍可能在事件层面损坏，完整校验由 parse_smf 完成
+    """
+    data = memoryview(data).cast("B") if not isinstance(data, bytes) else data
+    midi_type, num_tracks, ticks_per_beat, pos = _read_header(data)
+    for _ in _track_chunks(data, pos, num_tracks):
+        pass
+    return {"midi_type": midi_type, "tracks": num_tracks, "ticks_per_beat": ticks_per_beat}
+
+
+def parse_smf(data) -> ParsedMidi:
+    """
+    直接从 bytes / memoryview 单遍解析标准 MIDI 文件，不构建 mido 对象
+    解码变长整数和 running status，事件直接写入列式数组；结果与 mido 路径（MidiPlayer._parse_with_mido）一致
+    """
+    data = memoryview(data).cast("B") if not isinstance(data, bytes) else data
+    midi_type, num_tracks, ticks_per_beat, pos = _read_header(data)
+    builder = EventBuilder()
+    channel_programs: Dict[int, int] = {}
+    track_instruments: Dict[int, int] = {}
+    tempo_changes: List[Tuple[int, int]] = []
+    for index, start, end in _track_chunks(data, pos, num_tracks):
+        # type 0 只有第一个轨道的事件参与回放，但所有轨道的速度变化都计入速度表
+        emit = midi_type == 1 or index == 0
+        try:
+            first_program = _parse_track(data, start, end, builder if emit else None,
+                                         channel_programs, tempo_changes)
+        except IndexError:
+            raise SMFError(f"轨道 {index} 数据不完整") from None
+        if midi_type == 1 and first_program is not None:
+            track_instruments[index] = first_program
+    if midi_type == 0:
+        track_instruments[0] = channel_programs.get(0, 0)
+
+    tempo_map = TempoMap(ticks_per_beat, tempo_changes)
+    table = builder.build(tempo_map.to_seconds_array)
+    return ParsedMidi(table, channel_programs, midi_type, ticks_per_beat,
+                      tempo_map.ticks, tempo_map.tempos.astype(np.int64), track_instruments)
+
+
+def _parse_track(data, pos: int, end: int, builder, channel_programs: Dict[int, int],
+                 tempo_changes: List[Tuple[int, int]]):
+    """
+    解析一个 MTrk 块，返回该轨道第一个 program_change 的音色（没有时为 None）
+    builder 为 None 时只收集速度变化和通道音色
+    """
+    if builder is not None:
+        append_tick, append_type = builder.tick.append, builder.type.append
+        append_channel, append_note = builder.channel.append, builder.note.append
+        append_velocity, append_program = builder.velocity.append, builder.program.append
+    channel_lengths = _CHANNEL_DATA_LENGTHS
+    first_program = None
+    tick = 0
+    last_status = None
+
+    while pos < end:
+        # 变长整数 delta
+        delta = 0
+        while True:
+            byte = data[pos]
+            pos += 1
+            delta = (delta << 7) | (byte & 0x7F)
+            if byte < 0x80:
+                break
+        tick += delta
+
+        status = data[pos]
+        if status < 0x80:
+            if last_status is None:
+                raise SMFError("running status without last_status")
+            status = last_status
+        else:
+            pos += 1
+            if status != 0xFF:
+                # 与 mido 一致：meta 事件不改变 running status
+                last_status = status
+
+        if status < 0xF0:
+            length = channel_lengths[status >> 4]
+            if pos + length > end:
+                raise SMFError("MIDI 消息不完整")
+            kind = status & 0xF0
+            channel = status & 0x0F
+            if kind == 0x90 or kind == 0x80:
+                note, velocity = data[pos], data[pos + 1]
+                if note > 127 or velocity > 127:
+                    raise SMFError("data byte must be in range 0..127")
+                if builder is not None:
+                    append_tick(tick)
+                    append_type(NOTE_ON if kind == 0x90 else NOTE_OFF)
+                    append_channel(channel)
+                    append_note(note)
+                    append_velocity(velocity)
+                    append_program(channel_programs.get(channel, 0))
+            elif kind == 0xC0:
+                program = data[pos]
+                if program > 127:
+                    raise SMFError("data byte must be in range 0..127")
+                channel_programs[channel] = program
+                if builder is not None:
+                    append_tick(tick)
+                    append_type(PROGRAM_CHANGE)
+                    append_channel(channel)
+                    append_note(MISSING)
+                    append_velocity(MISSING)
+                    append_program(program)
+                if first_program is None:
+                    first_program = program
+            pos += length
+        elif status == 0xFF:
+            meta_type = data[pos]
+            pos += 1
+            length, pos = _read_varint(data, pos)
+            if meta_type == _SET_TEMPO and length == 3:
+                tempo_changes.append((tick, (data[pos] << 16) | (data[pos + 1] << 8) | data[pos + 2]))
+            pos += length
+        elif status == 0xF0 or status == 0xF7:
+            length, pos = _read_varint(data, pos)
+            pos += length
+        else:
+            length = _SYSTEM_DATA_LENGTHS.get(status)
+            if length is None:
+                raise SMFError(f"undefined status byte 0x{status:02x}")
+            pos += length
+
+    if pos > end:
+        raise SMFError("轨道数据越界")
+    return first_program
+
+
+def _read_varint(data, pos: int):
+    value = 0
+    while True:
+        byte = data[pos]
+        pos += 1
+        value = (value << 7) | (byte & 0x7F)
+        if byte < 0x80:
+            return value, pos
+
+
+def compare_parsers(path: str, repeat: int = 3) -> dict:
+    """
+    用 mido 路径和快速解析器分别解析同一文件，逐列比较结果并统计两者耗时
+    """
+    from midi.midi_player import MidiPlayer
+
+    def best_of(fn):
+        best, result = None, None
+        for _ in range(repeat):
+            started = time.perf_counter()
+            result = fn()
+            elapsed = time.perf_counter() - started
+            best = elapsed if best is None else min(best, elapsed)
+        return result, best
+
+    with open(path, "rb") as f:
+        data = f.read()
+    reference, mido_seconds = best_of(lambda: MidiPlayer(path)._parse_with_mido())
+    fast, fast_seconds = best_of(lambda: parse_smf(data))
+
+    mismatches = [name for name in COLUMNS
+                  if not np.array_equal(getattr(reference.table, name), getattr(fast.table, name))]
+    for name in ("channel_programs", "midi_type", "ticks_per_beat", "track_instruments"):
+        if getattr(reference, name) != getattr(fast, name):
+            mismatches.append(name)
+    for name in ("tempo_ticks", "tempos"):
+        if not np.array_equal(getattr(reference, name), getattr(fast, name)):
+            mismatches.append(name)
+    return {
+        "path": path,
+        "events": len(fast.table),
+        "match": not mismatches,
+        "mismatches": mismatches,
+        "mido_seconds": mido_seconds,
+        "fast_seconds": fast_seconds,
+        "speedup": mido_seconds / fast_seconds if fast_seconds else None
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="对比快速 SMF 解析器与 mido 解析结果及耗时")
+    parser.add_argument("inputs", nargs="+", help="MIDI 文件或目录")
+    parser.add_argument("--repeat", type=int, default=3, help="每个解析器重复次数，取最快一次")
+    args = parser.parse_args(argv)
+
+    from midi.batch import collect_midi_files
+    failed = 0
+    for path in collect_midi_files(args.inputs):
+        try:
+            result = compare_parsers(path, args.repeat)
+        except Exception as e:
+            failed += 1
+            print(f"[解析对比] {path}: 解析失败: {e}")
+            continue
+        if not result["match"]:
+            failed += 1
+        status = "一致" if result["match"] else f"不一致: {', '.join(result['mismatches'])}"
+        print(f"[解析对比] {path}: {result['events']} 个事件，{status}，"
+              f"mido {result['mido_seconds'] * 1000:.2f}ms / 快速 {result['fast_seconds'] * 1000:.2f}ms，"
+              f"{result['speedup']:.1f}x")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
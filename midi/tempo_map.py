@@ -0,0 +1,63 @@
+# midi/tempo_map.py
+
+import bisect
+from typing import Iterable, List, Tuple
+import numpy as np
+
+DEFAULT_TEMPO = 500000  # 微秒/拍，即 120 BPM
+
+
+class TempoMap:
+    """
+    速度表：按 tick 排序的速度段，预先计算每段起点的累计秒数
+    单个 tick 换算用 bisect 查段，O(log n)；批量换算用 np.searchsorted 一次完成
+    """
+
+    def __init__(self, ticks_per_beat: int, changes: Iterable[Tuple[int, int]] = ()):
+        if ticks_per_beat <= 0:
+            raise ValueError(f"无效的 ticks_per_beat: {ticks_per_beat}")
+        self.ticks_per_beat = ticks_per_beat
+
+        # 同一 tick 上的多次变速以最后一次为准；tick 0 之前默认 120 BPM
+        segments = {0: DEFAULT_TEMPO}
+        for tick, tempo in sorted(changes, key=lambda c: c[0]):
+            segments[int(tick)] = int(tempo)
+        starts = sorted(segments)
+
+        self.ticks = np.array(starts, dtype=np.int64)
+        self.tempos = np.array([segments[t] for t in starts], dtype=np.float64)
+        # 每段每 tick 的秒数，以及每段起点的累计秒数
+        self.seconds_per_tick = self.tempos / (ticks_per_beat * 1_000_000)
+        self.seconds = np.zeros(len(starts), dtype=np.float64)
+        if len(starts) > 1:
+            self.seconds[1:] = np.cumsum(np.diff(self.ticks) * self.seconds_per_tick[:-1])
+        self._tick_list: List[int] = starts
+
+    @classmethod
+    def from_midi(cls, midi) -> "TempoMap":
+        """
+        从 mido.MidiFile 收集所有轨道上的 set_tempo（type 1 通常都在指挥轨）
+        """
+        changes = []
+        for track in midi.tracks:
+            abs_ticks = 0
+            for msg in track:
+                abs_ticks += msg.time
+                if msg.type == "set_tempo":
+                    changes.append((abs_ticks, msg.tempo))
+        return cls(midi.ticks_per_beat, changes)
+
+    def __len__(self) -> int:
+        return len(self._tick_list)
+
+    def tempo_at(self, tick: int) -> int:
+        return int(self.tempos[bisect.bisect_right(self._tick_list, tick) - 1])
+
+    def to_seconds(self, tick: int) -> float:
+        i = bisect.bisect_right(self._tick_list, tick) - 1
+        return float(self.seconds[i] + (tick - self._tick_list[i]) * self.seconds_per_tick[i])
+
+    def to_seconds_array(self, ticks) -> np.ndarray:
+        ticks = np.asarray(ticks, dtype=np.int64)
+        idx = np.searchsorted(self.ticks, ticks, side="right") - 1
+        return self.seconds[idx] + (ticks - self.ticks[idx]) * self.seconds_per_tick[idx]
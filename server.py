@@ -1,26 +1,225 @@
 # server.py
 
-from fastapi import FastAPI, HTTPException, UploadFile, File, Form, Query
+import asyncio
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, HTTPException, UploadFile, File, Form, Query, WebSocket, WebSocketDisconnect
+from fastapi.responses import StreamingResponse, FileResponse, JSONResponse, PlainTextResponse
+from fastapi.concurrency import run_in_threadpool
+from starlette.background import BackgroundTask
 from pydantic import BaseModel
-from typing import Dict
+from typing import Dict, List, Optional, Union
+import json
+import hashlib
 import uuid
 import os
+import tempfile
+import threading
+import time
+from urllib.parse import quote
 
 from sound.sound_manager import SoundManager
+from sound.note_dispatcher import NoteDispatcher, QueueFullError
 from sound.sound_mapping import SoundMapping
 from midi.midi_player import MidiPlayer
+from midi.playback import PlaybackSession
+from midi.live_session import LiveSession
+from midi.renderer import OfflineRenderer
+from midi.batch import create_pool, run_batch
+from midi.parse_cache import ParseCache
+from midi.session_store import SessionStore
 import config
-
-app = FastAPI(title="MIDI 键盘音源接口")
+import metrics
 
 # 初始化映射与播放管理器
 sound_mapping = SoundMapping()
 sound_manager = SoundManager(sound_mapping)
+# 接口只向分发队列提交命令，由专用音频线程执行
+note_dispatcher = NoteDispatcher(sound_manager)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    启动时预加载样本库、创建批处理进程池、启动分发线程与会话清理任务，退出时依次关闭
+    """
+    global batch_pool
+    if config.PRELOAD_SOUNDS:
+        sound_manager.preload()
+    # 工作进程在第一次提交任务时才启动
+    batch_pool = create_pool()
+    note_dispatcher.start()
+    reaper = asyncio.create_task(reap_sessions())
+    yield
+    reaper.cancel()
+    batch_pool.shutdown(cancel_futures=True)
+    batch_pool = None
+    metrics.profiler.stop()
+    note_dispatcher.stop()
+    for playback in list(playback_sessions.values()):
+        playback.stop()
+    sound_manager.close()
+
+
+# /batch_parse/ 共用的进程池（spawn 启动方式），由 lifespan 创建和关闭
+batch_pool = None
+
+
+async def reap_sessions():
+    """
+    后台任务：定期清理空闲过期的 MIDI 会话
+    """
+    while True:
+        await asyncio.sleep(config.SESSION_REAP_INTERVAL)
+        try:
+            expired = await run_in_threadpool(midi_sessions.reap)
+            if expired:
+                print(f"[会话] 清理过期会话 {expired} 个")
+        except Exception as e:
+            print(f"[会话] 清理失败: {e}")
+
+
+app = FastAPI(title="MIDI 键盘音源接口", lifespan=lifespan)
+
+_HTTP_REQUESTS = metrics.counter("http_requests_total", "HTTP 请求数", ("method", "route", "status"))
+_HTTP_SECONDS = metrics.histogram("http_request_seconds", "HTTP 请求处理耗时（到响应头发出为止）", ("route",))
+_UPLOAD_BYTES = metrics.counter("midi_upload_bytes_total", "上传的 MIDI 文件字节数")
+_UPLOADS = metrics.counter("midi_uploads_total", "MIDI 文件上传次数", ("result",))
+_RENDER_SECONDS = metrics.histogram("midi_render_seconds", "离线渲染到临时文件的耗时")
+
+
+class RequestMetricsMiddleware:
+    """
+    纯 ASGI 中间件：按路由模板统计请求数、状态码和耗时，不按原始路径分组以免标签数量失控
+    只在启用指标时安装
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        started = time.perf_counter()
+        status = 500
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                route = scope.get("route")
+                _HTTP_SECONDS.labels(route.path if route else "unmatched").observe(time.perf_counter() - started)
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            route = scope.get("route")
+            _HTTP_REQUESTS.labels(scope["method"], route.path if route else "unmatched", status).inc()
+
+
+class UploadSizeLimitMiddleware:
+    """
+    纯 ASGI 中间件：在 multipart 解析之前限制上传请求体的大小
+    UploadFile 参数要等 Starlette 把整个请求体写入临时文件后才交给接口，接口内的大小检查为时已晚；
+    这里先按 Content-Length 直接拒绝，没有 Content-Length（分块传输）时边接收边计数，超限即中止
+    """
+
+    def __init__(self, app, paths=("/upload_midi/",)):
+        self.app = app
+        self.paths = paths
 
-# 全局缓存，用 session_id 关联 MidiPlayer 实例
-midi_sessions = {}
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] not in self.paths:
+            await self.app(scope, receive, send)
+            return
+        # 表单边界与各部分的头也计入请求体，留出少量余量
+        limit = config.UPLOAD_MAX_BYTES + UPLOAD_FORM_OVERHEAD
+        headers = dict(scope["headers"])
+        try:
+            declared = int(headers.get(b"content-length", b"-1"))
+        except ValueError:
+            declared = -1
+        if declared > limit:
+            _UPLOADS.labels("too_large").inc()
+            response = JSONResponse({"detail": f"文件超过大小上限 {config.UPLOAD_MAX_BYTES} 字节"},
+                                    status_code=413)
+            await response(scope, receive, send)
+            return
+
+        received = 0
+
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > limit:
+                    _UPLOADS.labels("too_large").inc()
+                    raise HTTPException(status_code=413,
+                                        detail=f"文件超过大小上限 {config.UPLOAD_MAX_BYTES} 字节")
+            return message
+
+        await self.app(scope, limited_receive, send)
+
+
+app.add_middleware(UploadSizeLimitMiddleware)
+if metrics.ENABLED:
+    app.add_middleware(RequestMetricsMiddleware)
+
+# 按文件内容哈希缓存解析结果，重复上传同一文件时跳过 mido 解析
+parse_cache = ParseCache(disk_dir=config.PARSE_CACHE_DIR if config.PARSE_CACHE_DISK else None)
+
+# 正在回放的会话，用 session_id 关联 PlaybackSession 实例
+playback_sessions = {}
+
+
+def _is_playing(session_id: str) -> bool:
+    playback = playback_sessions.get(session_id)
+    return playback is not None and playback.state == "playing"
+
+
+# 上传文件按内容哈希共用，引用计数记录每个文件被多少个会话（及正在解析的上传）使用
+# 查重、计数增减与删除文件都在 _upload_lock 内完成，查重命中后文件不会被并发移除的会话删掉
+_upload_refs: Dict[str, int] = {}
+_upload_lock = threading.Lock()
+
+
+def _release_upload(file_path: str):
+    """
+    归还一次上传文件引用，最后一个引用归还时删除文件
+    """
+    with _upload_lock:
+        count = _upload_refs.pop(file_path, 0) - 1
+        if count > 0:
+            _upload_refs[file_path] = count
+            return
+        try:
+            os.remove(file_path)
+        except FileNotFoundError:
+            pass
+
+
+def _on_session_removed(session_id: str, player: MidiPlayer, reason: str):
+    """
+    会话被移除时停止其回放，并归还其上传文件的引用
+    """
+    playback = playback_sessions.pop(session_id, None)
+    if playback is not None:
+        playback.stop()
+    _release_upload(player.file_path)
+
+
+# 用 session_id 关联 MidiPlayer 实例：空闲过期、LRU 淘汰，并限制会话数与估算内存
+midi_sessions = SessionStore(on_evict=_on_session_removed, is_busy=_is_playing)
+
+# /parse_midi/ 分页与流式输出参数
+PARSE_MAX_PAGE_SIZE = 10000
+PARSE_STREAM_CHUNK = 2000
 
 UPLOAD_DIR = "resources/uploads"
+# 上传请求体中 multipart 边界与表单头的余量（字节），请求体超过 UPLOAD_MAX_BYTES 加此余量时直接拒绝
+UPLOAD_FORM_OVERHEAD = 64 * 1024
 os.makedirs(UPLOAD_DIR, exist_ok=True)
 
 # 请求模型
@@ -29,6 +228,22 @@ class NoteRequest(BaseModel):
     velocity: int = 100
 
 
+class BatchNoteItem(BaseModel):
+    note: int
+    velocity: int = 100
+    group: Optional[str] = None
+    offset_ms: float = 0.0
+
+
+class BatchNoteRequest(BaseModel):
+    notes: List[BatchNoteItem]
+
+
+class BatchParseRequest(BaseModel):
+    session_ids: List[str]
+    workers: Optional[int] = None
+
+
 class NoteGroupRequest(BaseModel):
     note: int
     group: str
@@ -38,24 +253,150 @@ class MappingDictRequest(BaseModel):
     mapping_dict: Dict[int, str]
 
 
+class PolyphonyRequest(BaseModel):
+    max_polyphony: int
+    steal_policy: str = "oldest"
+
+
+class VelocityCurveRequest(BaseModel):
+    group: str
+    curve: Union[str, Dict[str, Union[str, float]], List[float]] = "db"
+
+
 @app.post("/play_note")
-def play_note(req: NoteRequest):
+async def play_note(req: NoteRequest):
     """
     播放一个音符（支持力度）
+    只把命令压入分发队列后立即返回，解码与混音由专用音频线程完成；队列满时返回 503
     """
     try:
-        sound_manager.play_note(note=req.note, velocity=req.velocity)  # 传入力度
-        return {"status": "ok"}
+        accepted = note_dispatcher.submit(note=req.note, velocity=req.velocity)  # 传入力度
+        return {"status": "ok" if accepted else "dropped"}
+    except QueueFullError as e:
+        raise HTTPException(status_code=503, detail=f"播放繁忙: {e}")
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"播放失败: {e}")
 
+
+# 单次批量播放的最大音符数
+PLAY_NOTES_MAX_BATCH = 512
+
+
+@app.post("/play_notes")
+def play_notes(req: BatchNoteRequest):
+    """
+    批量播放和弦或短句：每项可指定力度、音源组和相对偏移（毫秒）
+    全部样本先统一校验解析，再以同一个混音器时钟基准调度，起音对齐到采样；任一项无效时整批不播放
+    """
+    if not req.notes:
+        raise HTTPException(status_code=400, detail="音符列表为空")
+    if len(req.notes) > PLAY_NOTES_MAX_BATCH:
+        raise HTTPException(status_code=413, detail=f"单次最多 {PLAY_NOTES_MAX_BATCH} 个音符")
+    unknown = sorted({item.group for item in req.notes
+                      if item.group is not None and item.group not in config.AVAILABLE_SOUND_GROUPS})
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"无效的音源组: {', '.join(unknown)}")
+    try:
+        start_frame = sound_manager.schedule_notes(
+            [(item.note, item.velocity, item.group, item.offset_ms) for item in req.notes])
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"批量播放失败: {e}")
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"播放失败: {e}")
+    return {"status": "ok", "scheduled": len(req.notes), "start_frame": start_frame}
+
+
+# 当前的 WebSocket 实时演奏连接
+live_sessions: Dict[int, LiveSession] = {}
+
+
+@app.websocket("/ws/play")
+async def ws_play(websocket: WebSocket):
+    """
+    实时演奏：一个连接上连续发送音符，省去每个音符一次 HTTP 请求的开销
+    文本帧为 JSON（单条、列表或 {"notes": [...]} 批量），二进制帧为原始 MIDI 字节
+    服务器定期发送 {"type": "ping", "id": n}，客户端回 {"type": "pong", "id": n} 用于统计往返延迟
+    """
+    await websocket.accept()
+    live = LiveSession(note_dispatcher, sound_manager)
+    live_sessions[live.id] = live
+    pinger = asyncio.create_task(_ws_ping(websocket, live))
+    try:
+        while True:
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                break
+            if message.get("bytes") is not None:
+                replies = live.handle_binary(message["bytes"])
+            else:
+                try:
+                    replies = live.handle_json(json.loads(message.get("text") or ""))
+                except ValueError:
+                    live.errors += 1
+                    replies = [{"type": "error", "detail": "无效的 JSON"}]
+            for reply in replies:
+                await websocket.send_json(reply)
+    except WebSocketDisconnect:
+        pass
+    finally:
+        pinger.cancel()
+        live.close()
+        live_sessions.pop(live.id, None)
+
+
+async def _ws_ping(websocket: WebSocket, live: LiveSession):
+    if not config.LIVE_PING_INTERVAL:
+        return
+    try:
+        while True:
+            await asyncio.sleep(config.LIVE_PING_INTERVAL)
+            await websocket.send_json(live.ping())
+    except Exception:
+        # 连接已关闭，由接收循环负责清理
+        pass
+
+
+@app.get("/live_stats")
+def live_stats():
+    """
+    所有实时演奏连接的统计
+    """
+    return {"connections": [live.stats() for live in list(live_sessions.values())]}
+
+
+@app.get("/dispatch_stats")
+def dispatch_stats():
+    """
+    查询音符分发队列深度、丢弃次数与分发延迟
+    """
+    return note_dispatcher.stats()
+
+@app.get("/voices")
+def get_voices():
+    """
+    查询当前发声数、抢占次数和复音限制
+    """
+    return sound_manager.get_voice_stats()
+
+
+@app.post("/set_polyphony")
+def set_polyphony(req: PolyphonyRequest):
+    """
+    设置最大复音数与抢占策略（oldest / quietest / same_note）
+    """
+    try:
+        sound_manager.set_polyphony(req.max_polyphony, req.steal_policy)
+        return {"status": "ok"}
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"设置失败: {e}")
+
 @app.get("/refresh_sound_groups/")
 def refresh_sound_groups():
     """
     刷新并返回当前存在的音源组
     """
     try:
-        groups = config.get_available_sound_groups()
+        groups = config.refresh_sound_groups()
         return {"available_sound_groups": groups}
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"刷新失败: {e}")
@@ -72,6 +413,18 @@ def set_note_group(req: NoteGroupRequest):
         raise HTTPException(status_code=400, detail=f"设置失败: {e}")
 
 
+@app.post("/set_velocity_curve")
+def set_velocity_curve(req: VelocityCurveRequest):
+    """
+    设置某个音源组的力度曲线：db / linear / exponential，或 128 项自定义增益表
+    """
+    try:
+        sound_manager.set_velocity_curve(req.group, req.curve)
+        return {"status": "ok"}
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"设置失败: {e}")
+
+
 @app.get("/get_note_group")
 def get_note_group(note: int):
     """
@@ -113,10 +466,34 @@ def load_mapping(name: str):
     """
     try:
         sound_mapping.load_mapping_from_file(name)
-        return {"message": f"已加载映射: {name}"}
+        # 预先解码新映射用到、但不在样本库中的样本，避免首次按键时解码
+        warmed = sound_manager.warmup()
+        return {"message": f"已加载映射: {name}", "warmed": warmed}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/warmup_sounds/")
+def warmup_sounds(group: Optional[str] = None):
+    """
+    预先解码某个音源组（不指定时为当前映射用到的样本）中不在样本库里的样本
+    """
+    if group is not None and group not in config.AVAILABLE_SOUND_GROUPS:
+        raise HTTPException(status_code=400, detail=f"无效的音源组: {group}")
+    try:
+        warmed = sound_manager.warmup([group] if group else None)
+        return {"warmed": warmed, "cache": sound_manager.sample_cache.stats()}
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"预热失败: {e}")
+
+
+@app.get("/sample_cache_stats/")
+def sample_cache_stats():
+    """
+    解码样本缓存的命中、淘汰和内存占用统计
+    """
+    return sound_manager.sample_cache.stats()
+
+
 @app.get("/list_mappings/")
 def list_mappings():
     """
@@ -132,65 +509,302 @@ def list_mappings():
 async def upload_midi(file: UploadFile = File(...)):
     """
     上传 MIDI 文件，保存，生成 MidiPlayer 并缓存，返回 session_id
+    上传时只校验文件头与轨道块结构（结构无效时返回 400），事件解析推迟到第一次使用
+    （/parse_midi/、回放、渲染）或由 /batch_parse/ 在进程池中批量完成
     """
     try:
-        file_location = os.path.join(UPLOAD_DIR, file.filename)
-        with open(file_location, "wb") as f:
-            f.write(await file.read())
-
-        player = MidiPlayer(file_location)
+        content_hash, size, file_location, deduplicated = await _store_upload(file)
+        # 此后本次上传持有文件的一个引用，解析成功后转交给会话
+        _UPLOAD_BYTES.inc(size)
+        _UPLOADS.labels("deduplicated" if deduplicated else "stored").inc()
+        player = MidiPlayer(file_location, parse_cache=parse_cache,
+                            content_hash=content_hash, name=file.filename)
+        try:
+            info = await run_in_threadpool(player.check)
+        except Exception as e:
+            _UPLOADS.labels("invalid").inc()
+            _release_upload(file_location)
+            raise HTTPException(status_code=400, detail=f"无效的 MIDI 文件: {e}")
         session_id = str(uuid.uuid4())
-        midi_sessions[session_id] = player
+        midi_sessions.put(session_id, player)
 
-        return {"session_id": session_id, "filename": file.filename}
+        return {"session_id": session_id, "filename": file.filename, "sha256": content_hash,
+                "size": size, "deduplicated": deduplicated, **info}
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"上传失败: {e}")
 
+
+async def _store_upload(file: UploadFile):
+    """
+    分块读取上传内容，边写入临时文件边计算 SHA-256，超过大小上限时立即中止
+    文件按内容哈希命名（<sha256>.mid），相同内容的上传共用一个文件，并发上传同名文件也不会互相覆盖
+    返回 (哈希, 字节数, 文件路径, 是否与已有文件重复)，返回时已为调用方登记了一个文件引用
+    """
+    digest = hashlib.sha256()
+    size = 0
+    tmp_path = os.path.join(UPLOAD_DIR, f".{uuid.uuid4().hex}.part")
+    f = await run_in_threadpool(open, tmp_path, "wb")
+    try:
+        while True:
+            chunk = await file.read(config.UPLOAD_CHUNK_SIZE)
+            if not chunk:
+                break
+            size += len(chunk)
+            if size > config.UPLOAD_MAX_BYTES:
+                _UPLOADS.labels("too_large").inc()
+                raise HTTPException(status_code=413,
+                                    detail=f"文件超过大小上限 {config.UPLOAD_MAX_BYTES} 字节")
+            digest.update(chunk)
+            await run_in_threadpool(f.write, chunk)
+        await run_in_threadpool(f.close)
+    except BaseException:
+        f.close()
+        os.remove(tmp_path)
+        raise
+
+    content_hash = digest.hexdigest()
+    file_location = os.path.join(UPLOAD_DIR, f"{content_hash}.mid")
+    with _upload_lock:
+        deduplicated = os.path.exists(file_location)
+        if deduplicated:
+            os.remove(tmp_path)
+        else:
+            os.replace(tmp_path, file_location)
+        _upload_refs[file_location] = _upload_refs.get(file_location, 0) + 1
+    return content_hash, size, file_location, deduplicated
+
+@app.get("/parse_cache_stats/")
+def parse_cache_stats():
+    """
+    查询解析缓存的条目数、占用字节与命中/未命中次数
+    """
+    return parse_cache.stats()
+
+@app.post("/batch_parse/")
+def batch_parse(req: BatchParseRequest):
+    """
+    用多进程并行解析多个会话的 MIDI 文件，结果写入解析缓存后安装到各会话
+    同步接口，在线程池中等待共享进程池的结果；进程池大小由 BATCH_WORKERS 决定，请求中的 workers
+    只在没有共享进程池（未经 lifespan 启动）时用于临时进程池
+    """
+    players = {}
+    for session_id in req.session_ids:
+        player = midi_sessions.get(session_id)
+        if not player:
+            raise HTTPException(status_code=404, detail=f"Session不存在: {session_id}")
+        players[session_id] = player
+
+    by_path = {}
+    for session_id, player in players.items():
+        if not player.parsed:
+            by_path.setdefault(player.file_path, []).append(session_id)
+
+    results = run_batch(list(by_path), "parse", req.workers, executor=batch_pool)
+    summary = {session_id: {"status": "already_parsed"} for session_id in players}
+    for result in results:
+        for session_id in by_path[result["path"]]:
+            if not result["ok"]:
+                summary[session_id] = {"status": "error", "detail": result["error"]}
+                continue
+            player = players[session_id]
+            player.content_hash = result["sha256"]
+            parse_cache.put(result["sha256"], result["parsed"])
+            player.parse()
+            summary[session_id] = {"status": "parsed", "events": result["events"],
+                                   "duration": round(result["duration"], 3),
+                                   "seconds": round(result["seconds"], 3)}
+    return {"sessions": summary}
+
+
 @app.post("/parse_midi/")
-async def parse_midi(session_id: str = Form(...)):
+def parse_midi(session_id: str = Form(...),
+               offset: int = Form(0),
+               limit: Optional[int] = Form(None),
+               start_sec: Optional[float] = Form(None),
+               end_sec: Optional[float] = Form(None),
+               channel: Optional[int] = Form(None),
+               event_type: Optional[str] = Form(None),
+               stream: bool = Form(False)):
     """
     解析指定 session_id 对应的 MIDI 文件，返回事件和通道乐器信息
+    可按时间窗 [start_sec, end_sec)、通道、事件类型（逗号分隔）筛选，offset/limit 分页，
+    返回的 next_offset 即下一页的游标；stream=true 时以 NDJSON 流式输出，
+    首行为文件信息，之后每行一个事件
+    同步接口：解析、筛选和序列化都在线程池中执行，大文件不会阻塞事件循环
     """
     player = midi_sessions.get(session_id)
     if player is None:
         raise HTTPException(status_code=404, detail="无效的 session_id 或会话已过期")
 
     try:
-        player.parse()
+        player.ensure_parsed()
+        table = player.get_event_table()
+        types = [t.strip() for t in event_type.split(",") if t.strip()] if event_type else None
+        index = table.select(start_sec, end_sec, channel, types)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"参数错误: {e}")
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"解析失败: {e}")
 
-        events = [
-            {
-                "time": round(e.time, 3),
-                "type": e.type,
-                "channel": e.channel,
-                "note": e.note,
-                "velocity": e.velocity,
-                "program": e.program,
-                "group": player.get_group_name_by_program(e.program) if e.program is not None else None
-            }
-            for e in player.get_events()
-        ]
+    filename = player.name
+    channel_programs = player.get_channel_programs()
+    total = len(index)
+    offset = max(0, offset)
+    end = total if limit is None else min(total, offset + max(0, min(limit, PARSE_MAX_PAGE_SIZE)))
+    page = index[offset:end]
+
+    if stream:
+        def iter_ndjson():
+            yield json.dumps({"filename": filename, "channel_programs": channel_programs,
+                              "total": total, "offset": offset, "count": len(page)},
+                             ensure_ascii=False) + "\n"
+            # 分块序列化，峰值内存只与块大小有关
+            for start in range(0, len(page), PARSE_STREAM_CHUNK):
+                records = table.take(page[start:start + PARSE_STREAM_CHUNK]).to_records(
+                    player.get_group_name_by_program)
+                yield "".join(json.dumps(r, ensure_ascii=False) + "\n" for r in records)
+
+        return StreamingResponse(iter_ndjson(), media_type="application/x-ndjson")
+
+    # 直接从列式事件表整列序列化，不逐个构造 MidiEvent
+    events = table.take(page).to_records(player.get_group_name_by_program)
+    return {
+        "filename": filename,
+        "events": events,
+        "channel_programs": channel_programs,
+        "total": total,
+        "offset": offset,
+        "next_offset": end if end < total else None
+    }
 
-        channel_programs = player.get_channel_programs()
+@app.post("/play_midi/")
+def play_midi(session_id: str, tempo: float = 1.0, start_sec: float = 0.0):
+    """
+    在独立调度线程中回放 MIDI，事件按采样帧精确调度；tempo 为速度倍率
+    """
+    player = midi_sessions.get(session_id)
+    if not player:
+        raise HTTPException(status_code=404, detail="Session不存在")
 
-        return {
-            "filename": os.path.basename(player.file_path),
-            "events": events,
-            "channel_programs": channel_programs
-        }
+    try:
+        player.ensure_parsed()
+        old = playback_sessions.pop(session_id, None)
+        if old is not None:
+            old.stop()
+        playback = PlaybackSession(player, sound_manager, tempo=tempo)
+        playback.play(start_sec)
+        playback_sessions[session_id] = playback
+        return {"status": "playing", "duration": round(playback.duration, 3)}
+    except HTTPException:
+        raise
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"解析失败: {e}")
+        raise HTTPException(status_code=500, detail=f"播放失败: {e}")
 
-@app.post("/play_midi/")
-def play_midi(session_id: str):
+
+@app.post("/render_midi/")
+async def render_midi(session_id: str, tempo: float = 1.0, stream: bool = False):
     """
-    伪代码，待实现
+    离线渲染为 16 位 WAV，按固定大小的块混音，内存占用与文件长度无关
+    stream=true 时先发送长度精确的文件头再边渲染边发送；否则渲染到临时文件后返回，
+    响应头 X-Render-Speed 为渲染速度相对实时的倍数
     """
     player = midi_sessions.get(session_id)
     if not player:
         raise HTTPException(status_code=404, detail="Session不存在")
-    player.play()
-    return {"status": "playing"}
+    try:
+        await run_in_threadpool(player.ensure_parsed)
+        renderer = OfflineRenderer(player, sound_manager, tempo=tempo)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"渲染失败: {e}")
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"渲染失败: {e}")
+
+    filename = f"{os.path.splitext(player.name)[0]}.wav"
+    headers = {"Content-Disposition": f"attachment; filename*=UTF-8''{quote(filename)}"}
+    if stream:
+        def wav_chunks():
+            yield from renderer.wav_stream()
+            stats = renderer.stats()
+            print(f"[渲染] {session_id}: {stats['audio_seconds']}s 音频，耗时 {stats['render_seconds']}s，"
+                  f"{stats['realtime_factor']}x 实时")
+
+        # 同步生成器由 StreamingResponse 放到线程池中迭代，不阻塞事件循环
+        return StreamingResponse(wav_chunks(), media_type="audio/wav", headers=headers)
+
+    fd, path = tempfile.mkstemp(suffix=".wav")
+    os.close(fd)
+    try:
+        stats = await run_in_threadpool(renderer.render_to_wav, path)
+    except Exception as e:
+        os.remove(path)
+        raise HTTPException(status_code=500, detail=f"渲染失败: {e}")
+    _RENDER_SECONDS.observe(stats["render_seconds"])
+    headers.update({
+        "X-Render-Seconds": str(stats["render_seconds"]),
+        "X-Audio-Seconds": str(stats["audio_seconds"]),
+        "X-Render-Speed": str(stats["realtime_factor"])
+    })
+    return FileResponse(path, media_type="audio/wav", headers=headers,
+                        background=BackgroundTask(os.remove, path))
+
+
+def _get_playback(session_id: str) -> PlaybackSession:
+    playback = playback_sessions.get(session_id)
+    if playback is None:
+        raise HTTPException(status_code=404, detail="该会话没有正在进行的回放")
+    return playback
+
+
+@app.post("/pause_midi/")
+def pause_midi(session_id: str):
+    playback = _get_playback(session_id)
+    playback.pause()
+    return playback.stats()
+
+
+@app.post("/resume_midi/")
+def resume_midi(session_id: str):
+    playback = _get_playback(session_id)
+    playback.resume()
+    return playback.stats()
+
+
+@app.post("/seek_midi/")
+def seek_midi(session_id: str, position: float):
+    """
+    跳转到指定位置（秒）
+    """
+    playback = _get_playback(session_id)
+    playback.seek(position)
+    return playback.stats()
+
+
+@app.post("/set_playback_tempo/")
+def set_playback_tempo(session_id: str, tempo: float):
+    playback = _get_playback(session_id)
+    try:
+        playback.set_tempo(tempo)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return playback.stats()
+
+
+@app.post("/stop_midi/")
+def stop_midi(session_id: str):
+    playback = playback_sessions.pop(session_id, None)
+    if playback is not None:
+        playback.stop()
+    return {"status": "stopped"}
+
+
+@app.get("/playback_status/")
+def playback_status(session_id: str):
+    """
+    查询回放状态、位置以及调度抖动统计
+    """
+    return _get_playback(session_id).stats()
 
 @app.get("/get_group_by_program/")
 async def get_group_by_program(session_id: str = Query(...), program: int = Query(...)):
@@ -217,6 +831,96 @@ def set_mapping(session_id: str, mapping: Dict[int, str]):
 
 @app.post("/cleanup/")
 def cleanup(session_id: str):
-    if session_id in midi_sessions:
-        del midi_sessions[session_id]
-    return {"status": "cleaned"}
\ No newline at end of file
+    # 移除回调会停止回放并删除不再被引用的上传文件
+    midi_sessions.remove(session_id)
+    return {"status": "cleaned"}
+
+
+@app.get("/session_stats/")
+def session_stats():
+    """
+    查询存活会话数、估算内存占用和过期/淘汰次数
+    """
+    stats = midi_sessions.stats()
+    stats["playing"] = sum(1 for playback in list(playback_sessions.values()) if playback.state == "playing")
+    return stats
+
+
+def _collect_runtime_metrics():
+    """
+    抓取时读取各组件已有的统计字段：发声数、分发队列、样本与解析缓存、会话数
+    """
+    voices = sound_manager.get_voice_stats()
+    yield "mixer_voices", "gauge", "当前声部数", [
+        ({"state": state}, voices[state]) for state in ("active", "releasing", "pending", "scheduled")]
+    yield "mixer_peak_voices", "gauge", "同时发声数峰值", [({}, voices["peak"])]
+    yield "mixer_voices_started_total", "counter", "起音的声部数", [({}, voices["started"])]
+    yield "mixer_voices_stolen_total", "counter", "被抢占的声部数", [({}, voices["stolen"])]
+
+    dispatch = note_dispatcher.stats()
+    yield "note_queue_depth", "gauge", "音符分发队列深度", [({}, dispatch["depth"])]
+    yield "note_queue_commands_total", "counter", "分发队列的命令数", [
+        ({"result": result}, dispatch[result]) for result in ("submitted", "dispatched", "dropped", "rejected", "errors")]
+
+    cache = sound_manager.sample_cache.stats()
+    yield "sample_cache_bytes", "gauge", "样本缓存占用字节", [({}, cache["bytes"])]
+    yield "sample_cache_entries", "gauge", "样本缓存条目数", [({}, cache["entries"])]
+    yield "sample_cache_lookups_total", "counter", "样本缓存查询次数", [
+        ({"result": "hit"}, cache["hits"]), ({"result": "miss"}, cache["misses"])]
+    yield "sample_cache_evictions_total", "counter", "样本缓存按预算淘汰次数", [({}, cache["evictions"])]
+
+    parse = parse_cache.stats()
+    yield "parse_cache_entries", "gauge", "解析缓存条目数", [({}, parse["entries"])]
+    yield "parse_cache_lookups_total", "counter", "解析缓存查询次数", [
+        ({"result": "hit"}, parse["hits"]), ({"result": "disk_hit"}, parse["disk_hits"]),
+        ({"result": "miss"}, parse["misses"])]
+
+    sessions = midi_sessions.stats()
+    yield "midi_sessions", "gauge", "存活的 MIDI 会话数", [({}, sessions["sessions"])]
+    yield "midi_sessions_estimated_bytes", "gauge", "MIDI 会话估算内存占用", [({}, sessions["estimated_bytes"])]
+    yield "midi_sessions_removed_total", "counter", "被移除的 MIDI 会话数", [
+        ({"reason": "evicted"}, sessions["evicted"]), ({"reason": "expired"}, sessions["expired"])]
+    yield "midi_playback_sessions", "gauge", "回放会话数", [
+        ({"state": "playing"}, sum(1 for p in list(playback_sessions.values()) if p.state == "playing")),
+        ({"state": "all"}, len(playback_sessions))]
+    yield "live_connections", "gauge", "实时演奏 WebSocket 连接数", [({}, len(live_sessions))]
+
+
+metrics.register_collector("server", _collect_runtime_metrics)
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def get_metrics():
+    """
+    Prometheus 文本格式的指标；关闭 METRICS_ENABLED 时返回空内容
+    """
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+
+@app.post("/profiler/start")
+def start_profiler(interval_ms: Optional[float] = None):
+    """
+    开启采样分析器，interval_ms 为采样间隔；重新开启会清空之前的采样
+    """
+    if interval_ms is not None and interval_ms <= 0:
+        raise HTTPException(status_code=400, detail="采样间隔必须大于 0")
+    metrics.profiler.start(interval_ms / 1000 if interval_ms else None)
+    return metrics.profiler.stats()
+
+
+@app.post("/profiler/stop")
+def stop_profiler():
+    metrics.profiler.stop()
+    return metrics.profiler.stats()
+
+
+@app.get("/profiler")
+def get_profile(format: str = "json", limit: int = 20):
+    """
+    采样结果：format=json 返回按栈顶函数汇总的前 limit 项，format=collapsed 返回折叠栈文本（可生成火焰图）
+    """
+    if format == "collapsed":
+        return PlainTextResponse(metrics.profiler.collapsed())
+    if format != "json":
+        raise HTTPException(status_code=400, detail="format 只能是 json 或 collapsed")
+    return {"stats": metrics.profiler.stats(), "top": metrics.profiler.top(limit)}
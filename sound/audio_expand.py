@@ -1,38 +1,181 @@
+# sound/audio_expand.py
+#
+# 从已录制的少量样本变调扩展出整个键盘范围的样本：
+#     python -m sound.audio_expand lalala --workers 4
+# 每个目标音符取最近的已录制样本做音高变换，各音符分发到进程池并行处理
+# 输出目录中的清单文件记录每个输出对应的源样本哈希和参数，只重新生成源样本或参数变化过的音符
+
+import argparse
+import hashlib
+import json
 import os
-import librosa
-import soundfile as sf
-
-INPUT_DIR = "resources/sounds/lalala"
-OUTPUT_DIR = "resources/sounds/expanded_88"
-
-# 确保输出目录存在
-os.makedirs(OUTPUT_DIR, exist_ok=True)
-
-# 加载已有样本：假设命名为 60.wav, 61.wav...
-existing_samples = {}
-for filename in os.listdir(INPUT_DIR):
-    if filename.endswith(".wav"):
-        midi = int(filename.replace(".wav", ""))
-        path = os.path.join(INPUT_DIR, filename)
-        y, sr = librosa.load(path, sr=None)
-        existing_samples[midi] = (y, sr)
-
-# 所有目标键：21 ~ 108
-for target_midi in range(21, 109):
-    out_path = os.path.join(OUTPUT_DIR, f"{target_midi}.wav")
-
-    # 如果输出文件已存在，跳过
-    if os.path.exists(out_path):
-        continue
-
-    # 找最近的已录制样本
-    closest_midi = min(existing_samples.keys(), key=lambda x: abs(x - target_midi))
-    y_base, sr = existing_samples[closest_midi]
-    n_steps = target_midi - closest_midi  # 半音差
-
-    # 使用 librosa 进行音高变换
-    y_shifted = librosa.effects.pitch_shift(y_base, sr=sr, n_steps=n_steps)
-
-    # 保存新音频
-    sf.write(out_path, y_shifted, sr)
-    print(f"生成 {target_midi}.wav，基于 {closest_midi}.wav，变调 {n_steps:+} 半音")
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Dict, Optional
+import config
+from sound.pcm import list_group_wavs
+
+MANIFEST_NAME = ".expand_manifest.json"
+# 变换算法或输出格式改变时递增，使旧清单中的全部条目失效
+EXPAND_VERSION = 1
+LOWEST_NOTE = 21
+HIGHEST_NOTE = 108
+# 与原先固定写入的 resources/sounds/expanded_88 保持一致
+DEFAULT_OUTPUT = "expanded_88"
+
+
+def _sha256(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def load_manifest(output_dir: str) -> Dict[str, dict]:
+    try:
+        with open(os.path.join(output_dir, MANIFEST_NAME), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_manifest(output_dir: str, manifest: Dict[str, dict]):
+    path = os.path.join(output_dir, MANIFEST_NAME)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2, sort_keys=True)
+    os.replace(tmp_path, path)
+
+
+def plan_expansion(sources: Dict[int, str], low: int, high: int) -> Dict[int, int]:
+    """
+    为 [low, high] 内每个目标音符选择最近的已录制样本，返回 {目标音符: 源音符}
+    """
+    if not sources:
+        raise ValueError("源音源组中没有 <note>.wav 样本")
+    return {target: min(sources, key=lambda note: (abs(note - target), note))
+            for target in range(low, high + 1)}
+
+
+def _expand_note(source_path: str, out_path: str, n_steps: int) -> dict:
+    # 在工作进程中执行：librosa 只在这里导入，计划阶段和无变化时不需要加载
+    import librosa
+    import soundfile as sf
+
+    started = time.perf_counter()
+    y, sr = librosa.load(source_path, sr=None)
+    loaded = time.perf_counter()
+    if n_steps:
+        y = librosa.effects.pitch_shift(y, sr=sr, n_steps=n_steps)
+    shifted = time.perf_counter()
+    # 先写临时文件再替换，中断时不会留下不完整的样本
+    tmp_path = f"{out_path}.{os.getpid()}.tmp.wav"
+    sf.write(tmp_path, y, sr)
+    os.replace(tmp_path, out_path)
+    finished = time.perf_counter()
+    return {
+        "load": loaded - started,
+        "shift": shifted - loaded,
+        "write": finished - shifted,
+        "total": finished - started
+    }
+
+
+def expand_group(group: str, output: str, low: int = LOWEST_NOTE, high: int = HIGHEST_NOTE,
+                 workers: Optional[int] = None, force: bool = False, dry_run: bool = False) -> dict:
+    """
+    把音源组 group 扩展到输出音源组 output，返回生成/跳过的统计与每个音符的耗时
+    """
+    source_dir = os.path.join(config.SOUNDS_DIR, group)
+    output_dir = os.path.join(config.SOUNDS_DIR, output)
+    if os.path.abspath(source_dir) == os.path.abspath(output_dir):
+        raise ValueError("输出音源组不能与源音源组相同")
+    sources = list_group_wavs(source_dir)
+    plan = plan_expansion(sources, low, high)
+    source_hashes = {note: _sha256(sources[note]) for note in set(plan.values())}
+
+    manifest = {} if force else load_manifest(output_dir)
+    jobs = {}
+    for target, source in plan.items():
+        entry = {
+            "version": EXPAND_VERSION,
+            "source_group": group,
+            "source_note": source,
+            "source_sha256": source_hashes[source],
+            "n_steps": target - source
+        }
+        out_path = os.path.join(output_dir, f"{target}.wav")
+        if manifest.get(str(target)) == entry and os.path.isfile(out_path):
+            continue
+        jobs[target] = (entry, out_path)
+
+    report = {"generated": 0, "skipped": len(plan) - len(jobs), "failed": 0, "timings": {}}
+    if dry_run:
+        for target, (entry, _) in sorted(jobs.items()):
+            print(f"[扩展] 将生成 {target}.wav，基于 {entry['source_note']}.wav，变调 {entry['n_steps']:+} 半音")
+        report["pending"] = sorted(jobs)
+        return report
+    if not jobs:
+        return report
+
+    os.makedirs(output_dir, exist_ok=True)
+    workers = max(1, min(workers or config.BATCH_WORKERS or os.cpu_count() or 1, len(jobs)))
+    started = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = {executor.submit(_expand_note, sources[entry["source_note"]], out_path, entry["n_steps"]): target
+                   for target, (entry, out_path) in jobs.items()}
+        for done, future in enumerate(as_completed(futures), 1):
+            target = futures[future]
+            entry = jobs[target][0]
+            try:
+                timing = future.result()
+            except Exception as e:
+                report["failed"] += 1
+                print(f"[扩展] {done}/{len(jobs)} {target}.wav 失败: {e}", file=sys.stderr)
+                continue
+            # 每完成一个音符就更新清单，中途中断后再次运行只处理剩余的音符
+            manifest[str(target)] = entry
+            save_manifest(output_dir, manifest)
+            report["generated"] += 1
+            report["timings"][target] = timing
+            print(f"[扩展] {done}/{len(jobs)} 生成 {target}.wav，基于 {entry['source_note']}.wav，"
+                  f"变调 {entry['n_steps']:+} 半音，耗时 {timing['total']:.2f}s"
+                  f"（加载 {timing['load']:.2f}s / 变调 {timing['shift']:.2f}s / 写入 {timing['write']:.2f}s）")
+    report["seconds"] = time.perf_counter() - started
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="从已录制样本变调扩展出整个键盘范围的音源组")
+    parser.add_argument("group", help="源音源组（resources/sounds 下的目录名）")
+    parser.add_argument("--output", default=DEFAULT_OUTPUT, help=f"输出音源组，默认 {DEFAULT_OUTPUT}")
+    parser.add_argument("--low", type=int, default=LOWEST_NOTE, help="最低目标音符")
+    parser.add_argument("--high", type=int, default=HIGHEST_NOTE, help="最高目标音符")
+    parser.add_argument("--workers", type=int, default=None, help="工作进程数，默认全部 CPU 核心")
+    parser.add_argument("--force", action="store_true", help="忽略清单，全部重新生成")
+    parser.add_argument("--dry-run", action="store_true", help="只列出需要生成的音符")
+    args = parser.parse_args(argv)
+    if not 0 <= args.low <= args.high <= 127:
+        parser.error("音符范围无效")
+
+    output = args.output
+    report = expand_group(args.group, output, args.low, args.high, args.workers, args.force, args.dry_run)
+    if args.dry_run:
+        print(f"[扩展] {len(report['pending'])} 个音符需要生成，{report['skipped']} 个无变化")
+        return 0
+
+    summary = f"[扩展] {output}: 生成 {report['generated']} 个，无变化跳过 {report['skipped']} 个"
+    if report["failed"]:
+        summary += f"，失败 {report['failed']} 个"
+    if report["timings"]:
+        slowest = max(report["timings"], key=lambda note: report["timings"][note]["total"])
+        summary += (f"，总耗时 {report['seconds']:.2f}s，"
+                    f"最慢 {slowest}.wav {report['timings'][slowest]['total']:.2f}s")
+    print(summary)
+    return 1 if report["failed"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
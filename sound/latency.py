@@ -0,0 +1,48 @@
+# sound/latency.py
+
+from collections import deque
+import numpy as np
+
+
+class LatencyStats:
+    """
+    延迟/抖动统计：累计次数、均值和最大值，并保留最近的样本用于计算分位数
+    record() 只做几次标量运算和一次 deque 追加，可以在音频线程中调用
+    """
+
+    def __init__(self, window: int = 2048):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self._recent = deque(maxlen=window)
+
+    def record(self, value: float):
+        self.count += 1
+        self.total += value
+        if value > self.max:
+            self.max = value
+        self._recent.append(value)
+
+    def reset(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self._recent.clear()
+
+    def summary(self, scale: float = 1000.0, digits: int = 3) -> dict:
+        """
+        返回统计摘要，默认把秒换算为毫秒
+        """
+        recent = np.fromiter(list(self._recent), dtype=np.float64)
+        if recent.size:
+            p50, p95, p99 = np.percentile(recent, [50, 95, 99]) * scale
+        else:
+            p50 = p95 = p99 = 0.0
+        return {
+            "count": self.count,
+            "mean": round(self.total / self.count * scale, digits) if self.count else 0.0,
+            "p50": round(float(p50), digits),
+            "p95": round(float(p95), digits),
+            "p99": round(float(p99), digits),
+            "max": round(self.max * scale, digits)
+        }
@@ -0,0 +1,376 @@
+# sound/mixer.py
+
+import heapq
+import itertools
+import threading
+import time
+from collections import deque
+import numpy as np
+import config
+
+
+class Voice:
+    """
+    一个正在发声的音符：引用一段 float32 或 int16 样本，按块向前推进读取位置
+    """
+    __slots__ = ("data", "gain", "note", "pos", "start_frame", "delay", "tag", "owner",
+                 "fade_end", "fade_total", "cache_key")
+
+    def __init__(self, data: np.ndarray, gain: float = 1.0, note: int = None,
+                 start_frame: int = None, tag=None, owner=None, cache_key=None):
+        self.data = data    # 形状 (frames,) 为单声道，(frames, channels) 为多声道
+        self.gain = gain
+        self.note = note
+        self.pos = 0
+        # 定时起音：start_frame 为混音器时钟上的绝对帧，None 表示尽快播放
+        self.start_frame = start_frame
+        # 当前音频块内的起始偏移帧数，实现块内采样级对齐
+        self.delay = 0
+        # tag 用于按键定位声部（如 note_off），owner 为所属播放会话或输入源，起音时回调其 on_voice_start
+        self.tag = tag
+        self.owner = owner
+        # 淡出状态：在样本位置 fade_end 处结束，之前 fade_total 帧线性淡出；None 表示未在淡出
+        self.fade_end = None
+        self.fade_total = 0
+        # 样本来自 SampleCache 时的缓存键，声部结束时归还引用
+        self.cache_key = cache_key
+
+    def remaining(self) -> int:
+        end = self.data.shape[0]
+        if self.fade_end is not None and self.fade_end < end:
+            end = self.fade_end
+        return end - self.pos
+
+    def fade_out(self, frames: int, delay: int = 0):
+        """
+        delay 帧后在 frames 帧内线性淡出并结束，避免直接截断产生爆音
+        """
+        frames = max(1, frames)
+        end = self.pos + delay + frames
+        if self.fade_end is None or end < self.fade_end:
+            self.fade_end = end
+            self.fade_total = frames
+
+    @property
+    def releasing(self) -> bool:
+        return self.fade_end is not None
+
+
+class Mixer:
+    """
+    软件混音器：只持有一个持久输出流，在回调线程中按块叠加所有活跃声部
+    play() 只把声部放入待处理队列，开销与当前发声数量无关
+    声部和 release 都可以指定混音器时钟上的绝对帧，在回调中按采样偏移精确起止
+    同时发声数受 max_polyphony 限制，超出时按 steal_policy 抢占旧声部：
+        oldest    抢占最早开始的声部
+        quietest  抢占增益最小的声部
+        same_note 同音符重新触发时先结束旧声部，仍超限时抢占最早的声部
+    """
+
+    STEAL_POLICIES = ("oldest", "quietest", "same_note")
+
+    def __init__(self, sample_rate: int = None, channels: int = None, block_size: int = None,
+                 max_polyphony: int = None, steal_policy: str = None):
+        self.sample_rate = sample_rate or config.MIXER_SAMPLE_RATE
+        self.channels = channels or config.MIXER_CHANNELS
+        self.block_size = block_size or config.MIXER_BLOCK_SIZE
+        self.set_polyphony(max_polyphony or config.MAX_POLYPHONY, steal_policy or config.VOICE_STEALING)
+        self.steal_frames = max(1, int(self.sample_rate * config.VOICE_STEAL_FADE_MS / 1000))
+        self.voices_started = 0
+        self.voices_stolen = 0
+        self.peak_voices = 0
+
+        # 待处理队列（声部与控制命令按 FIFO 顺序处理）：deque 的 append/popleft 是线程安全的，入队方无需加锁
+        self._pending = deque()
+        # 活跃声部、定时起音堆和定时 release 堆只在混音线程中读写
+        self._voices = []
+        self._scheduled = []   # (start_frame, seq, voice)
+        self._releases = []    # (frame, seq, tag, fade_frames, owner)
+        self._seq = itertools.count()
+        # 已混音的总帧数，作为混音器时钟
+        self.frames_mixed = 0
+        # 可选：声部结束（播完、被抢占淡出完毕、取消或停止）时把 cache_key 追加到该队列
+        self.ended_keys = None
+
+        self._scratch = np.zeros((self.block_size, self.channels), dtype=np.float32)
+        self._envelope = np.zeros((self.block_size, 1), dtype=np.float32)
+        self._ramp = np.arange(self.block_size, dtype=np.float32)[:, None]
+        self._stream = None
+        self._null_thread = None
+        self._running = False
+        self._start_lock = threading.Lock()
+
+    def start(self):
+        """
+        打开持久输出流；无可用音频设备时退化为按实时速度推进的空输出线程
+        """
+        with self._start_lock:
+            if self._running:
+                return
+            self._running = True
+            try:
+                import sounddevice as sd
+                self._stream = sd.OutputStream(
+                    samplerate=self.sample_rate,
+                    channels=self.channels,
+                    blocksize=self.block_size,
+                    dtype="float32",
+                    callback=self._callback
+                )
+                self._stream.start()
+            except Exception as e:
+                print(f"[混音器] 无法打开输出设备，使用空输出: {e}")
+                self._stream = None
+                self._null_thread = threading.Thread(target=self._null_loop, daemon=True)
+                self._null_thread.start()
+
+    def start_offline(self):
+        """
+        不打开输出流，由调用方自行调用 mix_block 拉取音频（离线渲染），混音速度不受实时限制
+        """
+        with self._start_lock:
+            self._running = True
+
+    def stop(self):
+        """
+        关闭输出流并丢弃所有声部
+        """
+        with self._start_lock:
+            if not self._running:
+                return
+            self._running = False
+            if self._stream is not None:
+                self._stream.stop()
+                self._stream.close()
+                self._stream = None
+            if self._null_thread is not None:
+                self._null_thread.join()
+                self._null_thread = None
+            for item in self._pending:
+                if isinstance(item, Voice):
+                    self._end(item)
+            for voice in self._voices:
+                self._end(voice)
+            for _, _, voice in self._scheduled:
+                self._end(voice)
+            self._pending.clear()
+            self._voices = []
+            self._scheduled = []
+            self._releases = []
+
+    def play(self, data: np.ndarray, gain: float = 1.0, note: int = None,
+             start_frame: int = None, tag=None, owner=None, cache_key=None) -> Voice:
+        """
+        把一段样本作为新声部加入混音，首次调用时自动启动输出流
+        start_frame 为混音器时钟上的绝对起音帧，None 表示下一个音频块开始播放
+        """
+        if not self._running:
+            self.start()
+        if data.dtype == np.int16:
+            gain = gain / 32768.0  # int16 样本在混音时顺带归一化，无需预先转换
+        voice = Voice(data, gain, note, start_frame, tag, owner, cache_key)
+        self._pending.append(voice)
+        return voice
+
+    def release(self, tag, frame: int = None, fade_frames: int = None, owner=None):
+        """
+        在绝对帧 frame（None 表示立即）对 tag 匹配的声部开始淡出
+        """
+        self._pending.append(("release", tag, frame, fade_frames or self.steal_frames, owner))
+
+    def cancel(self, owner):
+        """
+        取消某个 owner 尚未起音的定时声部与 release，并淡出其正在发声的声部
+        """
+        self._pending.append(("cancel", owner))
+
+    def now(self) -> int:
+        """
+        混音器时钟：下一个待混音块的起始帧
+        """
+        return self.frames_mixed
+
+    def set_polyphony(self, max_polyphony: int, steal_policy: str = None):
+        """
+        设置最大复音数和抢占策略，下一个音频块生效
+        """
+        if max_polyphony < 1:
+            raise ValueError("最大复音数必须大于 0")
+        steal_policy = steal_policy or self.steal_policy
+        if steal_policy not in self.STEAL_POLICIES:
+            raise ValueError(f"未知的抢占策略: {steal_policy}，可选 {self.STEAL_POLICIES}")
+        self.max_polyphony = max_polyphony
+        self.steal_policy = steal_policy
+
+    def active_voice_count(self) -> int:
+        """
+        正在发声与待接纳的声部数；待处理队列中的 release / cancel 命令不计入
+        """
+        # list(deque) 在 C 层一次完成复制，不会与混音线程的 popleft 冲突
+        pending = sum(1 for item in list(self._pending) if isinstance(item, Voice))
+        return len(self._voices) + pending
+
+    def voice_stats(self) -> dict:
+        voices = list(self._voices)
+        releasing = sum(1 for v in voices if v.releasing)
+        return {
+            "active": len(voices) - releasing,
+            "releasing": releasing,
+            "pending": len(self._pending),
+            "scheduled": len(self._scheduled),
+            "peak": self.peak_voices,
+            "started": self.voices_started,
+            "stolen": self.voices_stolen,
+            "max_polyphony": self.max_polyphony,
+            "steal_policy": self.steal_policy
+        }
+
+    def _admit(self, voice: Voice):
+        """
+        在混音线程中接纳新声部，必要时抢占旧声部；每次最多遍历 max_polyphony 个声部
+        """
+        voices = self._voices
+        if self.steal_policy == "same_note" and voice.note is not None:
+            for v in voices:
+                if v.note == voice.note and not v.releasing:
+                    v.fade_out(self.steal_frames)
+                    self.voices_stolen += 1
+
+        sounding = [v for v in voices if not v.releasing]
+        overflow = len(sounding) - self.max_polyphony + 1
+        if overflow > 0:
+            if self.steal_policy == "quietest":
+                victims = sorted(sounding, key=lambda v: v.gain)[:overflow]
+            else:
+                victims = sounding[:overflow]  # 列表按开始时间排列
+            for v in victims:
+                v.fade_out(self.steal_frames)
+            self.voices_stolen += len(victims)
+
+        voices.append(voice)
+        self.voices_started += 1
+
+    def _process_pending(self, block_start: int):
+        pending = self._pending
+        while pending:
+            item = pending.popleft()
+            if isinstance(item, Voice):
+                if item.start_frame is None:
+                    self._admit(item)
+                    if item.owner is not None:
+                        item.owner.on_voice_start(0)
+                else:
+                    heapq.heappush(self._scheduled, (item.start_frame, next(self._seq), item))
+            elif item[0] == "release":
+                _, tag, frame, fade_frames, owner = item
+                if frame is None:
+                    self._release_now(tag, 0, fade_frames)
+                else:
+                    # 指定帧的 release（即使已经迟到）统一在本块的定时声部起音之后处理，
+                    # 同一帧上起音又释放的声部不会因为 release 先于起音处理而漏掉
+                    heapq.heappush(self._releases, (frame, next(self._seq), tag, fade_frames, owner))
+            elif item[0] == "cancel":
+                self._cancel_now(item[1])
+
+    def _release_now(self, tag, offset: int, fade_frames: int):
+        for v in self._voices:
+            if v.tag == tag and not v.releasing:
+                v.fade_out(fade_frames, max(0, offset - v.delay))
+
+    def _cancel_now(self, owner):
+        if self._scheduled:
+            kept = []
+            for entry in self._scheduled:
+                if entry[2].owner is owner:
+                    self._end(entry[2])
+                else:
+                    kept.append(entry)
+            heapq.heapify(kept)
+            self._scheduled = kept
+        if self._releases:
+            self._releases = [e for e in self._releases if e[4] is not owner]
+            heapq.heapify(self._releases)
+        for v in self._voices:
+            if v.owner is owner:
+                v.fade_out(self.steal_frames)
+
+    def mix_block(self, out: np.ndarray):
+        """
+        把所有活跃声部叠加到 out（形状 (frames, channels) 的 float32 数组）
+        """
+        out.fill(0)
+        frames = out.shape[0]
+        block_start = self.frames_mixed
+        block_end = block_start + frames
+        self._process_pending(block_start)
+
+        # 本块内到期的定时声部：按采样偏移起音，迟到的声部立即起音并上报迟到帧数
+        scheduled = self._scheduled
+        while scheduled and scheduled[0][0] < block_end:
+            start_frame, _, voice = heapq.heappop(scheduled)
+            voice.delay = max(0, start_frame - block_start)
+            if voice.owner is not None:
+                voice.owner.on_voice_start(max(0, block_start - start_frame))
+            self._admit(voice)
+
+        # 本块内到期的定时 release
+        releases = self._releases
+        while releases and releases[0][0] < block_end:
+            frame, _, tag, fade_frames, _ = heapq.heappop(releases)
+            self._release_now(tag, max(0, frame - block_start), fade_frames)
+
+        if frames > self._scratch.shape[0]:
+            self._scratch = np.zeros((frames, self.channels), dtype=np.float32)
+            self._envelope = np.zeros((frames, 1), dtype=np.float32)
+            self._ramp = np.arange(frames, dtype=np.float32)[:, None]
+
+        alive = []
+        for voice in self._voices:
+            d = voice.delay
+            n = min(frames - d, voice.remaining())
+            if n > 0:
+                chunk = voice.data[voice.pos:voice.pos + n]
+                if chunk.ndim == 1:
+                    chunk = chunk[:, None]  # 单声道样本广播到所有输出声道
+                scratch = self._scratch[:n]
+                np.multiply(chunk, voice.gain, out=scratch, dtype=np.float32)
+                if voice.fade_end is not None and voice.fade_end - voice.pos - n < voice.fade_total:
+                    # 线性淡出包络：min(1, (fade_end - pos - i) / fade_total)
+                    envelope = self._envelope[:n]
+                    np.subtract(voice.fade_end - voice.pos, self._ramp[:n], out=envelope)
+                    envelope *= 1.0 / voice.fade_total
+                    np.minimum(envelope, 1.0, out=envelope)
+                    scratch *= envelope
+                out[d:d + n] += scratch
+                voice.pos += n
+            voice.delay = 0
+            if voice.remaining() > 0:
+                alive.append(voice)
+            elif voice.cache_key is not None:
+                self._end(voice)
+        self._voices = alive
+        if len(alive) > self.peak_voices:
+            self.peak_voices = len(alive)
+
+        np.clip(out, -1.0, 1.0, out=out)
+        self.frames_mixed = block_end
+
+    def _end(self, voice: Voice):
+        if voice.cache_key is not None and self.ended_keys is not None:
+            self.ended_keys.append(voice.cache_key)
+
+    def _callback(self, outdata, frames, time_info, status):
+        self.mix_block(outdata)
+
+    def _null_loop(self):
+        buffer = np.zeros((self.block_size, self.channels), dtype=np.float32)
+        interval = self.block_size / self.sample_rate
+        next_time = time.perf_counter()
+        while self._running:
+            self.mix_block(buffer)
+            next_time += interval
+            delay = next_time - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            else:
+                next_time = time.perf_counter()
@@ -0,0 +1,153 @@
+# sound/note_dispatcher.py
+
+import threading
+import time
+from collections import deque
+import config
+import metrics
+from sound.sound_manager import SoundManager
+from sound.latency import LatencyStats
+
+_DISPATCH_SECONDS = metrics.histogram("note_dispatch_latency_seconds", "音符命令从入队到交给混音器的耗时",
+                                      ("kind",))
+_DISPATCH_SECONDS_BY_KIND = {kind: _DISPATCH_SECONDS.labels(kind) for kind in ("on", "off")}
+_PLAY_ERRORS = metrics.counter("sound_play_errors_total", "播放音符失败次数", ("source",)).labels("dispatcher")
+
+
+class QueueFullError(RuntimeError):
+    """
+    分发队列已满且策略为 reject 时抛出，调用方据此向客户端返回背压信号
+    """
+
+
+class NoteDispatcher:
+    """
+    异步音符分发：接口线程或事件循环只把命令压入有界队列后立即返回，由专用音频线程取出执行
+    队列满时的处理策略：
+        reject      拒绝新命令并抛出 QueueFullError（接口返回 503，形成背压）
+        drop_oldest 丢弃队列中最旧的命令
+        drop_newest 静默丢弃新命令
+    """
+
+    POLICIES = ("reject", "drop_oldest", "drop_newest")
+
+    def __init__(self, sound_manager: SoundManager, max_depth: int = None, policy: str = None):
+        policy = policy or config.NOTE_QUEUE_POLICY
+        if policy not in self.POLICIES:
+            raise ValueError(f"未知的队列策略: {policy}，可选 {self.POLICIES}")
+        self.sound_manager = sound_manager
+        self.max_depth = max_depth or config.NOTE_QUEUE_MAX_DEPTH
+        self.policy = policy
+
+        # 出队只由音频线程执行，无需加锁；入队时的深度检查、丢弃与追加须在 _lock 内一起完成，
+        # 否则并发提交会同时通过检查，使队列超出 max_depth
+        self._queue = deque()
+        self._lock = metrics.timed_lock("note_dispatcher")
+        self._wakeup = threading.Event()
+        self._thread = None
+        self._running = False
+
+        self.submitted = 0
+        self.dispatched = 0
+        self.dropped = 0
+        self.rejected = 0
+        self.errors = 0
+        self.peak_depth = 0
+        self.latency = LatencyStats()  # 入队到交给混音器的耗时（秒）
+
+    def start(self):
+        if self._running:
+            return
+        self._running = True
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._running = False
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def submit(self, note: int, velocity: int = 100, group: str = None, tag=None) -> bool:
+        """
+        提交一个 note_on 命令；返回是否入队（drop_newest 丢弃时为 False）
+        tag 用于之后的 note_off 定位该声部
+        """
+        return self._enqueue(("on", note, velocity, group, tag, time.perf_counter()))
+
+    def submit_off(self, tag) -> bool:
+        """
+        提交一个 note_off 命令：淡出 tag 对应的声部
+        """
+        return self._enqueue(("off", None, 0, None, tag, time.perf_counter()))
+
+    def _enqueue(self, command: tuple) -> bool:
+        with self._lock:
+            if not self._running:
+                self.start()
+            queue = self._queue
+            if len(queue) >= self.max_depth:
+                if self.policy == "reject":
+                    self.rejected += 1
+                    raise QueueFullError(f"音频队列已满（{self.max_depth}）")
+                if self.policy == "drop_newest":
+                    self.dropped += 1
+                    return False
+                try:
+                    queue.popleft()
+                    self.dropped += 1
+                except IndexError:
+                    pass
+            queue.append(command)
+            self.submitted += 1
+            depth = len(queue)
+            if depth > self.peak_depth:
+                self.peak_depth = depth
+        self._wakeup.set()
+        return True
+
+    def depth(self) -> int:
+        return len(self._queue)
+
+    def stats(self) -> dict:
+        return {
+            "depth": len(self._queue),
+            "peak_depth": self.peak_depth,
+            "max_depth": self.max_depth,
+            "policy": self.policy,
+            "submitted": self.submitted,
+            "dispatched": self.dispatched,
+            "dropped": self.dropped,
+            "rejected": self.rejected,
+            "errors": self.errors,
+            "latency_ms": self.latency.summary()
+        }
+
+    def _run(self):
+        queue = self._queue
+        while self._running:
+            self._wakeup.wait()
+            self._wakeup.clear()
+            while queue:
+                try:
+                    command = queue.popleft()
+                except IndexError:
+                    break
+                self._execute(command)
+
+    def _execute(self, command: tuple):
+        kind, note, velocity, group, tag, enqueued_at = command
+        try:
+            if kind == "on":
+                self.sound_manager.schedule_note(note, velocity, group, tag=tag)
+            else:
+                self.sound_manager.release_note(tag)
+            self.dispatched += 1
+        except Exception as e:
+            self.errors += 1
+            _PLAY_ERRORS.inc()
+            print(f"播放音符失败: {e}")
+        elapsed = time.perf_counter() - enqueued_at
+        self.latency.record(elapsed)
+        _DISPATCH_SECONDS_BY_KIND[kind].observe(elapsed)
@@ -0,0 +1,96 @@
+# sound/pcm.py
+
+import os
+import wave
+from typing import Dict, Tuple
+import numpy as np
+
+
+def decode_wav(path: str, sample_rate: int, max_channels: int) -> np.ndarray:
+    """
+    把 WAV 文件解码为 int16 数组，并对齐到目标采样率和声道数
+    返回形状 (frames,) 表示单声道，(frames, channels) 表示多声道
+    """
+    try:
+        with wave.open(path, "rb") as wf:
+            channels = wf.getnchannels()
+            width = wf.getsampwidth()
+            rate = wf.getframerate()
+            raw = wf.readframes(wf.getnframes())
+        data = _pcm_to_int16(raw, width)
+    except (wave.Error, ValueError):
+        # 非 PCM 编码（如 float WAV）交给 pydub 处理
+        from pydub import AudioSegment
+        audio = AudioSegment.from_wav(path).set_sample_width(2)
+        channels, rate = audio.channels, audio.frame_rate
+        data = np.frombuffer(audio.raw_data, dtype=np.int16)
+
+    if channels > 1:
+        data = data.reshape(-1, channels)
+        if channels != max_channels:
+            data = data.mean(axis=1).astype(np.int16)
+    if rate != sample_rate:
+        data = _resample(data, rate, sample_rate)
+    return data
+
+
+def _pcm_to_int16(raw: bytes, width: int) -> np.ndarray:
+    if width == 2:
+        return np.frombuffer(raw, dtype="<i2")
+    if width == 1:
+        return ((np.frombuffer(raw, dtype=np.uint8).astype(np.int16) - 128) << 8).astype(np.int16)
+    if width == 3:
+        b = np.frombuffer(raw, dtype=np.uint8).reshape(-1, 3)
+        return (b[:, 1].astype(np.int16) | (b[:, 2].astype(np.int16) << 8)).astype(np.int16)
+    if width == 4:
+        return (np.frombuffer(raw, dtype="<i4") >> 16).astype(np.int16)
+    raise ValueError(f"不支持的采样位宽: {width}")
+
+
+def _resample(data: np.ndarray, src_rate: int, dst_rate: int) -> np.ndarray:
+    """
+    线性插值重采样，只在加载时执行一次
+    """
+    frames = data.shape[0]
+    out_frames = int(round(frames * dst_rate / src_rate))
+    src_pos = np.arange(out_frames) * (src_rate / dst_rate)
+    xp = np.arange(frames)
+    if data.ndim == 1:
+        return np.interp(src_pos, xp, data).astype(np.int16)
+    return np.stack([np.interp(src_pos, xp, data[:, c]) for c in range(data.shape[1])],
+                    axis=1).astype(np.int16)
+
+
+def concat_samples(decoded: Dict[int, np.ndarray], channels: int) -> Tuple[np.ndarray, Dict[int, Tuple[int, int]]]:
+    """
+    把一组样本拼接为一块连续的 int16 数组，返回数组和 {note: (起始帧, 帧数)} 索引
+    组内声道数统一：只要有多声道样本，单声道样本就复制到各声道
+    """
+    multi = any(d.ndim > 1 for d in decoded.values())
+    total = sum(d.shape[0] for d in decoded.values())
+    buffer = np.empty((total, channels) if multi else (total,), dtype=np.int16)
+
+    index = {}
+    offset = 0
+    for note in sorted(decoded):
+        data = decoded[note]
+        frames = data.shape[0]
+        if multi and data.ndim == 1:
+            buffer[offset:offset + frames] = data[:, None]
+        else:
+            buffer[offset:offset + frames] = data
+        index[note] = (offset, frames)
+        offset += frames
+    return buffer, index
+
+
+def list_group_wavs(group_dir: str) -> Dict[int, str]:
+    """
+    列出音源组目录下所有 <note>.wav，返回 {note: 文件路径}
+    """
+    paths = {}
+    for filename in os.listdir(group_dir):
+        name, ext = os.path.splitext(filename)
+        if ext.lower() == ".wav" and name.isdigit():
+            paths[int(name)] = os.path.join(group_dir, filename)
+    return paths
@@ -0,0 +1,97 @@
+# sound/sample_bank.py
+
+import os
+import time
+from typing import Dict, List, Optional
+import numpy as np
+import config
+from sound.pcm import decode_wav, concat_samples, list_group_wavs
+from sound import sample_pack
+
+
+class SampleBank:
+    """
+    预加载样本库：启动时把每个音源组的全部样本放进一块连续的 int16 数组（或 mmap 的样本包）
+    加载完成后只读，查询只是字典读取和数组切片，不需要加锁
+    """
+
+    def __init__(self, sample_rate: int = None, channels: int = None):
+        self.sample_rate = sample_rate or config.MIXER_SAMPLE_RATE
+        self.channels = channels or config.MIXER_CHANNELS
+        self._groups: Dict[str, Dict[int, np.ndarray]] = {}  # group -> {note: 样本视图}
+        self._buffers: Dict[str, np.ndarray] = {}            # group -> 连续存储
+        self._mapped = set()                                 # 通过 mmap 共享的音源组
+        self.load_seconds = 0.0
+
+    def load_all(self, groups: List[str] = None) -> dict:
+        """
+        加载全部（或指定）音源组，返回加载耗时和常驻字节数
+        """
+        start = time.perf_counter()
+        for group in groups if groups is not None else config.get_available_sound_groups():
+            self.load_group(group)
+        self.load_seconds = time.perf_counter() - start
+        return self.stats()
+
+    def load_group(self, group: str):
+        """
+        加载一个音源组：优先 mmap 编译好的样本包（过期时先重建），否则直接解码 WAV
+        """
+        group_dir = os.path.join(config.SOUNDS_DIR, group)
+        if not os.path.isdir(group_dir):
+            raise FileNotFoundError(f"音源组目录不存在: {group_dir}")
+
+        if config.USE_SAMPLE_PACKS:
+            try:
+                sample_pack.build_pack(group, self.sample_rate, self.channels)
+                buffer, views = sample_pack.load_pack(group)
+                self._install(group, buffer, views, mapped=True)
+                return
+            except (OSError, ValueError) as e:
+                # 读不到或已损坏的样本包（load_pack 对无效的头部、索引抛出 ValueError）都退回直接解码
+                print(f"[样本库] 样本包不可用，直接解码 {group}: {e}")
+
+        decoded = {note: decode_wav(path, self.sample_rate, self.channels)
+                   for note, path in list_group_wavs(group_dir).items()}
+        buffer, index = concat_samples(decoded, self.channels)
+        views = {note: buffer[offset:offset + frames] for note, (offset, frames) in index.items()}
+        self._install(group, buffer, views, mapped=False)
+
+    def _install(self, group: str, buffer: np.ndarray, views: Dict[int, np.ndarray], mapped: bool):
+        # 整组替换：读线程只会看到旧组或新组
+        if mapped:
+            self._mapped.add(group)
+        else:
+            self._mapped.discard(group)
+        self._buffers[group] = buffer
+        self._groups[group] = views
+
+    def get(self, group: str, note: int) -> Optional[np.ndarray]:
+        notes = self._groups.get(group)
+        if notes is None:
+            return None
+        return notes.get(note)
+
+    def has_group(self, group: str) -> bool:
+        return group in self._groups
+
+    def groups(self) -> List[str]:
+        return list(self._groups)
+
+    def nbytes(self) -> int:
+        """
+        进程私有的常驻字节数（mmap 的样本包由页缓存共享，不计入）
+        """
+        return sum(buf.nbytes for group, buf in self._buffers.items() if group not in self._mapped)
+
+    def mapped_bytes(self) -> int:
+        return sum(self._buffers[group].nbytes for group in self._mapped)
+
+    def stats(self) -> dict:
+        return {
+            "groups": len(self._groups),
+            "samples": sum(len(notes) for notes in self._groups.values()),
+            "bytes": self.nbytes(),
+            "mapped_bytes": self.mapped_bytes(),
+            "load_seconds": round(self.load_seconds, 4)
+        }
@@ -0,0 +1,158 @@
+# sound/sample_cache.py
+
+import time
+from collections import OrderedDict, deque
+from typing import Callable, Hashable, Iterable
+import numpy as np
+import config
+import metrics
+
+Loader = Callable[[Hashable], np.ndarray]
+
+
+class SampleCache:
+    """
+    解码样本缓存：按解码后的字节数计入内存预算，超出时按 LRU 淘汰
+    正在发声的声部通过 acquire() 持有引用，被引用的条目不会被淘汰；
+    声部结束时混音线程只把 key 追加到 released 队列（无锁），引用计数在下一次访问缓存时批量扣减
+    """
+
+    def __init__(self, max_bytes: int = None):
+        self.max_bytes = max_bytes or config.SAMPLE_CACHE_MAX_BYTES
+        self._entries: "OrderedDict[Hashable, np.ndarray]" = OrderedDict()
+        self._refs = {}          # key -> 正在使用该样本的声部数
+        self._doomed = set()     # 已失效但仍被引用、待引用归零后移除的 key
+        self._lock = metrics.timed_lock("sample_cache")
+        self.released = deque()  # 混音器在声部结束时追加 key
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self.load_seconds = 0.0
+
+    def get(self, key: Hashable, loader: Loader) -> np.ndarray:
+        """
+        获取样本，未缓存时调用 loader(key) 解码；不增加引用计数
+        """
+        return self._get(key, loader, acquire=False)
+
+    def acquire(self, key: Hashable, loader: Loader) -> np.ndarray:
+        """
+        获取样本并增加引用计数，声部结束后由混音器通过 released 队列归还
+        """
+        return self._get(key, loader, acquire=True)
+
+    def _get(self, key: Hashable, loader: Loader, acquire: bool) -> np.ndarray:
+        with self._lock:
+            self._drain_released()
+            data = self._entries.get(key)
+            if data is not None:
+                self._entries.move_to_end(key)
+                self._doomed.discard(key)
+                self.hits += 1
+                if acquire:
+                    self._refs[key] = self._refs.get(key, 0) + 1
+                return data
+            self.misses += 1
+
+        # 解码在锁外进行，不阻塞其他音符的缓存命中；并发加载同一 key 时以先写入的为准
+        started = time.perf_counter()
+        data = loader(key)
+        elapsed = time.perf_counter() - started
+        with self._lock:
+            self.load_seconds += elapsed
+            existing = self._entries.get(key)
+            if existing is not None:
+                data = existing
+                self._entries.move_to_end(key)
+            else:
+                self._entries[key] = data
+                self.bytes += data.nbytes
+            if acquire:
+                self._refs[key] = self._refs.get(key, 0) + 1
+            self._evict()
+        return data
+
+    def warmup(self, keys: Iterable[Hashable], loader: Loader) -> int:
+        """
+        预先解码一批样本，返回新加载的数量；超出预算时较早的条目照常按 LRU 淘汰
+        """
+        loaded = 0
+        for key in keys:
+            with self._lock:
+                cached = key in self._entries
+            if not cached:
+                self.get(key, loader)
+                loaded += 1
+        return loaded
+
+    def invalidate(self, predicate: Callable[[Hashable], bool]) -> int:
+        """
+        移除所有满足 predicate 的条目；仍被引用的条目在引用归零后再移除
+        """
+        with self._lock:
+            self._drain_released()
+            removed = 0
+            for key in [k for k in self._entries if predicate(k)]:
+                if self._refs.get(key):
+                    self._doomed.add(key)
+                else:
+                    self._remove(key)
+                    removed += 1
+            self.invalidations += removed
+            return removed
+
+    def clear(self):
+        self.invalidate(lambda key: True)
+
+    def _remove(self, key: Hashable):
+        # 调用方持有 _lock
+        data = self._entries.pop(key)
+        self.bytes -= data.nbytes
+        self._doomed.discard(key)
+
+    def _drain_released(self):
+        # 调用方持有 _lock
+        released = self.released
+        while released:
+            key = released.popleft()
+            count = self._refs.get(key, 0) - 1
+            if count > 0:
+                self._refs[key] = count
+                continue
+            self._refs.pop(key, None)
+            if key in self._doomed and key in self._entries:
+                self._remove(key)
+                self.invalidations += 1
+        if self.bytes > self.max_bytes:
+            self._evict()
+
+    def _evict(self):
+        # 调用方持有 _lock；从最久未使用的条目开始，跳过仍被引用的条目
+        if self.bytes <= self.max_bytes:
+            return
+        for key in list(self._entries):
+            if self.bytes <= self.max_bytes:
+                break
+            if self._refs.get(key):
+                continue
+            self._remove(key)
+            self.evictions += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            self._drain_released()
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self.bytes,
+                "max_bytes": self.max_bytes,
+                "pinned": sum(1 for key in self._entries if self._refs.get(key)),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else None,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+                "load_seconds": round(self.load_seconds, 3)
+            }
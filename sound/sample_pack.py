@@ -0,0 +1,153 @@
+# sound/sample_pack.py
+
+"""
+编译后的样本包：每个音源组一个文件，内容为原始 int16 PCM 加 note → 偏移/长度索引头
+加载时直接 mmap，多个 uvicorn worker 通过操作系统页缓存共享同一份物理内存
+
+文件布局（小端）:
+    头部   magic(4s) version(H) channels(H) sample_rate(I) count(I) data_offset(I) signature(32s)
+    索引   count 条 note(H) 填充(2x) offset(I) frames(Q)，offset 为相对数据区的帧数
+    数据区 从 data_offset 开始的连续 int16 PCM，按页对齐
+
+构建命令：
+    python -m sound.sample_pack [group ...] [--force]
+"""
+
+import os
+import sys
+import mmap
+import struct
+import hashlib
+import argparse
+from typing import Dict, Optional, Tuple
+import numpy as np
+import config
+from sound.pcm import decode_wav, concat_samples, list_group_wavs
+
+MAGIC = b"MWSP"
+VERSION = 1
+HEADER = struct.Struct("<4sHHIII32s")
+ENTRY = struct.Struct("<H2xIQ")
+PAGE_SIZE = mmap.ALLOCATIONGRANULARITY
+
+
+def pack_path(group: str) -> str:
+    return os.path.join(config.SAMPLE_PACK_DIR, f"{group}.pack")
+
+
+def source_signature(group: str, sample_rate: int, channels: int) -> bytes:
+    """
+    根据源 WAV 的文件名、mtime 和大小以及目标格式计算签名，任一变化都需要重新构建
+    """
+    group_dir = os.path.join(config.SOUNDS_DIR, group)
+    h = hashlib.sha256()
+    h.update(struct.pack("<IIH", VERSION, sample_rate, channels))
+    for note, path in sorted(list_group_wavs(group_dir).items()):
+        st = os.stat(path)
+        h.update(struct.pack("<HqQ", note, st.st_mtime_ns, st.st_size))
+    return h.digest()
+
+
+def read_header(path: str) -> Optional[Tuple[int, int, int, int, bytes]]:
+    """
+    读取样本包头部，返回 (channels, sample_rate, count, data_offset, signature)，格式不符返回 None
+    """
+    try:
+        with open(path, "rb") as f:
+            raw = f.read(HEADER.size)
+    except OSError:
+        return None
+    if len(raw) < HEADER.size:
+        return None
+    magic, version, channels, sample_rate, count, data_offset, signature = HEADER.unpack(raw)
+    if magic != MAGIC or version != VERSION:
+        return None
+    return channels, sample_rate, count, data_offset, signature
+
+
+def is_fresh(group: str, sample_rate: int, channels: int) -> bool:
+    header = read_header(pack_path(group))
+    if header is None:
+        return False
+    return header[1] == sample_rate and header[4] == source_signature(group, sample_rate, channels)
+
+
+def build_pack(group: str, sample_rate: int = None, channels: int = None, force: bool = False) -> bool:
+    """
+    构建音源组的样本包；源文件未变化时跳过，返回是否实际重新构建
+    """
+    sample_rate = sample_rate or config.MIXER_SAMPLE_RATE
+    channels = channels or config.MIXER_CHANNELS
+    group_dir = os.path.join(config.SOUNDS_DIR, group)
+    if not os.path.isdir(group_dir):
+        raise FileNotFoundError(f"音源组目录不存在: {group_dir}")
+    if not force and is_fresh(group, sample_rate, channels):
+        return False
+
+    signature = source_signature(group, sample_rate, channels)
+    decoded = {note: decode_wav(path, sample_rate, channels)
+               for note, path in list_group_wavs(group_dir).items()}
+    buffer, index = concat_samples(decoded, channels)
+    data_channels = buffer.shape[1] if buffer.ndim > 1 else 1
+
+    index_end = HEADER.size + ENTRY.size * len(index)
+    data_offset = (index_end + PAGE_SIZE - 1) // PAGE_SIZE * PAGE_SIZE
+
+    os.makedirs(config.SAMPLE_PACK_DIR, exist_ok=True)
+    path = pack_path(group)
+    # 先写临时文件再原子替换，已 mmap 旧文件的进程不受影响
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(HEADER.pack(MAGIC, VERSION, data_channels, sample_rate, len(index), data_offset, signature))
+        for note, (offset, frames) in index.items():
+            f.write(ENTRY.pack(note, offset, frames))
+        f.write(b"\0" * (data_offset - index_end))
+        f.write(buffer.astype("<i2", copy=False).tobytes())
+    os.replace(tmp_path, path)
+    return True
+
+
+def load_pack(group: str) -> Tuple[np.ndarray, Dict[int, np.ndarray]]:
+    """
+    只读 mmap 样本包，返回整个数据区数组和 {note: 样本视图}，不发生数据拷贝
+    头部、索引或数据区与文件长度不符（如文件被截断）时抛出 ValueError
+    """
+    path = pack_path(group)
+    header = read_header(path)
+    if header is None:
+        raise ValueError(f"无效的样本包: {path}")
+    channels, _, count, data_offset, _ = header
+
+    with open(path, "rb") as f:
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    if channels < 1 or HEADER.size + count * ENTRY.size > data_offset or data_offset > len(mm):
+        mm.close()
+        raise ValueError(f"样本包已损坏: {path}")
+
+    total_frames = (len(mm) - data_offset) // (2 * channels)
+    buffer = np.frombuffer(mm, dtype="<i2", count=total_frames * channels, offset=data_offset)
+    if channels > 1:
+        buffer = buffer.reshape(-1, channels)
+
+    views = {}
+    for i in range(count):
+        note, offset, frames = ENTRY.unpack_from(mm, HEADER.size + i * ENTRY.size)
+        if offset + frames > total_frames:
+            raise ValueError(f"样本包已损坏: {path}（音符 {note} 超出数据区）")
+        views[note] = buffer[offset:offset + frames]
+    return buffer, views
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="构建音源组样本包")
+    parser.add_argument("groups", nargs="*", help="要构建的音源组，默认全部")
+    parser.add_argument("--force", action="store_true", help="忽略 mtime 检查强制重建")
+    args = parser.parse_args(argv)
+
+    for group in args.groups or config.get_available_sound_groups():
+        rebuilt = build_pack(group, force=args.force)
+        print(f"[样本包] {group}: {'已构建' if rebuilt else '无变化，跳过'} -> {pack_path(group)}")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,61 +1,231 @@
 # sound/sound_manager.py
 
 import os
-from threading import Lock
-from pydub import AudioSegment
-import simpleaudio as sa
+import time
+import numpy as np
+import config
+import metrics
 from sound.sound_mapping import SoundMapping
+from sound.mixer import Mixer
+from sound.sample_bank import SampleBank
+from sound.sample_cache import SampleCache
+from sound.pcm import decode_wav, list_group_wavs
+from sound.velocity import CurveSpec, build_velocity_table
+
+_DECODE_SECONDS = metrics.histogram("sound_decode_seconds", "样本库之外的样本解码耗时")
+_SCHEDULE_SECONDS = metrics.histogram("sound_schedule_seconds", "schedule_note 把音符交给混音器的耗时")
+_PLAY_ERRORS = metrics.counter("sound_play_errors_total", "播放音符失败次数", ("source",)).labels("play_note")
+
+
+def _check_group(group: str):
+    # 组名会拼进样本路径，只接受 SOUNDS_DIR 下已知的音源组，避免读取任意目录
+    if group not in config.AVAILABLE_SOUND_GROUPS:
+        raise ValueError(f"无效的音源组: {group}")
+
+
+def _sound_path(note: int, group: str) -> str:
+    _check_group(group)
+    return os.path.join(config.SOUNDS_DIR, group, f"{note}.wav")
+
 
 class SoundManager:
-    def __init__(self, sound_mapping: SoundMapping):
-        self.lock = Lock()
-        self.sound_cache = {}  # key: (note, group)
-        self.play_objects = []
+    def __init__(self, sound_mapping: SoundMapping, mixer: Mixer = None,
+                 sample_bank: SampleBank = None, sample_cache: SampleCache = None):
         self.sound_mapping = sound_mapping
+        # 所有音符共用一个混音器和一个持久输出流
+        self.mixer = mixer or Mixer()
+        # 样本库中没有的样本解码后放入有内存预算的缓存，key: (note, group)
+        self.sample_cache = sample_cache or SampleCache()
+        self.mixer.ended_keys = self.sample_cache.released
+        # 可选的预加载样本库，命中时无需加锁和解码
+        self.sample_bank = sample_bank
+        # 力度增益查找表：默认曲线 + 按音源组覆盖
+        self.default_velocity_table = build_velocity_table(config.DEFAULT_VELOCITY_CURVE)
+        self.velocity_tables = {group: build_velocity_table(spec)
+                                for group, spec in config.VELOCITY_CURVES.items()}
 
-    def load_sound(self, note: int):
-        group = self.sound_mapping.get_group(note)
+    def preload(self, groups=None) -> dict:
+        """
+        预加载全部音源组到样本库，加载完成后整体替换旧样本库
+        """
+        bank = SampleBank(self.mixer.sample_rate, self.mixer.channels)
+        report = bank.load_all(groups)
+        self.sample_bank = bank
+        print(f"[样本库] 加载 {report['groups']} 个音源组、{report['samples']} 个样本，"
+              f"耗时 {report['load_seconds']:.3f}s，占用 {report['bytes'] / 1024 / 1024:.1f} MB，"
+              f"共享映射 {report['mapped_bytes'] / 1024 / 1024:.1f} MB")
+        return report
+
+    def load_sound(self, note: int, group: str = None) -> np.ndarray:
+        """
+        获取音符样本（int16 数组）：优先读预加载样本库，否则解码后缓存
+        """
+        group = group or self.sound_mapping.get_group(note)
         if not group:
             raise ValueError(f"音源组未定义，note={note}")
+        _check_group(group)
+
+        bank = self.sample_bank
+        if bank is not None:
+            data = bank.get(group, note)
+            if data is not None:
+                return data
+        return self.sample_cache.get((note, group), self._decode)
+
+    def _acquire_sound(self, note: int, group: str):
+        """
+        供发声使用：样本库命中时返回 (data, None)，否则从缓存取出并持有引用，返回 (data, 缓存键)
+        """
+        bank = self.sample_bank
+        if bank is not None:
+            data = bank.get(group, note)
+            if data is not None:
+                return data, None
         key = (note, group)
-        if key in self.sound_cache:
-            return self.sound_cache[key]
+        return self.sample_cache.acquire(key, self._decode), key
 
-        path = self.sound_mapping.get_note_sound_path(note)
+    def _decode(self, key) -> np.ndarray:
+        note, group = key
+        path = _sound_path(note, group)
         if not os.path.isfile(path):
             raise FileNotFoundError(f"未找到声音文件: {path}")
+        with _DECODE_SECONDS.time():
+            return decode_wav(path, self.mixer.sample_rate, self.mixer.channels)
+
+    def warmup(self, groups=None) -> int:
+        """
+        预先解码样本库中没有的样本：groups 为 None 时只加载当前映射实际用到的 (音符, 音源组)
+        返回新加载的样本数；groups 中有未知的音源组时抛出 ValueError，不扫描任何目录
+        """
+        if groups is None:
+            keys = list(self.sound_mapping.to_dict().items())
+        else:
+            for group in groups:
+                _check_group(group)
+            keys = [(note, group) for group in groups
+                    for note in list_group_wavs(os.path.join(config.SOUNDS_DIR, group))]
+        bank = self.sample_bank
+        keys = [(note, group) for note, group in keys
+                if (bank is None or bank.get(group, note) is None)
+                and os.path.isfile(_sound_path(note, group))]
+        return self.sample_cache.warmup(keys, self._decode)
+
+    def has_sound(self, note: int, group: str) -> bool:
+        """
+        判断某个音源组是否有该音符的样本；未知的音源组直接视为没有
+        """
+        if group not in config.AVAILABLE_SOUND_GROUPS:
+            return False
+        bank = self.sample_bank
+        if bank is not None and bank.get(group, note) is not None:
+            return True
+        return os.path.isfile(_sound_path(note, group))
 
-        audio = AudioSegment.from_wav(path)
-        self.sound_cache[key] = audio
-        return audio
+    def set_velocity_curve(self, group: str, spec: CurveSpec):
+        """
+        设置某个音源组的力度曲线（曲线名、参数字典或 128 项增益表）；只接受已知的音源组，
+        避免任意组名让 velocity_tables 无限增长
+        """
+        _check_group(group)
+        self.velocity_tables[group] = build_velocity_table(spec)
+
+    def velocity_gain(self, group: str, velocity: int) -> float:
+        """
+        查表得到力度对应的线性增益
+        """
+        table = self.velocity_tables.get(group, self.default_velocity_table)
+        return float(table[max(0, min(127, velocity))])
 
     def play_note(self, note: int, velocity: int = 100):
         try:
-            with self.lock:
-                audio = self.load_sound(note)
-
-                # 力度转换为增益（-20dB ~ +0dB 范围）
-                velocity = max(1, min(127, velocity))  # 限制范围
-                gain_db = -20 + (velocity / 127) * 20  # -20 到 0 dB
-                adjusted_audio = audio + gain_db
-
-                play_obj = sa.play_buffer(
-                    adjusted_audio.raw_data,
-                    num_channels=adjusted_audio.channels,
-                    bytes_per_sample=adjusted_audio.sample_width,
-                    sample_rate=adjusted_audio.frame_rate
-                )
-                self.play_objects.append(play_obj)
-                self.play_objects = [obj for obj in self.play_objects if obj.is_playing()]
+            self.schedule_note(note, velocity)
         except Exception as e:
+            _PLAY_ERRORS.inc()
             print(f"播放音符失败: {e}")
 
+    def schedule_note(self, note: int, velocity: int = 100, group: str = None,
+                      start_frame: int = None, tag=None, owner=None):
+        """
+        把音符交给混音器，可指定音源组、混音器时钟上的起音帧、tag 和所属会话；失败时抛出异常
+        """
+        started = time.perf_counter()
+        group = group or self.sound_mapping.get_group(note)
+        if not group:
+            raise ValueError(f"音源组未定义，note={note}")
+        _check_group(group)
+        data, cache_key = self._acquire_sound(note, group)
+        # 样本只读共享，增益由混音器在叠加时应用，不产生与样本等长的新数组
+        voice = self.mixer.play(data, gain=self.velocity_gain(group, velocity), note=note,
+                                start_frame=start_frame, tag=tag, owner=owner, cache_key=cache_key)
+        _SCHEDULE_SECONDS.observe(time.perf_counter() - started)
+        return voice
+
+    def schedule_notes(self, notes, lead_frames: int = None) -> int:
+        """
+        批量调度一组音符，notes 为 (note, velocity, group, offset_ms) 序列
+        先一次性校验并解析全部样本与增益，任何一项失败都不播放并抛出 ValueError；
+        再以混音器时钟上同一个基准帧加各自的偏移计算起音帧，同一批音符的起音对齐到采样
+        返回基准帧
+        """
+        resolved, errors = [], []
+        for i, (note, velocity, group, offset_ms) in enumerate(notes):
+            try:
+                if not 0 <= note <= 127:
+                    raise ValueError(f"音符编号超出范围: {note}")
+                if offset_ms < 0:
+                    raise ValueError(f"偏移不能为负: {offset_ms}")
+                group = group or self.sound_mapping.get_group(note)
+                self.load_sound(note, group)
+                resolved.append((group, self.velocity_gain(group, velocity), note, offset_ms))
+            except (ValueError, OSError) as e:
+                errors.append(f"#{i} {e}")
+        if errors:
+            raise ValueError("; ".join(errors))
+
+        mixer = self.mixer
+        mixer.start()
+        if lead_frames is None:
+            # 与回放会话相同，留出两个音频块的余量，保证整批音符在同一时钟基准上不迟到
+            lead_frames = 2 * mixer.block_size
+        base_frame = mixer.now() + lead_frames
+        frames_per_ms = mixer.sample_rate / 1000
+        for group, gain, note, offset_ms in resolved:
+            # 校验时已解码，这里只是缓存命中并持有引用
+            data, cache_key = self._acquire_sound(note, group)
+            mixer.play(data, gain=gain, note=note, cache_key=cache_key,
+                       start_frame=base_frame + int(round(offset_ms * frames_per_ms)))
+        return base_frame
+
+    def release_note(self, tag, frame: int = None, release_ms: float = None, owner=None):
+        """
+        在混音器时钟的 frame 帧（None 为立即）淡出 tag 对应的声部
+        """
+        if release_ms is None:
+            release_ms = config.NOTE_RELEASE_MS
+        fade_frames = max(1, int(self.mixer.sample_rate * release_ms / 1000))
+        self.mixer.release(tag, frame, fade_frames, owner)
+
+    def set_polyphony(self, max_polyphony: int, steal_policy: str = None):
+        """
+        设置最大复音数与声部抢占策略
+        """
+        self.mixer.set_polyphony(max_polyphony, steal_policy)
+
+    def get_voice_stats(self) -> dict:
+        return self.mixer.voice_stats()
+
+    def close(self):
+        """
+        关闭混音器输出流
+        """
+        self.mixer.stop()
+
     def set_note_group(self, note: int, group: str):
+        old_group = self.sound_mapping.get_group(note)
         self.sound_mapping.set_group(note, group)
-        # 清理缓存，强制重新加载
-        key = (note, group)
-        if key in self.sound_cache:
-            del self.sound_cache[key]
+        # 移除旧音源组的缓存样本（仍在发声的等声部结束后再移除）
+        if old_group != group:
+            self.sample_cache.invalidate(lambda key: key == (note, old_group))
 
     def get_note_group(self, note: int) -> str:
         return self.sound_mapping.get_group(note)
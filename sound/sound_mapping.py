@@ -2,16 +2,73 @@
 
 import os
 import json
+from threading import RLock
+from types import MappingProxyType
+from typing import Dict, Mapping, Optional, Tuple
+import numpy as np
 import config
 
+NOTE_COUNT = 128
+
+
 class SoundMapping:
     """
     管理 MIDI 音符（0-127）到音源组名称的映射关系
+    内部为 128 个组 ID 的小整数数组加一张驻留的组名表（只增不减，ID 一经分配不再变化）
+    所有修改都在新数组上完成后整体替换（写时复制），音频线程读到的要么是旧映射要么是新映射，
+    不会看到只应用了一半的批量修改；每次替换 version 加一，缓存可以据此低成本地判断是否失效
     """
 
     def __init__(self):
-        # 初始化时全部默认映射到 config.DEFAULT_SOUND_GROUP
-        self.mapping = {i: config.DEFAULT_SOUND_GROUP for i in range(128)}
+        self._lock = RLock()  # 只串行化写操作，读操作无需加锁；可重入，写操作中可以调用 _get_ids()
+        self._groups = []    # 组 ID -> 组名
+        self._group_ids: Dict[str, int] = {}
+        self.version = 0
+        # 组 ID 数组在第一次调用 _get_ids() 时才创建，构造映射不触发音源组扫描
+        self._ids: Optional[np.ndarray] = None
+
+    def _get_ids(self) -> np.ndarray:
+        """
+        返回当前的组 ID 数组，第一次调用时全部映射到 config.DEFAULT_SOUND_GROUP
+        """
+        ids = self._ids
+        if ids is not None:
+            return ids
+        with self._lock:
+            if self._ids is None:
+                self._ids = self._frozen(np.full(NOTE_COUNT, self._intern(config.DEFAULT_SOUND_GROUP),
+                                                 dtype=np.int16))
+            return self._ids
+
+    @staticmethod
+    def _frozen(ids: np.ndarray) -> np.ndarray:
+        ids.flags.writeable = False
+        return ids
+
+    def _intern(self, group: str) -> int:
+        group_id = self._group_ids.get(group)
+        if group_id is None:
+            group_id = len(self._groups)
+            self._groups.append(group)
+            self._group_ids[group] = group_id
+        return group_id
+
+    def _swap(self, ids: np.ndarray):
+        # 调用方持有 _lock
+        self._ids = self._frozen(ids)
+        self.version += 1
+
+    @staticmethod
+    def _check_group(group: str):
+        if group not in config.AVAILABLE_SOUND_GROUPS:
+            raise ValueError(f"无效的音源组: {group}")
+
+    @property
+    def mapping(self) -> Mapping[int, str]:
+        """
+        兼容原先的 {note: group} 字典形式；返回的是当前映射的只读快照，修改请用 set_group 等方法
+        """
+        return MappingProxyType(self.to_dict())
 
     def get_group(self, note: int) -> str:
         """
@@ -19,7 +76,14 @@ class SoundMapping:
         """
         if note < 0 or note > 127:
             raise ValueError("Note 必须在0-127之间")
-        return self.mapping.get(note, config.DEFAULT_SOUND_GROUP)
+        return self._groups[self._get_ids()[note]]
+
+    def group_ids(self) -> Tuple[np.ndarray, Tuple[str, ...]]:
+        """
+        返回当前的组 ID 数组（只读）和组名表，供批量查找使用
+        """
+        ids = self._get_ids()
+        return ids, tuple(self._groups)
 
     def set_group(self, note: int, group: str):
         """
@@ -27,15 +91,18 @@ class SoundMapping:
         """
         if note < 0 or note > 127:
             raise ValueError("Note 必须在0-127之间")
-        if group not in config.AVAILABLE_SOUND_GROUPS:
-            raise ValueError(f"无效的音源组: {group}")
-        self.mapping[note] = group
+        self._check_group(group)
+        with self._lock:
+            ids = self._get_ids().copy()
+            ids[note] = self._intern(group)
+            self._swap(ids)
 
     def reset_all(self):
         """
         重置所有MIDI音符映射为默认组
         """
-        self.mapping = {i: config.DEFAULT_SOUND_GROUP for i in range(128)}
+        with self._lock:
+            self._swap(np.full(NOTE_COUNT, self._intern(config.DEFAULT_SOUND_GROUP), dtype=np.int16))
 
     def get_note_sound_path(self, note: int) -> str:
         """
@@ -50,15 +117,28 @@ class SoundMapping:
         """
         用户当前手动设置的映射组默认保存在mapping_dict
         用一个字典批量设置映射，key是note，value是group
+        先整体校验，任何一项无效时不做任何修改；全部有效时一次性替换
         """
-        for note, group in mapping_dict.items():
-            self.set_group(note, group)
+        if not mapping_dict:
+            return
+        notes = np.fromiter((int(note) for note in mapping_dict), dtype=np.int64, count=len(mapping_dict))
+        if ((notes < 0) | (notes > 127)).any():
+            raise ValueError("Note 必须在0-127之间")
+        names = list(mapping_dict.values())
+        for group in set(names):
+            self._check_group(group)
+        with self._lock:
+            group_ids = {group: self._intern(group) for group in set(names)}
+            ids = self._get_ids().copy()
+            ids[notes] = [group_ids[group] for group in names]
+            self._swap(ids)
 
     def to_dict(self) -> dict:
         """
         返回当前映射的字典形式
         """
-        return self.mapping.copy()
+        ids, groups = self.group_ids()
+        return {note: groups[group_id] for note, group_id in enumerate(ids.tolist())}
 
     def save_mapping_to_file(self, name: str):
         """
@@ -67,7 +147,7 @@ class SoundMapping:
         os.makedirs(config.MAPPINGS_DIR, exist_ok=True)
         path = os.path.join(config.MAPPINGS_DIR, f"{name}.json")
         with open(path, 'w', encoding='utf-8') as f:
-            json.dump(self.mapping, f, indent=2)
+            json.dump(self.to_dict(), f, indent=2)
         print(f"[映射保存] 保存至: {path}")
 
     def load_mapping_from_file(self, name: str):
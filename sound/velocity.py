@@ -0,0 +1,41 @@
+# sound/velocity.py
+
+from typing import Union, Sequence
+import numpy as np
+
+# 曲线描述：曲线名、带参数的字典（如 {"type": "exponential", "exponent": 2.0}），或 128 项线性增益表
+CurveSpec = Union[str, dict, Sequence[float]]
+
+CURVE_TYPES = ("db", "linear", "exponential")
+
+
+def build_velocity_table(spec: CurveSpec = "db") -> np.ndarray:
+    """
+    预计算 128 项力度 → 线性增益查找表，播放时只需一次数组索引
+    db:          原有曲线，力度线性映射到 -20dB ~ 0dB
+    linear:      增益与力度成正比
+    exponential: 增益为 (velocity / 127) ** exponent
+    """
+    if not isinstance(spec, (str, dict)):
+        table = np.asarray(spec, dtype=np.float32)
+        if table.shape != (128,):
+            raise ValueError(f"自定义力度表必须为 128 项，实际为 {table.shape}")
+        if np.any(table < 0):
+            raise ValueError("力度增益不能为负数")
+        return table
+
+    params = {"type": spec} if isinstance(spec, str) else dict(spec)
+    curve = params.get("type", "db")
+    # 与原逻辑一致：力度 0 按 1 处理
+    v = np.clip(np.arange(128), 1, 127) / 127.0
+
+    if curve == "db":
+        min_db = float(params.get("min_db", -20.0))
+        table = 10 ** ((min_db - min_db * v) / 20)
+    elif curve == "linear":
+        table = v
+    elif curve == "exponential":
+        table = v ** float(params.get("exponent", 2.0))
+    else:
+        raise ValueError(f"未知的力度曲线: {curve}，可选 {CURVE_TYPES}")
+    return table.astype(np.float32)
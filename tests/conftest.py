@@ -0,0 +1,43 @@
+# tests/conftest.py
+
+import struct
+import pytest
+
+
+def varint(value: int) -> bytes:
+    out = [value & 0x7F]
+    value >>= 7
+    while value:
+        out.append(0x80 | (value & 0x7F))
+        value >>= 7
+    return bytes(reversed(out))
+
+
+def smf_bytes(tracks, midi_type: int = 1, ticks_per_beat: int = 480) -> bytes:
+    """
+    由轨道列表构造标准 MIDI 文件；每个轨道为 (delta_ticks, 事件字节) 序列，自动追加 End of Track
+    """
+    chunks = []
+    for events in tracks:
+        body = b"".join(varint(delta) + data for delta, data in events) + b"\x00\xff\x2f\x00"
+        chunks.append(b"MTrk" + struct.pack(">I", len(body)) + body)
+    return b"MThd" + struct.pack(">IHHH", 6, midi_type, len(chunks), ticks_per_beat) + b"".join(chunks)
+
+
+def tempo_event(us_per_beat: int) -> bytes:
+    return b"\xff\x51\x03" + us_per_beat.to_bytes(3, "big")
+
+
+@pytest.fixture
+def write_midi(tmp_path):
+    """
+    把 smf_bytes 的结果写入临时文件并返回路径
+    """
+    counter = iter(range(1_000_000))
+
+    def write(tracks, midi_type: int = 1, ticks_per_beat: int = 480) -> str:
+        path = tmp_path / f"{next(counter)}.mid"
+        path.write_bytes(smf_bytes(tracks, midi_type, ticks_per_beat))
+        return str(path)
+
+    return write
@@ -0,0 +1,32 @@
+# tests/test_batch.py
+
+import pytest
+from midi.batch import create_pool, run_batch
+from midi.midi_player import MidiPlayer
+
+NOTES = [(0, bytes([0x90, 60, 100])), (480, bytes([0x80, 60, 0]))]
+
+
+@pytest.fixture(scope="module")
+def pool():
+    pool = create_pool(2)
+    yield pool
+    pool.shutdown()
+
+
+def test_pool_uses_spawn(pool):
+    assert pool._mp_context.get_start_method() == "spawn"
+
+
+def test_shared_pool_survives_batches(pool, write_midi, tmp_path):
+    good = write_midi([NOTES])
+    bad = tmp_path / "bad.mid"
+    bad.write_bytes(b"notmidi")
+
+    results = {r["path"]: r for r in run_batch([good, str(bad)], "parse", executor=pool)}
+    assert results[good]["ok"] and results[good]["events"] == len(MidiPlayer(good).parse().table)
+    assert not results[str(bad)]["ok"]
+
+    # 传入的进程池不由 run_batch 关闭，可以继续提交
+    again = list(run_batch([good], "parse", executor=pool))
+    assert again[0]["ok"]
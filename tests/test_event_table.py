@@ -0,0 +1,70 @@
+# tests/test_event_table.py
+
+import numpy as np
+import pytest
+from midi.event_table import EventBuilder, NOTE_OFF, NOTE_ON, PROGRAM_CHANGE
+
+
+@pytest.fixture
+def table():
+    builder = EventBuilder()
+    # 第二条轨道的事件后追加，build() 按 tick 稳定排序合并
+    builder.append(0, PROGRAM_CHANGE, 0, program=5)
+    builder.append(0, NOTE_ON, 0, 60, 100, 5)
+    builder.append(480, NOTE_OFF, 0, 60, 0, 5)
+    builder.append(960, NOTE_ON, 0, 64, 90, 5)
+    builder.append(0, NOTE_ON, 9, 36, 80, 0)
+    builder.append(480, NOTE_OFF, 9, 36, 0, 0)
+    return builder.build(lambda ticks: ticks / 960)
+
+
+def test_build_sorts_stably_by_tick(table):
+    assert table.tick.tolist() == [0, 0, 0, 480, 480, 960]
+    assert table.channel.tolist() == [0, 0, 9, 0, 9, 0]
+    np.testing.assert_allclose(table.time, [0, 0, 0, 0.5, 0.5, 1.0])
+
+
+def test_select_time_window_is_half_open(table):
+    assert table.select(start_sec=0.5).tolist() == [3, 4, 5]
+    assert table.select(end_sec=0.5).tolist() == [0, 1, 2]
+    assert table.select(start_sec=0.5, end_sec=1.0).tolist() == [3, 4]
+    assert table.select(start_sec=2.0, end_sec=1.0).tolist() == []
+
+
+def test_select_by_channel_and_types(table):
+    assert table.select(channel=9).tolist() == [2, 4]
+    assert table.select(types=["note_on"]).tolist() == [1, 2, 5]
+    assert table.select(start_sec=0.1, channel=0, types=["note_off", "program_change"]).tolist() == [3]
+    with pytest.raises(ValueError, match="未知的事件类型"):
+        table.select(types=["pitchwheel"])
+
+
+def test_take_keeps_columns_aligned(table):
+    sub = table.take(table.select(channel=9))
+    assert len(sub) == 2
+    assert sub.note.tolist() == [36, 36] and sub.tick.tolist() == [0, 480]
+    assert len(table.take(slice(1, 3))) == 2
+
+
+def test_to_records(table):
+    looked_up = []
+
+    def group_of(program):
+        looked_up.append(program)
+        return {5: "piano"}.get(program)
+
+    records = table.take(slice(0, 4)).to_records(group_of)
+    assert records[0] == {"time": 0.0, "type": "program_change", "channel": 0, "note": None,
+                          "velocity": None, "program": 5, "group": "piano"}
+    assert records[2] == {"time": 0.0, "type": "note_on", "channel": 9, "note": 36,
+                          "velocity": 80, "program": 0, "group": None}
+    assert records[3]["time"] == 0.5 and records[3]["type"] == "note_off"
+    # 每个不同的 program 只查一次
+    assert sorted(looked_up) == [0, 5]
+
+
+def test_empty_table():
+    table = EventBuilder().build(lambda ticks: ticks)
+    assert len(table) == 0
+    assert table.select(start_sec=0, channel=1).tolist() == []
+    assert table.to_records() == []
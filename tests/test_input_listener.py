@@ -0,0 +1,63 @@
+# tests/test_input_listener.py
+
+import time
+import pytest
+from midi.input_listener import MIDIInputListener
+
+
+class RecordingSoundManager:
+    """
+    记录调用顺序，并断言调用时监听器的状态锁没有被持有
+    """
+
+    def __init__(self, listener, fail: bool = False):
+        self.listener = listener
+        self.fail = fail
+        self.calls = []
+
+    def _check_unlocked(self):
+        lock = self.listener._state_lock
+        assert lock.acquire(blocking=False), "调用 SoundManager 时仍持有状态锁"
+        lock.release()
+
+    def schedule_note(self, note, velocity, tag=None, owner=None):
+        self._check_unlocked()
+        if self.fail:
+            raise RuntimeError("no sample")
+        self.calls.append(("on", tag))
+
+    def release_note(self, tag):
+        self._check_unlocked()
+        self.calls.append(("off", tag))
+
+
+@pytest.fixture
+def listener():
+    listener = MIDIInputListener()
+    listener.running = True
+    listener.sound_manager = RecordingSoundManager(listener)
+    return listener
+
+
+def test_sound_manager_is_called_outside_the_state_lock(listener):
+    tag = ("midi", 0, 60)
+    now = time.perf_counter()
+    listener._note_on(tag, 60, 100, 0, now)
+    listener._note_on(tag, 60, 90, 0, now)  # 重新触发：先释音再起音
+    listener._set_sustain(0, True)
+    listener._note_off(tag, 0)
+    listener._set_sustain(0, False)
+
+    assert listener.sound_manager.calls == [("on", tag), ("off", tag), ("on", tag), ("off", tag)]
+    assert listener.events == 2
+    assert not listener._held and not listener._sustained
+
+
+def test_failed_note_is_not_left_held(listener):
+    listener.sound_manager.fail = True
+    listener._note_on(("key", 60), 60, 100, None, time.perf_counter())
+
+    assert listener.errors == 1
+    assert listener.events == 0
+    assert not listener._held
+    assert not listener._arrivals
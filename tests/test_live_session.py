@@ -0,0 +1,46 @@
+# tests/test_live_session.py
+
+import config
+from midi.live_session import LiveSession, parse_json_message
+
+
+class _RecordingDispatcher:
+    def __init__(self):
+        self.submitted = []
+
+    def submit(self, note, velocity=100, group=None, tag=None):
+        self.submitted.append((note, velocity, group))
+        return True
+
+    def submit_off(self, tag):
+        return True
+
+
+class _FakeSoundManager:
+    def has_sound(self, note, group):
+        return True
+
+
+def test_known_group_is_passed_through():
+    group = config.AVAILABLE_SOUND_GROUPS[0]
+    assert parse_json_message({"note": 60, "group": group})[-1] == group
+
+
+def test_unknown_group_is_rejected_with_error_frame():
+    dispatcher = _RecordingDispatcher()
+    session = LiveSession(dispatcher, _FakeSoundManager())
+    replies = session.handle_json([{"note": 60, "group": "../../etc"},
+                                   {"note": 62, "group": config.AVAILABLE_SOUND_GROUPS[0]}])
+    assert replies[0]["type"] == "error"
+    assert "../../etc" in replies[0]["detail"]
+    assert dispatcher.submitted == [(62, 100, config.AVAILABLE_SOUND_GROUPS[0])]
+    assert session.errors == 1
+
+
+def test_stats_in_a_batch_counts_the_whole_frame():
+    session = LiveSession(_RecordingDispatcher(), _FakeSoundManager())
+    replies = session.handle_json({"notes": [{"type": "stats"}, {"note": 60}, {"note": 62},
+                                             {"type": "note_off", "note": 60}]})
+    stats = replies[-1]
+    assert stats["type"] == "stats"
+    assert (stats["frames"], stats["notes_on"], stats["notes_off"], stats["held"]) == (1, 2, 1, 1)
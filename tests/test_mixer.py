@@ -0,0 +1,104 @@
+# tests/test_mixer.py
+
+import numpy as np
+import pytest
+from sound.mixer import Mixer
+from midi.playback import VoiceTags
+
+BLOCK = 64
+
+
+@pytest.fixture
+def mixer():
+    mixer = Mixer(sample_rate=8000, channels=1, block_size=BLOCK, max_polyphony=8)
+    mixer.start_offline()
+    yield mixer
+    mixer.stop()
+
+
+def constant(frames: int, value: float = 0.5) -> np.ndarray:
+    return np.full((frames, 1), value, dtype=np.float32)
+
+
+def render(mixer: Mixer, blocks: int) -> np.ndarray:
+    out = []
+    buffer = np.zeros((BLOCK, 1), dtype=np.float32)
+    for _ in range(blocks):
+        mixer.mix_block(buffer)
+        out.append(buffer[:, 0].copy())
+    return np.concatenate(out)
+
+
+def test_scheduled_voice_starts_at_exact_frame(mixer):
+    mixer.play(constant(1000), start_frame=100)
+    audio = render(mixer, 4)
+    assert not audio[:100].any()
+    assert np.allclose(audio[100:256], 0.5)
+
+
+def test_release_fades_and_ends_voice(mixer):
+    mixer.play(constant(10000), tag="a", start_frame=0)
+    mixer.release("a", frame=128, fade_frames=64)
+    audio = render(mixer, 6)
+    assert np.allclose(audio[:128], 0.5)
+    assert audio[128] > audio[150] > audio[190]
+    assert not audio[192:].any()
+    assert mixer.active_voice_count() == 0
+
+
+def test_release_only_matches_its_tag(mixer):
+    mixer.play(constant(10000), tag="a", start_frame=0)
+    mixer.play(constant(10000, 0.25), tag="b", start_frame=0)
+    mixer.release("a", frame=0, fade_frames=1)
+    audio = render(mixer, 4)
+    assert np.allclose(audio[8:], 0.25)
+
+
+def test_restrike_at_note_off_tick_keeps_new_voice(mixer):
+    # note_on，随后同一帧上 note_off 与重新触发的 note_on：释放的只能是第一个声部
+    tags = VoiceTags()
+    first = tags.note_on(0, 60)
+    mixer.play(constant(10000, 0.25), tag=first, start_frame=0)
+    off = tags.note_off(0, 60)
+    second = tags.note_on(0, 60)
+    mixer.play(constant(10000, 0.5), tag=second, start_frame=200)
+    mixer.release(off, frame=200, fade_frames=32)
+    audio = render(mixer, 10)
+    assert off == first and second != first
+    assert np.allclose(audio[232:], 0.5)
+    assert [v.tag for v in mixer._voices] == [second]
+
+
+def test_voice_tags_release_in_fifo_order():
+    tags = VoiceTags(("s",))
+    a, b = tags.note_on(1, 60), tags.note_on(1, 60)
+    assert tags.note_off(1, 60) == a
+    assert tags.note_off(1, 60) == b
+    assert tags.note_off(1, 60) is None
+
+
+def test_polyphony_limit_steals_oldest(mixer):
+    mixer.set_polyphony(2, "oldest")
+    for i in range(3):
+        mixer.play(constant(10000), tag=i, start_frame=0)
+    render(mixer, 4)
+    assert mixer.voices_stolen == 1
+    assert sorted(v.tag for v in mixer._voices) == [1, 2]
+
+
+def test_cancel_drops_scheduled_voices_of_owner(mixer):
+    class Owner:
+        def on_voice_start(self, late_frames):
+            pass
+
+    owner = Owner()
+    mixer.play(constant(1000), start_frame=500, owner=owner)
+    mixer.cancel(owner)
+    assert not render(mixer, 12).any()
+
+
+def test_active_voice_count_ignores_pending_commands(mixer):
+    mixer.play(constant(10000), tag="a")
+    mixer.release("a")
+    mixer.cancel(object())
+    assert mixer.active_voice_count() == 1
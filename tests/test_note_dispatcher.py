@@ -0,0 +1,74 @@
+# tests/test_note_dispatcher.py
+
+import threading
+import pytest
+from sound.note_dispatcher import NoteDispatcher, QueueFullError
+
+
+class _BlockingManager:
+    """
+    第一条命令到达后一直阻塞音频线程，使队列只进不出
+    """
+
+    def __init__(self):
+        self.entered = threading.Event()
+        self.gate = threading.Event()
+
+    def schedule_note(self, note, velocity, group, tag=None):
+        self.entered.set()
+        self.gate.wait(5)
+
+    def release_note(self, tag):
+        pass
+
+
+@pytest.fixture
+def manager():
+    manager = _BlockingManager()
+    yield manager
+    manager.gate.set()
+
+
+def _stalled(manager, policy, max_depth):
+    dispatcher = NoteDispatcher(manager, max_depth=max_depth, policy=policy)
+    dispatcher.submit(60)
+    assert manager.entered.wait(5)
+    return dispatcher
+
+
+@pytest.mark.parametrize("policy", ["reject", "drop_newest", "drop_oldest"])
+def test_concurrent_submits_never_exceed_max_depth(manager, policy):
+    dispatcher = _stalled(manager, policy, max_depth=8)
+    barrier = threading.Barrier(8)
+
+    def submit_many():
+        barrier.wait()
+        for _ in range(200):
+            try:
+                dispatcher.submit(60)
+            except QueueFullError:
+                pass
+
+    threads = [threading.Thread(target=submit_many) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert dispatcher.depth() == 8
+    assert dispatcher.peak_depth == 8
+    stats = dispatcher.stats()
+    assert stats["submitted"] == 1 + 8 + (stats["dropped"] if policy == "drop_oldest" else 0)
+    manager.gate.set()
+    dispatcher.stop()
+
+
+def test_reject_raises_when_full(manager):
+    dispatcher = _stalled(manager, "reject", max_depth=2)
+    dispatcher.submit(60)
+    dispatcher.submit(61)
+    with pytest.raises(QueueFullError):
+        dispatcher.submit(62)
+    assert dispatcher.rejected == 1
+    manager.gate.set()
+    dispatcher.stop()
@@ -0,0 +1,81 @@
+# tests/test_parse_cache.py
+
+import numpy as np
+import pytest
+from midi.midi_player import MidiPlayer
+from midi.parse_cache import ParseCache, ParsedMidi
+
+NOTES = [(0, bytes([0xC0, 7])), (0, bytes([0x90, 60, 100])), (480, bytes([0x80, 60, 0]))]
+
+
+@pytest.fixture
+def parsed(write_midi):
+    return MidiPlayer(write_midi([NOTES])).parse()
+
+
+def test_lru_eviction(parsed):
+    cache = ParseCache(max_entries=2)
+    cache.put("a", parsed)
+    cache.put("b", parsed)
+    assert cache.get("a") is parsed
+    cache.put("c", parsed)
+    assert cache.get("b") is None
+    assert cache.get("a") is parsed and cache.get("c") is parsed
+    stats = cache.stats()
+    assert (stats["entries"], stats["evictions"], stats["hits"], stats["misses"]) == (2, 1, 3, 1)
+
+
+def test_disk_layer_round_trip(parsed, tmp_path):
+    ParseCache(disk_dir=str(tmp_path)).put("a", parsed)
+    cache = ParseCache(disk_dir=str(tmp_path))
+    loaded = cache.get("a")
+    assert cache.stats()["disk_hits"] == 1
+    for name, column in parsed.table.to_arrays().items():
+        np.testing.assert_array_equal(getattr(loaded.table, name), column)
+    assert loaded.channel_programs == parsed.channel_programs == {0: 7}
+    assert loaded.track_instruments == parsed.track_instruments
+    np.testing.assert_array_equal(loaded.tempos, parsed.tempos)
+    # 之后命中内存层
+    assert cache.get("a") is loaded and cache.stats()["hits"] == 1
+
+
+def test_corrupt_disk_entry_is_a_miss(tmp_path):
+    (tmp_path / "a.npz").write_bytes(b"garbage")
+    cache = ParseCache(disk_dir=str(tmp_path))
+    assert cache.get("a") is None
+    assert cache.stats()["misses"] == 1
+
+
+def test_truncated_disk_entry_is_removed_and_missed(parsed, tmp_path):
+    ParseCache(disk_dir=str(tmp_path)).put("a", parsed)
+    path = tmp_path / "a.npz"
+    path.write_bytes(path.read_bytes()[:100])
+    cache = ParseCache(disk_dir=str(tmp_path))
+    assert cache.get("a") is None
+    assert cache.stats()["misses"] == 1
+    assert not path.exists()
+
+
+def test_player_reparses_over_corrupt_disk_entry(write_midi, tmp_path):
+    path = write_midi([NOTES])
+    cache_dir = tmp_path / "cache"
+    player = MidiPlayer(path, parse_cache=ParseCache(disk_dir=str(cache_dir)))
+    (cache_dir / f"{player.get_content_hash()}.npz").parent.mkdir()
+    (cache_dir / f"{player.get_content_hash()}.npz").write_bytes(b"PK\x03\x04 truncated")
+    assert len(player.parse().table) == 3
+    # 重新解析后写回了有效的缓存
+    assert ParseCache(disk_dir=str(cache_dir)).get(player.get_content_hash()) is not None
+
+
+def test_player_skips_parsing_on_hit(write_midi, monkeypatch):
+    cache = ParseCache()
+    path = write_midi([NOTES])
+    first = MidiPlayer(path, parse_cache=cache).parse()
+
+    def fail(self):
+        raise AssertionError("缓存命中时不应重新解析")
+
+    monkeypatch.setattr(MidiPlayer, "_parse_midi", fail)
+    player = MidiPlayer(path, parse_cache=cache)
+    assert player.parse() is first
+    assert player.parsed and player.channel_programs == {0: 7}
@@ -0,0 +1,87 @@
+# tests/test_renderer.py
+
+import wave
+import numpy as np
+import pytest
+import config
+from conftest import tempo_event
+from midi.midi_player import MidiPlayer
+from midi.renderer import OfflineRenderer
+from sound.mixer import Mixer
+from sound.sound_manager import SoundManager
+from sound.sound_mapping import SoundMapping
+
+SAMPLE_RATE = 44100
+SAMPLE_SECONDS = 0.71
+
+
+@pytest.fixture
+def tone_group(tmp_path, monkeypatch):
+    """
+    临时音源组 tone：60.wav 为 0.71 秒的恒定幅度正弦波
+    """
+    group_dir = tmp_path / "sounds" / "tone"
+    group_dir.mkdir(parents=True)
+    t = np.arange(int(SAMPLE_RATE * SAMPLE_SECONDS)) / SAMPLE_RATE
+    pcm = (np.sin(2 * np.pi * 440 * t) * 16000).astype("<i2")
+    with wave.open(str(group_dir / "60.wav"), "wb") as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(SAMPLE_RATE)
+        wav.writeframes(pcm.tobytes())
+    monkeypatch.setattr(config, "SOUNDS_DIR", str(tmp_path / "sounds"))
+    monkeypatch.setattr(config, "_sound_groups", None)
+    return "tone"
+
+
+def render(path: str, group: str, sound_manager: SoundManager = None) -> np.ndarray:
+    player = MidiPlayer(path)
+    player.parse()
+    player.set_instrument_mapping({0: group})
+    sound_manager = sound_manager or SoundManager(SoundMapping(), mixer=Mixer(SAMPLE_RATE, 1, 256))
+    renderer = OfflineRenderer(player, sound_manager, block_frames=512, tail_sec=0.5)
+    return np.concatenate([block[:, 0].copy() for block in renderer.blocks()])
+
+
+def rms(audio: np.ndarray, start: float, end: float) -> float:
+    window = audio[int(start * SAMPLE_RATE):int(end * SAMPLE_RATE)]
+    return float(np.sqrt(np.mean(window ** 2)))
+
+
+def test_restrike_at_note_off_tick_keeps_sounding(write_midi, tone_group):
+    # 120 BPM，480 tick = 0.5 秒：0 秒起音，0.25 秒同一 tick 上 note_off 与重新起音，1.0 秒 note_off
+    path = write_midi([[
+        (0, tempo_event(500000)),
+        (0, b"\x90\x3c\x64"),
+        (240, b"\x80\x3c\x40"),
+        (0, b"\x90\x3c\x64"),
+        (720, b"\x80\x3c\x40"),
+    ]], midi_type=0)
+    audio = render(path, tone_group)
+    # 重新起音的样本从 0.25 秒持续到 0.96 秒
+    assert rms(audio, 0.4, 0.6) > 0.1
+    assert rms(audio, 0.8, 0.9) > 0.1
+    assert rms(audio, 1.1, 1.4) == 0.0
+
+
+def test_note_off_releases_voice(write_midi, tone_group):
+    path = write_midi([[
+        (0, tempo_event(500000)),
+        (0, b"\x90\x3c\x64"),
+        (240, b"\x80\x3c\x40"),
+    ]], midi_type=0)
+    audio = render(path, tone_group)
+    assert rms(audio, 0.0, 0.2) > 0.1
+    # 释音淡出 NOTE_RELEASE_MS 之后不再有声音
+    assert rms(audio, 0.25 + config.NOTE_RELEASE_MS / 1000 + 0.01, 0.7) == 0.0
+
+
+def test_renders_share_the_live_sample_cache(write_midi, tone_group):
+    path = write_midi([[(0, b"\x90\x3c\x64"), (240, b"\x80\x3c\x40"), (0, b"\x90\x3c\x64")]], midi_type=0)
+    live = SoundManager(SoundMapping(), mixer=Mixer(SAMPLE_RATE, 1, 256))
+    render(path, tone_group, live)
+    render(path, tone_group, live)
+    stats = live.sample_cache.stats()
+    # 只在第一次渲染时解码一次，渲染结束后声部持有的引用全部归还
+    assert stats["misses"] == 1 and stats["hits"] >= 3
+    assert stats["pinned"] == 0
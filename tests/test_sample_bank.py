@@ -0,0 +1,58 @@
+# tests/test_sample_bank.py
+
+import numpy as np
+import pytest
+import config
+from sound import sample_pack
+from sound.sample_bank import SampleBank
+
+GROUP = "lalala"
+RATE = 8000
+
+
+@pytest.fixture
+def pack_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(config, "SAMPLE_PACK_DIR", str(tmp_path))
+    monkeypatch.setattr(config, "USE_SAMPLE_PACKS", True)
+    return tmp_path
+
+
+def load(group: str = GROUP) -> SampleBank:
+    bank = SampleBank(RATE, 1)
+    bank.load_group(group)
+    return bank
+
+
+def test_pack_is_mapped(pack_dir):
+    bank = load()
+    assert bank.stats()["mapped_bytes"] > 0
+    assert bank.get(GROUP, 60) is not None
+
+
+def corrupt(path, mutate):
+    data = bytearray(path.read_bytes())
+    mutate(data)
+    path.write_bytes(bytes(data))
+
+
+@pytest.mark.parametrize("mutate", [
+    # 头部完整、签名仍匹配，但数据区被截断
+    lambda data: data.__delitem__(slice(sample_pack.HEADER.size + 8, None)),
+    # 第一条索引的偏移指向数据区之外
+    lambda data: sample_pack.ENTRY.pack_into(data, sample_pack.HEADER.size, 60, 1 << 30, 100),
+])
+def test_corrupt_pack_falls_back_to_decoding(pack_dir, monkeypatch, mutate):
+    monkeypatch.setattr(config, "USE_SAMPLE_PACKS", False)
+    reference = load()
+    monkeypatch.setattr(config, "USE_SAMPLE_PACKS", True)
+    # 不能改写已被 mmap 的文件，只构建、不加载
+    assert sample_pack.build_pack(GROUP, RATE, 1)
+    path = pack_dir / f"{GROUP}.pack"
+    corrupt(path, mutate)
+    assert sample_pack.is_fresh(GROUP, RATE, 1)
+    with pytest.raises(ValueError):
+        sample_pack.load_pack(GROUP)
+
+    bank = load()
+    assert bank.stats()["mapped_bytes"] == 0
+    np.testing.assert_array_equal(bank.get(GROUP, 60), reference.get(GROUP, 60))
@@ -0,0 +1,84 @@
+# tests/test_sample_cache.py
+
+import numpy as np
+import pytest
+from sound.sample_cache import SampleCache
+
+SAMPLE_BYTES = 1000
+
+
+def loader(key):
+    return np.zeros(SAMPLE_BYTES // 2, dtype=np.int16)
+
+
+@pytest.fixture
+def cache():
+    return SampleCache(max_bytes=3 * SAMPLE_BYTES)
+
+
+def test_hits_and_misses(cache):
+    first = cache.get("a", loader)
+    assert cache.get("a", loader) is first
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["bytes"]) == (1, 1, SAMPLE_BYTES)
+
+
+def test_budget_evicts_least_recently_used(cache):
+    for key in "abc":
+        cache.get(key, loader)
+    cache.get("a", loader)
+    cache.get("d", loader)
+    stats = cache.stats()
+    assert stats["evictions"] == 1 and stats["bytes"] == 3 * SAMPLE_BYTES
+    cache.get("b", loader)
+    assert cache.stats()["misses"] == 5
+
+
+def test_acquired_entries_are_not_evicted(cache):
+    cache.acquire("a", loader)
+    for key in "bcde":
+        cache.get(key, loader)
+    assert cache.stats()["pinned"] == 1
+    cache.get("a", loader)
+    assert cache.stats()["misses"] == 5
+
+    # 混音器归还引用后重新参与 LRU 淘汰，超出的预算在下一次访问时收回
+    cache.released.append("a")
+    for key in "fgh":
+        cache.get(key, loader)
+    stats = cache.stats()
+    assert stats["pinned"] == 0 and stats["bytes"] <= 3 * SAMPLE_BYTES
+
+
+def test_refcount_needs_every_release(cache):
+    cache.acquire("a", loader)
+    cache.acquire("a", loader)
+    cache.released.append("a")
+    assert cache.stats()["pinned"] == 1
+    cache.released.append("a")
+    assert cache.stats()["pinned"] == 0
+
+
+def test_invalidate_defers_pinned_entries(cache):
+    cache.acquire("a", loader)
+    cache.get("b", loader)
+    assert cache.invalidate(lambda key: True) == 1
+    assert cache.stats()["entries"] == 1
+
+    cache.released.append("a")
+    stats = cache.stats()
+    assert stats["entries"] == 0 and stats["bytes"] == 0 and stats["invalidations"] == 2
+
+
+def test_reacquire_cancels_pending_invalidation(cache):
+    cache.acquire("a", loader)
+    cache.invalidate(lambda key: key == "a")
+    cache.get("a", loader)
+    cache.released.append("a")
+    assert cache.stats()["entries"] == 1
+
+
+def test_warmup_counts_only_new_entries(cache):
+    cache.get("a", loader)
+    assert cache.warmup(["a", "b", "c"], loader) == 2
+    assert cache.warmup(["a", "b"], loader) == 0
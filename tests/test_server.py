@@ -0,0 +1,179 @@
+# tests/test_server.py
+#
+# 接口层的参数校验；不进入 lifespan，不打开音频输出
+
+import json
+import pytest
+from fastapi.testclient import TestClient
+import config
+import server
+
+
+@pytest.fixture
+def client():
+    return TestClient(server.app)
+
+
+def test_play_notes_rejects_unknown_group(client):
+    response = client.post("/play_notes", json={"notes": [{"note": 60, "group": "../../etc"}]})
+    assert response.status_code == 400
+    assert "../../etc" in response.json()["detail"]
+
+
+def test_warmup_sounds_rejects_unknown_group(client):
+    response = client.post("/warmup_sounds/", params={"group": ".."})
+    assert response.status_code == 400
+    assert server.sound_manager.sample_cache.stats()["entries"] == 0
+
+
+@pytest.fixture
+def upload_dir(tmp_path, monkeypatch):
+    uploads = tmp_path / "uploads"
+    uploads.mkdir()
+    monkeypatch.setattr(server, "UPLOAD_DIR", str(uploads))
+    return uploads
+
+
+def _upload(client, content: bytes):
+    return client.post("/upload_midi/", files={"file": ("song.mid", content, "audio/midi")})
+
+
+def test_unparseable_upload_is_removed(client, upload_dir):
+    response = _upload(client, b"notmidi")
+    assert response.status_code == 400
+    assert list(upload_dir.iterdir()) == []
+
+
+def test_shared_upload_file_lives_until_last_session(client, upload_dir, write_midi):
+    with open(write_midi([[(0, bytes([0x90, 60, 100])), (480, bytes([0x80, 60, 0]))]]), "rb") as f:
+        content = f.read()
+    first, second = _upload(client, content).json(), _upload(client, content).json()
+    assert second["deduplicated"]
+    stored = upload_dir / f"{first['sha256']}.mid"
+
+    client.post("/cleanup/", params={"session_id": first["session_id"]})
+    assert stored.exists()
+    client.post("/cleanup/", params={"session_id": second["session_id"]})
+    assert not stored.exists()
+
+
+def test_rejected_upload_keeps_file_shared_with_a_session(client, upload_dir, write_midi, monkeypatch):
+    with open(write_midi([[(0, bytes([0x90, 60, 100])), (480, bytes([0x80, 60, 0]))]]), "rb") as f:
+        content = f.read()
+    session = _upload(client, content).json()
+    monkeypatch.setattr(server.MidiPlayer, "check", lambda self: (_ for _ in ()).throw(ValueError("boom")))
+    assert _upload(client, content).status_code == 400
+    assert (upload_dir / f"{session['sha256']}.mid").exists()
+    client.post("/cleanup/", params={"session_id": session["session_id"]})
+    assert list(upload_dir.iterdir()) == []
+
+
+def test_upload_defers_parsing_to_batch_parse(client, upload_dir, write_midi):
+    sessions = []
+    for note in (60, 62):
+        with open(write_midi([[(0, bytes([0x90, note, 100])), (480, bytes([0x80, note, 0]))]]), "rb") as f:
+            sessions.append(_upload(client, f.read()).json())
+    assert sessions[0]["midi_type"] == 1 and sessions[0]["tracks"] == 1
+    ids = [s["session_id"] for s in sessions]
+    assert not any(server.midi_sessions.get(sid).parsed for sid in ids)
+
+    result = client.post("/batch_parse/", json={"session_ids": ids, "workers": 2}).json()["sessions"]
+    assert all(result[sid]["status"] == "parsed" and result[sid]["events"] == 2 for sid in ids)
+    assert server.midi_sessions.get(ids[0]).get_event_table().note.tolist() == [60, 60]
+
+    again = client.post("/batch_parse/", json={"session_ids": ids}).json()["sessions"]
+    assert all(again[sid]["status"] == "already_parsed" for sid in ids)
+    for sid in ids:
+        client.post("/cleanup/", params={"session_id": sid})
+
+
+@pytest.fixture
+def small_upload_limit(monkeypatch):
+    monkeypatch.setattr(config, "UPLOAD_MAX_BYTES", 1000)
+    monkeypatch.setattr(server, "UPLOAD_FORM_OVERHEAD", 1000)
+
+    async def not_reached(file):
+        raise AssertionError("超限的请求体不应进入接口")
+
+    # 请求必须在 multipart 解析之前被拒绝，接口本身不会被调用
+    monkeypatch.setattr(server, "_store_upload", not_reached)
+
+
+def test_oversized_upload_rejected_from_content_length(client, upload_dir, small_upload_limit):
+    response = _upload(client, b"\0" * 50_000)
+    assert response.status_code == 413
+    assert list(upload_dir.iterdir()) == []
+
+
+def test_oversized_chunked_upload_rejected_while_streaming(client, upload_dir, small_upload_limit):
+    def body():
+        yield b'--x\r\nContent-Disposition: form-data; name="file"; filename="a.mid"\r\n\r\n'
+        for _ in range(50):
+            yield b"\0" * 1000
+        yield b"\r\n--x--\r\n"
+
+    response = client.post("/upload_midi/", content=body(),
+                           headers={"Content-Type": "multipart/form-data; boundary=x"})
+    assert response.status_code == 413
+    assert list(upload_dir.iterdir()) == []
+
+
+@pytest.fixture
+def scale_session(client, upload_dir, write_midi):
+    # 120 BPM：每 240 tick（0.25 秒）一个音符，note_on / note_off 交替，共 8 个音符 16 个事件
+    track = [(0, bytes([0xC0, 0]))]
+    for i in range(8):
+        track += [(0 if i == 0 else 120, bytes([0x90, 60 + i, 100])), (120, bytes([0x80, 60 + i, 0]))]
+    with open(write_midi([track]), "rb") as f:
+        session_id = _upload(client, f.read()).json()["session_id"]
+    yield session_id
+    client.post("/cleanup/", params={"session_id": session_id})
+
+
+def _parse(client, session_id, **form):
+    return client.post("/parse_midi/", data={"session_id": session_id, **form})
+
+
+def test_parse_midi_pages_with_next_offset(client, scale_session):
+    seen, offset = [], 0
+    while offset is not None:
+        page = _parse(client, scale_session, offset=offset, limit=5).json()
+        assert page["total"] == 17 and page["offset"] == offset
+        seen += page["events"]
+        offset = page["next_offset"]
+    assert len(seen) == 17
+    assert seen == _parse(client, scale_session).json()["events"]
+    assert _parse(client, scale_session, offset=100).json()["events"] == []
+
+
+def test_parse_midi_filters(client, scale_session):
+    body = _parse(client, scale_session, start_sec=0.5, end_sec=1.0, event_type="note_on").json()
+    assert [e["note"] for e in body["events"]] == [62, 63]
+    assert body["total"] == 2 and body["next_offset"] is None
+    assert _parse(client, scale_session, channel=3).json()["total"] == 0
+
+
+def test_parse_midi_rejects_unknown_event_type(client, scale_session):
+    response = _parse(client, scale_session, event_type="note_on,pitchwheel")
+    assert response.status_code == 400
+    assert "pitchwheel" in response.json()["detail"]
+
+
+def test_parse_midi_unknown_session(client):
+    assert _parse(client, "missing").status_code == 404
+
+
+def test_parse_midi_streams_ndjson(client, scale_session, monkeypatch):
+    monkeypatch.setattr(server, "PARSE_STREAM_CHUNK", 3)
+    response = _parse(client, scale_session, stream="true", offset=2, limit=10)
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    header, events = lines[0], lines[1:]
+    assert header["total"] == 17 and header["offset"] == 2 and header["count"] == 10
+    assert events == _parse(client, scale_session, offset=2, limit=10).json()["events"]
+
+
+def test_set_velocity_curve_rejects_unknown_group(client):
+    response = client.post("/set_velocity_curve", json={"group": "no-such-group", "curve": "linear"})
+    assert response.status_code == 400
+    assert "no-such-group" not in server.sound_manager.velocity_tables
@@ -0,0 +1,117 @@
+# tests/test_session_store.py
+
+import pytest
+from midi import session_store
+from midi.session_store import SessionStore
+
+
+class _Player:
+    file_path = "missing.mid"
+    midi_loaded = False
+
+    def __init__(self, nbytes: int = 100):
+        self.nbytes = nbytes
+
+    def get_event_table(self):
+        return self
+
+
+class _Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = _Clock()
+    monkeypatch.setattr(session_store.time, "monotonic", clock)
+    return clock
+
+
+@pytest.fixture
+def removed():
+    return []
+
+
+def make_store(removed, busy=(), **kwargs):
+    kwargs.setdefault("ttl", 60)
+    kwargs.setdefault("max_sessions", 10)
+    kwargs.setdefault("max_bytes", 10_000)
+    return SessionStore(on_evict=lambda sid, player, reason: removed.append((sid, reason)),
+                        is_busy=lambda sid: sid in busy, **kwargs)
+
+
+def test_get_refreshes_idle_time(clock, removed):
+    store = make_store(removed)
+    player = _Player()
+    store.put("a", player)
+    clock.now += 50
+    assert store.get("a") is player
+    clock.now += 50
+    assert store.get("a") is player
+    assert removed == []
+
+
+def test_idle_session_expires(clock, removed):
+    store = make_store(removed)
+    store.put("a", _Player())
+    clock.now += 61
+    assert store.get("a") is None
+    assert "a" not in store
+    assert removed == [("a", "expired")] and store.expired == 1
+
+
+def test_reap_skips_busy_sessions(clock, removed):
+    store = make_store(removed, busy={"playing"})
+    store.put("idle", _Player())
+    store.put("playing", _Player())
+    clock.now += 61
+    assert store.reap() == 1
+    assert removed == [("idle", "expired")]
+    assert store.get("playing") is not None
+
+
+def test_lru_by_session_count(clock, removed):
+    store = make_store(removed, max_sessions=2)
+    store.put("a", _Player())
+    store.put("b", _Player())
+    store.get("a")
+    store.put("c", _Player())
+    assert removed == [("b", "evicted")]
+    assert len(store) == 2 and store.evicted == 1
+
+
+def test_lru_by_estimated_bytes(clock, removed):
+    store = make_store(removed, max_bytes=250)
+    for sid in "abc":
+        store.put(sid, _Player(100))
+    assert removed == [("a", "evicted")]
+
+
+def test_busy_sessions_are_evicted_last(clock, removed):
+    store = make_store(removed, busy={"a"}, max_sessions=2)
+    store.put("a", _Player())
+    store.put("b", _Player())
+    store.put("c", _Player())
+    assert removed == [("b", "evicted")]
+
+
+def test_remove_notifies_once(clock, removed):
+    store = make_store(removed)
+    player = _Player()
+    store.put("a", player)
+    assert store.remove("a") is player
+    assert store.remove("a") is None
+    assert removed == [("a", "removed")]
+
+
+def test_callback_may_reenter_store(clock):
+    seen = []
+    store = SessionStore(ttl=60, max_sessions=1, max_bytes=10_000,
+                         on_evict=lambda sid, player, reason: seen.append(store.players()))
+    store.put("a", _Player())
+    store.put("b", _Player())
+    assert len(seen) == 1 and len(seen[0]) == 1
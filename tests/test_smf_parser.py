@@ -0,0 +1,127 @@
+# tests/test_smf_parser.py
+#
+# 快速解析器必须与 mido 路径逐事件一致
+
+import numpy as np
+import pytest
+from conftest import smf_bytes, tempo_event
+from midi.event_table import COLUMNS, NOTE_ON, NOTE_OFF, PROGRAM_CHANGE
+from midi.midi_player import MidiPlayer
+from midi.smf_parser import SMFError, compare_parsers, parse_smf
+
+TRACK_NAME = b"\xff\x03\x05piano"
+TEXT = b"\xff\x01\x04text"
+KEY_SIGNATURE = b"\xff\x59\x02\x00\x00"
+SYSEX = b"\xf0\x05\x7e\x7f\x09\x01\xf7"
+SYSEX_ESCAPE = b"\xf7\x03\x43\x12\x00"
+
+
+def assert_matches_mido(path: str):
+    reference = MidiPlayer(path)._parse_with_mido()
+    with open(path, "rb") as f:
+        fast = parse_smf(f.read())
+
+    def rows(parsed):
+        return list(zip(*(getattr(parsed.table, name).tolist() for name in COLUMNS)))
+
+    assert rows(fast) == rows(reference)
+    for name in COLUMNS:
+        assert getattr(fast.table, name).dtype == getattr(reference.table, name).dtype, name
+    assert fast.channel_programs == reference.channel_programs
+    assert fast.track_instruments == reference.track_instruments
+    assert fast.midi_type == reference.midi_type
+    assert fast.ticks_per_beat == reference.ticks_per_beat
+    np.testing.assert_array_equal(fast.tempo_ticks, reference.tempo_ticks)
+    np.testing.assert_array_equal(fast.tempos, reference.tempos)
+    assert compare_parsers(path, repeat=1)["match"]
+    return fast
+
+
+def test_type0_multichannel(write_midi):
+    track = [
+        (0, TRACK_NAME),
+        (0, bytes([0xC0, 5])),
+        (0, bytes([0xC9, 0])),
+        (0, bytes([0x90, 60, 100])),
+        (0, bytes([0x99, 36, 90])),
+        (240, bytes([0x80, 60, 0])),
+        (0, bytes([0x89, 36, 0])),
+        (240, bytes([0x91, 67, 80])),
+        (480, bytes([0x91, 67, 0])),     # 力度 0 的 note_on
+    ]
+    parsed = assert_matches_mido(write_midi([track], midi_type=0))
+    assert parsed.midi_type == 0
+    assert parsed.channel_programs == {0: 5, 9: 0}
+    assert parsed.table.type.tolist().count(NOTE_ON) == 4
+
+
+def test_type1_tracks_merge_in_tick_order(write_midi):
+    conductor = [(0, TRACK_NAME), (0, tempo_event(500000)), (0, KEY_SIGNATURE)]
+    melody = [(0, bytes([0xC0, 24])), (0, bytes([0x90, 72, 100])), (480, bytes([0x80, 72, 0]))]
+    bass = [(0, bytes([0xC1, 33])), (0, bytes([0x91, 36, 100])), (480, bytes([0x81, 36, 0])),
+            (0, bytes([0x91, 38, 100])), (480, bytes([0x81, 38, 0]))]
+    parsed = assert_matches_mido(write_midi([conductor, melody, bass]))
+    assert parsed.track_instruments == {1: 24, 2: 33}
+    assert parsed.table.tick.tolist() == sorted(parsed.table.tick.tolist())
+
+
+def test_running_status(write_midi):
+    track = [
+        (0, bytes([0x90, 60, 100])),
+        (120, bytes([62, 100])),          # running status: note_on
+        (120, bytes([64, 100])),
+        (120, bytes([60, 0])),
+        (0, bytes([0xB0, 7, 100])),       # 控制器消息被跳过，但更新 running status
+        (0, bytes([10, 64])),
+        (0, bytes([0xE0, 0, 64])),        # 弯音
+        (0, bytes([0x80, 62, 0])),
+        (120, bytes([64, 0])),
+        (0, bytes([0xC0, 1])),
+        (0, bytes([2])),                  # running status: program_change（1 个数据字节）
+        (0, bytes([0xD0, 40])),           # 通道压力（1 个数据字节）
+        (0, bytes([41])),
+        (0, bytes([0x90, 65, 100])),
+        (10, TEXT),                       # 与 mido 一致：meta 事件不清除 running status
+        (10, bytes([65, 0])),
+    ]
+    parsed = assert_matches_mido(write_midi([track]))
+    assert parsed.table.note[parsed.table.type == NOTE_ON].tolist() == [60, 62, 64, 60, 65, 65]
+    assert parsed.table.type.tolist().count(NOTE_OFF) == 2
+    assert parsed.table.program[parsed.table.type == PROGRAM_CHANGE].tolist() == [1, 2]
+
+
+def test_meta_and_sysex_events_are_skipped(write_midi):
+    track = [
+        (0, TRACK_NAME),
+        (0, SYSEX),
+        (0, bytes([0x90, 60, 100])),
+        (10, TEXT),
+        (10, SYSEX_ESCAPE),
+        (10, b"\xff\x7f\x03\x00\x00\x41"),  # 音序器专用 meta
+        (10, bytes([0x80, 60, 0])),
+    ]
+    parsed = assert_matches_mido(write_midi([track]))
+    assert parsed.table.tick.tolist() == [0, 40]
+
+
+def test_tempo_changes(write_midi):
+    conductor = [(0, tempo_event(500000)), (960, tempo_event(250000)), (480, tempo_event(1000000))]
+    notes = [(0, bytes([0x90, 60, 100]))] + [(480, bytes([0x90, 60, 100])) for _ in range(6)]
+    parsed = assert_matches_mido(write_midi([conductor, notes], ticks_per_beat=480))
+    assert parsed.tempos.tolist() == [500000, 250000, 1000000]
+    # 前 960 tick 每拍 0.5s，960 ~ 1440 tick 每拍 0.25s，之后每拍 1s
+    np.testing.assert_allclose(parsed.table.time, [0.0, 0.5, 1.0, 1.25, 2.25, 3.25, 4.25])
+
+
+def test_tempo_change_in_type0_track(write_midi):
+    track = [(0, tempo_event(600000)), (0, bytes([0x90, 60, 100])),
+             (96, tempo_event(300000)), (96, bytes([0x80, 60, 0]))]
+    parsed = assert_matches_mido(write_midi([track], midi_type=0, ticks_per_beat=96))
+    np.testing.assert_allclose(parsed.table.time, [0.0, 0.9])
+
+
+def test_rejects_non_midi():
+    with pytest.raises(SMFError):
+        parse_smf(b"notmidi")
+    with pytest.raises(SMFError):
+        parse_smf(smf_bytes([[(0, bytes([0x90, 60, 100]))]])[:-6])
@@ -0,0 +1,42 @@
+# tests/test_sound_manager.py
+
+import pytest
+from sound.mixer import Mixer
+from sound.sound_manager import SoundManager
+from sound.sound_mapping import SoundMapping
+
+
+@pytest.fixture
+def manager():
+    mixer = Mixer(sample_rate=8000, channels=1, block_size=64)
+    mixer.start_offline()
+    return SoundManager(SoundMapping(), mixer=mixer)
+
+
+@pytest.mark.parametrize("group", ["../default", "/etc", "nonexistent"])
+def test_unknown_group_never_reaches_the_filesystem(manager, group):
+    assert not manager.has_sound(60, group)
+    with pytest.raises(ValueError, match="无效的音源组"):
+        manager.schedule_note(60, group=group)
+    with pytest.raises(ValueError, match="无效的音源组"):
+        manager.load_sound(60, group)
+    with pytest.raises(ValueError, match="#0 无效的音源组"):
+        manager.schedule_notes([(60, 100, group, 0.0)])
+    assert manager.sample_cache.stats()["entries"] == 0
+
+
+def test_known_group_schedules(manager):
+    assert manager.has_sound(60, "default")
+    manager.schedule_notes([(60, 100, "default", 0.0), (64, 100, None, 5.0)])
+    assert manager.mixer.active_voice_count() == 2
+
+
+def test_warmup_rejects_unknown_group(manager):
+    with pytest.raises(ValueError, match="无效的音源组"):
+        manager.warmup(["default", ".."])
+    assert manager.sample_cache.stats()["entries"] == 0
+
+
+def test_warmup_known_group(manager):
+    assert manager.warmup(["lalala"]) > 0
+    assert manager.warmup(["lalala"]) == 0
@@ -0,0 +1,39 @@
+# tests/test_sound_mapping.py
+
+import pytest
+import config
+from sound.sound_mapping import SoundMapping
+
+
+def test_construction_does_not_scan_sound_groups(monkeypatch):
+    monkeypatch.setattr(config, "_sound_groups", None)
+    mapping = SoundMapping()
+    assert config._sound_groups is None
+    assert mapping.get_group(60) == config.DEFAULT_SOUND_GROUP
+    assert config._sound_groups is not None
+
+
+def test_first_write_initialises_defaults():
+    mapping = SoundMapping()
+    mapping.set_group(60, "lalala")
+    assert mapping.get_group(60) == "lalala"
+    assert mapping.get_group(61) == config.DEFAULT_SOUND_GROUP
+    assert mapping.version == 1
+
+
+def test_mapping_is_a_read_only_snapshot():
+    mapping = SoundMapping()
+    snapshot = mapping.mapping
+    with pytest.raises(TypeError):
+        snapshot[60] = "lalala"
+    mapping.set_group(60, "lalala")
+    assert snapshot[60] == config.DEFAULT_SOUND_GROUP
+    assert mapping.mapping[60] == "lalala"
+
+
+def test_batch_load_is_all_or_nothing():
+    mapping = SoundMapping()
+    with pytest.raises(ValueError):
+        mapping.load_mapping_from_dict({60: "lalala", 61: "../nope"})
+    assert mapping.get_group(60) == config.DEFAULT_SOUND_GROUP
+    assert mapping.version == 0
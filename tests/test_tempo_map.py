@@ -0,0 +1,55 @@
+# tests/test_tempo_map.py
+
+import mido
+import numpy as np
+import pytest
+from conftest import tempo_event
+from midi.tempo_map import DEFAULT_TEMPO, TempoMap
+
+
+def test_default_tempo_before_any_change():
+    tempo_map = TempoMap(480)
+    assert tempo_map.tempo_at(10_000) == DEFAULT_TEMPO
+    assert tempo_map.to_seconds(960) == pytest.approx(1.0)
+
+
+def test_piecewise_conversion():
+    tempo_map = TempoMap(100, [(0, 1_000_000), (200, 250_000), (300, 2_000_000)])
+    assert tempo_map.tempo_at(199) == 1_000_000 and tempo_map.tempo_at(200) == 250_000
+    # 0-200 tick 每拍 1s，200-300 每拍 0.25s，之后每拍 2s
+    expected = {0: 0.0, 100: 1.0, 200: 2.0, 250: 2.125, 300: 2.25, 350: 3.25}
+    for tick, seconds in expected.items():
+        assert tempo_map.to_seconds(tick) == pytest.approx(seconds)
+    np.testing.assert_allclose(tempo_map.to_seconds_array(list(expected)), list(expected.values()))
+
+
+def test_last_change_on_same_tick_wins():
+    tempo_map = TempoMap(480, [(480, 250_000), (480, 1_000_000)])
+    assert len(tempo_map) == 2
+    assert tempo_map.tempo_at(480) == 1_000_000
+
+
+def test_invalid_ticks_per_beat():
+    with pytest.raises(ValueError):
+        TempoMap(0)
+
+
+def test_matches_mido_across_tempo_changes(write_midi):
+    # 指挥轨上多次变速，音符轨每 120 tick 一个音符，跨越所有速度段
+    conductor = [(0, tempo_event(600_000)), (300, tempo_event(350_000)), (250, tempo_event(1_200_000)),
+                 (700, tempo_event(450_000))]
+    notes = [(0 if i == 0 else 120, bytes([0x90, 60, 100])) for i in range(20)]
+    midi = mido.MidiFile(write_midi([conductor, notes], ticks_per_beat=240))
+
+    tempo_map = TempoMap.from_midi(midi)
+    assert len(tempo_map) == 4
+
+    # mido 迭代 MidiFile 时按速度变化把 delta 换算为秒
+    mido_seconds, elapsed = [], 0.0
+    for msg in midi:
+        elapsed += msg.time
+        if msg.type == "note_on":
+            mido_seconds.append(elapsed)
+    ticks = [120 * i for i in range(20)]
+    np.testing.assert_allclose(tempo_map.to_seconds_array(ticks), mido_seconds, rtol=1e-12, atol=1e-9)
+    assert [tempo_map.to_seconds(t) for t in ticks] == pytest.approx(mido_seconds)
@@ -0,0 +1,61 @@
+# tests/test_velocity.py
+
+import numpy as np
+import pytest
+from sound.mixer import Mixer
+from sound.sound_manager import SoundManager
+from sound.sound_mapping import SoundMapping
+from sound.velocity import build_velocity_table
+
+
+def test_db_curve_runs_from_minus_20_db_to_unity():
+    table = build_velocity_table("db")
+    assert table.shape == (128,) and table.dtype == np.float32
+    assert table[127] == pytest.approx(1.0)
+    assert table[1] == pytest.approx(10 ** (-20 * (1 - 1 / 127) / 20))
+    # 力度 0 按 1 处理
+    assert table[0] == table[1]
+    assert np.all(np.diff(table[1:]) > 0)
+
+
+def test_db_curve_min_db_parameter():
+    table = build_velocity_table({"type": "db", "min_db": -40})
+    assert table[1] == pytest.approx(10 ** (-40 * (1 - 1 / 127) / 20))
+    assert table[127] == pytest.approx(1.0)
+
+
+def test_linear_and_exponential_curves():
+    linear = build_velocity_table("linear")
+    assert linear[127] == pytest.approx(1.0) and linear[64] == pytest.approx(64 / 127)
+    cubic = build_velocity_table({"type": "exponential", "exponent": 3})
+    assert cubic[64] == pytest.approx((64 / 127) ** 3)
+
+
+def test_custom_table_is_validated():
+    custom = np.linspace(0, 1, 128)
+    np.testing.assert_allclose(build_velocity_table(custom.tolist()), custom, rtol=1e-6)
+    with pytest.raises(ValueError, match="128"):
+        build_velocity_table([1.0] * 127)
+    with pytest.raises(ValueError):
+        build_velocity_table([-1.0] * 128)
+    with pytest.raises(ValueError, match="未知的力度曲线"):
+        build_velocity_table("loud")
+
+
+@pytest.fixture
+def manager():
+    return SoundManager(SoundMapping(), mixer=Mixer(sample_rate=8000, channels=1, block_size=64))
+
+
+def test_per_group_curve_and_clamped_lookup(manager):
+    manager.set_velocity_curve("lalala", "linear")
+    assert manager.velocity_gain("lalala", 64) == pytest.approx(64 / 127)
+    assert manager.velocity_gain("default", 127) == pytest.approx(1.0)
+    assert manager.velocity_gain("lalala", 500) == manager.velocity_gain("lalala", 127)
+    assert manager.velocity_gain("lalala", -5) == manager.velocity_gain("lalala", 0)
+
+
+def test_unknown_group_curve_is_rejected(manager):
+    with pytest.raises(ValueError, match="无效的音源组"):
+        manager.set_velocity_curve("no-such-group", "linear")
+    assert "no-such-group" not in manager.velocity_tables